@@ -23,11 +23,17 @@ class Palette(HistogramLUTWidget):
 
         self.sigLevelsChanged.connect(self.update_levels)
         self.model.init_histo_vals.connect(self.do_init_histo_vals)
+        self.model.derived_stats_ready.connect(self.update_derived_histogram)
 
         self.gradient.sigGradientChanged.connect(self.update_palette)
 
         self.gradient.showTicks(False)
 
+        # layer shown on Map (None: bands), and (colormap, levels) of bands
+        # and of each layer shown, restored when shown again:
+        self.layer = None
+        self.states = {}
+
         # self.regions[0].setVisible(False)
         # self.plots[0].setVisible(False)
         # self.gradient.levels[0].setVisible(False)
@@ -44,11 +50,67 @@ class Palette(HistogramLUTWidget):
         # self.item.setLayout(self.item.layout)
 
     def update_bounds(self):
+        if self.model.layer is not None:
+            self.setHistogramRange(self.model.tex_vi, self.model.tex_va)
+            return
         self.setHistogramRange(self.map_view.v_i,
                                self.map_view.v_a)
 
     def update_histogram(self):
-        self.plot.setData(*self.model.histograms[self.model.i])
+        if self.model.layer != self.layer:
+            self.switch_layer(self.model.layer)
+        if self.model.is_derived():
+            # wait for derived_stats_ready
+            return
+        self.plot.setData(*self.model.histograms[self.model.current_key()])
+        self.update_bounds()
+
+    def switch_layer(self, layer):
+        """
+        Save colormap and levels of the previously shown bands/layer, restore
+        those of layer (levels are initialized at layer's percentiles when
+        first shown).
+
+        Parameters
+        ----------
+        layer : str or None
+            name of the layer now shown on Map, None for bands.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.states[self.layer] = (self.gradient.saveState(),
+                                   self.getLevels())
+        self.layer = layer
+        try:
+            gradient, levels = self.states[layer]
+        except KeyError:
+            levels = (self.model.tex_v5, self.model.tex_v95)
+        else:
+            self.gradient.restoreState(gradient)
+        self.do_init_histo_vals(levels)
+
+    @pyqtSlot(tuple)
+    def update_derived_histogram(self, stats):
+        """
+        called when percentiles and histogram of Map's derived view (band
+        difference, reference subtraction) are available
+
+        Parameters
+        ----------
+        stats : tuple
+            (min, 5th percentile, 95th percentile, max, histogram)
+
+        Returns
+        -------
+        None.
+
+        """
+        v_i, _, _, v_a, hist = stats
+        self.setHistogramRange(v_i, v_a)
+        self.plot.setData(*hist)
 
     @pyqtSlot()
     def update_levels(self):
@@ -93,8 +155,5 @@ class Palette(HistogramLUTWidget):
         vi, va = vals
         self.item.setLevels(vi, va)
         self.update_levels()
-        try:
-            self.axis.setLabel(units=self.model.loader.metadata['Value_unit'])
-        except KeyError:
-            self.axis.setLabel(units='Undefined units')
+        self.axis.setLabel(units=self.model.unit() or 'Undefined units')
 
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# imports ###################################################################
+
+import math
+import queue
+import threading
+import time
+
+from PyQt5.QtCore import (
+    QObject, QTimer, pyqtSignal, pyqtSlot
+    )
+
+# playback ##################################################################
+
+
+class Playback(QObject):
+    """
+    Time-lapse playback of the bands/dates on Map.
+
+    A timer steps through the bands at the target frame rate, a background
+    thread prepares (reads and normalizes, see MapModel.prepare_band) the
+    next bands ahead of display. The number of bands prepared in advance is
+    sized from the measured band preparation time. Frames that are not
+    ready when their time comes are skipped rather than stalling playback.
+    """
+    frame_requested = pyqtSignal(int)  # band to be shown
+    stats_changed = pyqtSignal(float, int)  # achieved fps, skipped frames
+    state_changed = pyqtSignal(bool)  # playing or not
+
+    max_prefetch = 32  # max number of bands prepared in advance
+
+    def __init__(self, map_model):
+        """
+        Playback
+
+        Parameters
+        ----------
+        map_model : QObject
+            Model managing data for Map and Minimap.
+
+        Returns
+        -------
+        None.
+
+        """
+        print("Playback -- object creation")
+        super().__init__()
+        self.map_model = map_model
+
+        # settings
+        self.fps = 5.
+        self.loop = True
+        self.start = 0  # first band of played range
+        self.end = None  # last band of played range, None: last band
+
+        # state
+        self.playing = False
+        self.position = -1
+        self.load_time = None  # smoothed time to prepare a band (s)
+        self.shown = 0
+        self.skipped = 0
+        self.t_stats = 0.
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.on_tick)
+
+        # prefetching
+        self.requests = queue.Queue()
+        self.requested = set()
+        self.thread = None
+        print("Playback -- object creation -- finished")
+
+    def last(self):
+        """last band of played range"""
+        n = len(self.map_model.loader)
+        if self.end is None:
+            return n - 1
+        return min(self.end, n - 1)
+
+    def next_frame(self, i):
+        """
+        band following band i in played range, None if end of range reached
+        and not looping
+        """
+        first, last = min(self.start, self.last()), self.last()
+        if i < first or i >= last:
+            if i >= last and not self.loop:
+                return None
+            return first
+        return i + 1
+
+    def prefetch_depth(self):
+        """
+        number of bands to prepare ahead of current position: enough to
+        cover the time needed to prepare one band at target frame rate
+        """
+        if self.load_time is None:
+            return 2
+        depth = math.ceil(self.load_time * self.fps) + 1
+        return max(1, min(depth, self.max_prefetch))
+
+    @pyqtSlot(int)
+    def play(self, position=None):
+        """
+        start playback from position (current band if None)
+        """
+        if position is not None:
+            self.position = position
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.prefetch_loop,
+                                           daemon=True)
+            self.thread.start()
+        self.playing = True
+        self.shown = self.skipped = 0
+        self.t_stats = time.perf_counter()
+        self.prefetch()
+        self.timer.start(int(1000 / self.fps))
+        self.state_changed.emit(True)
+
+    @pyqtSlot()
+    def pause(self):
+        self.timer.stop()
+        self.playing = False
+        self.drop_requests()
+        self.state_changed.emit(False)
+
+    @pyqtSlot(bool)
+    def set_playing(self, checked, position=None):
+        if checked:
+            self.play(position)
+        elif self.playing:
+            self.pause()
+
+    @pyqtSlot(int)
+    def set_fps(self, fps):
+        self.fps = float(fps)
+        if self.playing:
+            self.timer.setInterval(int(1000 / self.fps))
+
+    @pyqtSlot(bool)
+    def set_loop(self, checked):
+        self.loop = checked
+
+    @pyqtSlot(int)
+    def set_start(self, i):
+        self.start = i
+
+    @pyqtSlot(int)
+    def set_end(self, i):
+        self.end = i
+
+    def on_tick(self):
+        """
+        called by timer: show next band if ready, skip it otherwise
+        """
+        nxt = self.next_frame(self.position)
+        if nxt is None:
+            self.pause()
+            return
+        self.position = nxt
+        if self.map_model.is_band_ready(nxt):
+            self.frame_requested.emit(nxt)
+            self.shown += 1
+        else:
+            self.skipped += 1
+        self.prefetch()
+
+        now = time.perf_counter()
+        if now - self.t_stats >= 1.:
+            self.stats_changed.emit(self.shown / (now - self.t_stats),
+                                    self.skipped)
+            self.shown = self.skipped = 0
+            self.t_stats = now
+
+    def upcoming(self):
+        """bands expected to be shown next, in order"""
+        frames = []
+        i = self.position
+        for _ in range(self.prefetch_depth()):
+            i = self.next_frame(i)
+            if i is None or i in frames:
+                break
+            frames.append(i)
+        return frames
+
+    def prefetch(self):
+        """
+        queue preparation of upcoming bands, forget prepared bands that
+        will not be shown soon
+        """
+        upcoming = self.upcoming()
+        with self.map_model.prefetch_lock:
+            for i in list(self.map_model.prefetched):
+                if i not in upcoming or i in self.map_model.textures:
+                    self.map_model.prefetched.pop(i, None)
+        for i in upcoming:
+            if i not in self.requested and not self.map_model.is_band_ready(i):
+                self.requested.add(i)
+                self.requests.put(i)
+
+    def drop_requests(self):
+        """forget queued (not yet started) band preparations"""
+        try:
+            while True:
+                self.requested.discard(self.requests.get_nowait())
+        except queue.Empty:
+            pass
+
+    def prefetch_loop(self):
+        """
+        prefetch thread: prepare requested bands, skipping those that are
+        not upcoming anymore
+        """
+        while True:
+            i = self.requests.get()
+            try:
+                if (not self.playing or i not in self.upcoming() or
+                        self.map_model.is_band_ready(i)):
+                    continue
+                # read before the loader used by prepare_band (see
+                # MapModel.set_loader):
+                generation = self.map_model.generation
+                t0 = time.perf_counter()
+                prepared = self.map_model.prepare_band(i)
+                dt = time.perf_counter() - t0
+                self.load_time = (dt if self.load_time is None
+                                  else .7 * self.load_time + .3 * dt)
+                self.map_model.add_prefetched(i, prepared, generation)
+            except Exception as e:
+                print("Playback -- prefetch failed for band", i, e)
+            finally:
+                self.requested.discard(i)
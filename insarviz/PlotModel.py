@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
 from PyQt5.QtCore import (
-    QObject, pyqtSlot,
+    QObject, pyqtSlot, pyqtSignal,
     )
 
 import numpy as np
@@ -9,11 +9,18 @@ import datetime
 from math import*
 
 from insarviz.Interaction import IDLE, DRAG, ZOOM, POINTS, LIVE, PROFILE
+from insarviz.instrument import span
+from insarviz.ringbuffer import RingBuffer
+from insarviz.profilecache import ProfileCache
+from insarviz.utils import sample_polyline
+from insarviz.swath import swath_index, swath_stats
+from insarviz.reference import region_mask, reference_series
 
 
 class PlotModel(QObject):
+    ref_regions_changed = pyqtSignal()
 
-    def __init__(self, loader, nMaxPoints):
+    def __init__(self, loader, nMaxPoints, nProfilePoints=None):
         """
         Model for plots
         get and transform date/band values (timestamps, datetime or int)
@@ -25,6 +32,12 @@ class PlotModel(QObject):
         ----------
         loader : QObject
             Loader used to extract the dataset from a file
+        nMaxPoints : int
+            max number of points in POINTS mode (and of curves on temporal
+            plot)
+        nProfilePoints : int or None, optional
+            max number of points sampled along profile lines in PROFILE
+            mode. The default is None (nMaxPoints).
 
         Returns
         -------
@@ -35,16 +48,28 @@ class PlotModel(QObject):
         super().__init__()
 
         self.loader = loader
+        # time series of hovered pixels (and of their neighbours):
+        self.profile_cache = ProfileCache(loader)
 
         # variables
         self.disp = None
         self.nMaxPoints = nMaxPoints  # 30 max number of points on profile
+        self.nProfilePoints = nProfilePoints or nMaxPoints
+        self.bilinear_profile = False  # bilinear sampling of profile lines
+        # swath profiles (half width 0: line profiles):
+        self.swath_half_width = 0
+        self.swath_statistic = 'mean'  # or 'median'
+        self.swath_std = None  # per-bin std of last swath profile
+        self.swath = None  # (key, bins, centers, values) of last swath
+        self.distance_units = 'pixel'
 
         # updated by MouseMoveEvent on Map
         self.pointer_ij = None
         self.current_date = None
         self.date_number = None
         self.all_pointer_ij = None  # record
+        self.dropped_ij = None  # point dropped from record by last update
+        self.point_history = None  # record of POINTS mode (RingBuffer)
 
         # data for graphs:
         self.data_for_temporal_graph = []
@@ -59,6 +84,10 @@ class PlotModel(QObject):
         self.ref_is_checked = False
 
         self.ref_pointers = None
+        # reference regions, {name: (vertices, pixels, {statistic: series})}:
+        self.ref_regions = {}
+        self.ref_name = None  # name of current reference region
+        self.ref_statistic = 'mean'
         self.ready_for_REF = False
         self.ready_for_PROFILE = False
         self.ready_for_POINTS = False
@@ -81,6 +110,7 @@ class PlotModel(QObject):
 
         """
         print("PlotModel. -- on_data_load")
+        self.profile_cache.clear()
         if isinstance(self.loader._dates(), range):
             # print("test max is isinstance:" + " - " + str(self.loader._dates()))
             self.timestamps = range(len(self.loader._dates()))
@@ -95,6 +125,7 @@ class PlotModel(QObject):
                 for x in self.loader._dates()]
 
         self.number_of_dates = self.loader.__len__()
+        self.distance_units = self.loader.distance_units()
         # print('# of dates = ', self.number_of_dates)
         # print("self.timestamps = ", self.timestamps)
         # print("self.dates = ", self.dates )
@@ -111,6 +142,7 @@ class PlotModel(QObject):
 
 
     @pyqtSlot(tuple)
+    @span('PlotModel.update_pointer_values')
     def update_pointer_values(self):
         """
         load current pointer data (for plots)
@@ -121,9 +153,8 @@ class PlotModel(QObject):
         None.
 
         """
-        print("PlotModel. -- update_pointer_values")
         # load data for all dates at current pointer's position:
-        self.thispoint_disp = self.loader.load_profile(
+        self.thispoint_disp = self.profile_cache.get(
             self.pointer_ij[0],
             self.pointer_ij[1])
 
@@ -132,7 +163,6 @@ class PlotModel(QObject):
         # print(self.thispoint_disp)
         # to display on Map's tooltip:
         self.thispoint_thisdate_disp = self.thispoint_disp[self.date_number]
-        print("PlotModel. -- update_pointer_values -- finished")
 
     def update_ref_values(self, ref_pointers):
         """
@@ -142,8 +172,8 @@ class PlotModel(QObject):
 
         Parameters
         ----------
-        ref_pointers : list
-            list of tuple (i, j) coordinates of ref point(s).
+        ref_pointers : array
+            n-by-2 array of (i, j) coordinates of ref point(s).
 
         Returns
         -------
@@ -151,22 +181,218 @@ class PlotModel(QObject):
 
         """
         print("PlotModel. -- update_ref_values")
-        if len(ref_pointers) == 1:
-            self.ref_data = self.loader.load_profile(
-                ref_pointers[0][0],
-                ref_pointers[0][1])
-
+        all_ref_data = self.loader.load_profiles(ref_pointers)
+        if len(all_ref_data) == 1:
+            self.ref_data = all_ref_data[0]
         else:
-            all_ref_data = np.empty((len(ref_pointers),
-                                     self.number_of_dates))
-            for i in range(len(ref_pointers)):
-                all_ref_data[i] = self.loader.load_profile(
-                    ref_pointers[i][0],
-                    ref_pointers[i][1])
             self.ref_data = all_ref_data.mean(axis=0)
             print("PlotModel. -- update_ref_values -- finished")
 
-    def update_values(self, profile_points=None):
+    def set_loader(self, loader):
+        """
+        Plot values of another cube with the same size (e.g. a derived cube,
+        see insarviz.derived): reference series of regions and the current
+        profile are computed again from it (points already selected keep
+        their values).
+
+        Parameters
+        ----------
+        loader : Loader or DerivedCube
+            cube to load values from.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.loader = loader
+        self.profile_cache = ProfileCache(loader)
+        self.swath = None
+        self.recompute_ref_regions()
+        self.update_profile()
+
+    def recompute_ref_regions(self):
+        """
+        recompute the series of cached reference regions (e.g. from another
+        loader, or weighted ones once weights are opened), keep current one
+        as ref
+
+        Returns
+        -------
+        None.
+
+        """
+        name = self.ref_name
+        for region, (vertices, _, _) in list(self.ref_regions.items()):
+            self.set_ref_region(vertices, region)
+        if name is not None:
+            self.use_ref_region(name)
+
+    def new_ref_name(self):
+        """name for a new reference region"""
+        k = len(self.ref_regions) + 1
+        while f"ref {k}" in self.ref_regions:
+            k += 1
+        return f"ref {k}"
+
+    def set_ref_region(self, vertices, name):
+        """
+        compute (one windowed read) and cache reference series of a region
+        for all statistics, use it as ref
+
+        Parameters
+        ----------
+        vertices : array
+            n-by-2 array of (i, j) vertices of the region: 1 pixel,
+            rectangle (2 corners) or polygon (see reference.region_mask).
+        name : str
+            name of the region (replaced if already existing).
+
+        Returns
+        -------
+        None.
+
+        """
+        i0, j0, mask = region_mask(vertices, self.loader.dataset.shape)
+        height, width = mask.shape
+        data = self.loader.load_window(i0, j0, width, height)[:, mask]
+        series = {s: reference_series(data, s)
+                  for s in ('mean', 'median')}
+        if self.loader.weights is not None:
+            weights = self.loader.weights[j0:j0+height, i0:i0+width][mask]
+            series['weighted'] = reference_series(data, 'weighted', weights)
+        jj, ii = np.nonzero(mask)
+        pixels = np.stack((ii + i0, jj + j0), axis=1)
+        self.ref_regions[name] = (np.asarray(vertices), pixels, series)
+        self.use_ref_region(name)
+        self.ref_regions_changed.emit()
+
+    def use_ref_region(self, name):
+        """
+        use cached reference region name as ref
+
+        Parameters
+        ----------
+        name : str
+            name of the region.
+
+        Returns
+        -------
+        None.
+
+        """
+        _, pointers, series = self.ref_regions[name]
+        if self.ref_statistic not in series:
+            raise ValueError(f"{self.ref_statistic} reference needs weights, "
+                             "open a coherence file first")
+        self.ref_pointers = pointers
+        self.ref_name = name
+        self.ref_data = series[self.ref_statistic]
+
+    @pyqtSlot(str)
+    def set_ref_statistic(self, statistic):
+        self.ref_statistic = statistic
+        if self.ref_name is not None:
+            self.use_ref_region(self.ref_name)
+
+    def add_point(self):
+        """
+        add current pointer (and its data) to the point history of POINTS
+        mode, dropping the oldest point if nMaxPoints is reached
+
+        Returns
+        -------
+        None.
+
+        """
+        history = self.point_history
+        if history.count:
+            dist = self.loader.distances((history.last(), self.pointer_ij))[0]
+            self.cumdist_history.append(self.cumdist_history.last() + dist)
+        else:
+            self.cumdist_history.append(0.)
+        self.dropped_ij = history.append(self.pointer_ij)
+        self.data_history.append(self.thispoint_disp)
+        self.pts_on_trace = history.count
+
+        # views in order, oldest point first:
+        self.all_pointer_ij = history.view()
+        cumdistances = self.cumdist_history.view()
+        self.cumdistances = cumdistances - cumdistances[0]
+        self.data_for_temporal_graph = self.data_history.view()
+        self.data_for_spatial_graph = self.data_for_temporal_graph.transpose()
+
+    @span('PlotModel.update_swath_values')
+    def update_swath_values(self, vertices):
+        """
+        swath profile: values along profile line are per-bin means (or
+        medians) of pixels within swath_half_width of the line, binned by
+        distance along the line, for all dates at once
+
+        pixels, bins and their values are kept for the current line and
+        half width: changing the statistic does not read data again
+
+        Parameters
+        ----------
+        vertices : array
+            m-by-2 array of points selected by user for the profile line(s).
+
+        Returns
+        -------
+        None.
+
+        """
+        vertices = np.asarray(vertices, dtype=float)
+        key = (vertices.tobytes(), self.swath_half_width)
+        if self.swath is None or self.swath[0] != key:
+            length = np.hypot(*np.diff(vertices, axis=0).T).sum()
+            shape = (self.loader.dataset.width, self.loader.dataset.height)
+            pixels, bins, centers = swath_index(
+                vertices, self.swath_half_width, shape,
+                bin_size=max(1., length / self.nProfilePoints))
+            values = self.loader.load_profiles(pixels)
+            self.swath = (key, bins, centers, values)
+        _, bins, centers, values = self.swath
+
+        mean, std, median = swath_stats(
+            values, bins, len(centers),
+            median=(self.swath_statistic == 'median'))
+        self.data_for_temporal_graph = mean if median is None else median
+        self.swath_std = std
+
+        # bins' centers on line, distances from start of line:
+        length = np.concatenate(([0.], np.cumsum(
+            np.hypot(*np.diff(vertices, axis=0).T))))
+        trace = np.stack((np.interp(centers, length, vertices[:, 0]),
+                          np.interp(centers, length, vertices[:, 1])), axis=1)
+        self.all_pointer_ij = trace
+        self.pts_on_trace = len(trace)
+        self.distances = self.loader.distances(
+            np.concatenate((vertices[:1], trace)))
+        self.cumdistances = np.cumsum(self.distances)
+
+    @pyqtSlot(int)
+    def set_swath_half_width(self, half_width):
+        self.swath_half_width = half_width
+        self.update_profile()
+
+    @pyqtSlot(str)
+    def set_swath_statistic(self, statistic):
+        self.swath_statistic = statistic
+        self.update_profile()
+
+    def update_profile(self):
+        """
+        update profile values (e.g. after swath settings changed) if a
+        profile line is traced
+        """
+        vertices = getattr(self.map_model, 'profile_vertices', ())
+        if self.plot_istate == PROFILE and len(vertices) > 1:
+            self.update_values(profile_points=self.map_model.profile_points,
+                               profile_vertices=vertices)
+
+    @span('PlotModel.update_values')
+    def update_values(self, profile_points=None, profile_vertices=None):
         """
         update values for plots :
         if interactive tool selected:
@@ -179,83 +405,40 @@ class PlotModel(QObject):
             if number of points between points selected as start and end of
             profile is under limit, all selected positions and corresponding
             data for temporal and spatial plots
-            if is over the limit, downsample (random) within those
+            if is over the limit, sample points evenly spaced along the
+            profile line(s)
+
+        Parameters
+        ----------
+        profile_points : array or None, optional
+            n-by-2 array of all points (pixels) of the profile line(s), in
+            PROFILE mode. The default is None.
+        profile_vertices : array or None, optional
+            m-by-2 array of points selected by user for the profile line(s),
+            in PROFILE mode. The default is None.
 
         Returns
         -------
         None.
 
         """
-        print("PlotModel -- update_values")
         if self.plot_istate == POINTS:
             # print("PlotModel.py -- self.plot_istate == POINTS")
-            if self.all_pointer_ij is None:
+            self.dropped_ij = None
+            if self.point_history is None:
                 # first point:
-                # init various variables and fill them with first point's value
-                self.all_pointer_ij = np.zeros((self.nMaxPoints, 2), dtype=int)
-                self.all_pointer_ij[0] = self.pointer_ij
-                self.distances = np.zeros(self.nMaxPoints)
-                self.cumdistances = np.zeros(self.nMaxPoints)
-                self.pts_on_trace = 1
-                # init and fill data for graph
-                self.data_for_temporal_graph = np.full(
-                    (self.nMaxPoints, self.number_of_dates),
-                    np.nan)
-                self.data_for_temporal_graph[0] = np.array(self.thispoint_disp)
-            else:
-                # print("PlotModel.py -- self.all_pointer_ij is NOT None")
-                # more than one point:
-                # check if point already in all_pointer_ij list:
-                if not (self.pointer_ij == self.all_pointer_ij).all(1).any():
-                    # check if number of points exceedes limit
-                    if self.pts_on_trace < self.nMaxPoints:
-                        # fill data
-                        i = self.pts_on_trace
-                        self.all_pointer_ij[i] = self.pointer_ij
-                        # calculate distance with previous point
-                        dist = np.array(
-                            [np.sqrt(
-                                np.power(
-                                    (self.all_pointer_ij[i, 0] -
-                                     self.all_pointer_ij[i-1, 0]),
-                                    2)
-                                + (np.power(
-                                    (self.all_pointer_ij[i, 1] -
-                                     self.all_pointer_ij[i-1, 1]),
-                                    2)))])
-                        self.distances[i] = dist
-
-                        self.data_for_temporal_graph[i, :] = np.array(
-                            self.thispoint_disp)
-                        # self.pts_on_trace += 1
-                    else:
-                        # nMaxPoints reached, shift data to left and
-                        # fill last slot
-                        self.all_pointer_ij = (
-                            np.concatenate((self.all_pointer_ij,
-                                            np.array(self.pointer_ij).reshape(
-                                                (1, 2)))))
-                        dist = np.array(
-                            [np.sqrt(
-
-                                    (self.all_pointer_ij[-1, 0] -
-                                     self.all_pointer_ij[-2, 0])**2
-
-                                + (self.all_pointer_ij[-1, 1] -
-                                    self.all_pointer_ij[-2, 1])**2)])
-                        self.distances = np.concatenate((self.distances,
-                                                         dist))[1:]
-                        self.distances[0] = 0.
-                        self.data_for_temporal_graph[0:-1, :] = (
-                            self.data_for_temporal_graph[1:, :])
-                        self.data_for_temporal_graph[-1, :] = (
-                            self.thispoint_disp)
-
-                    self.cumdistances = np.cumsum(self.distances)
-                    self.pts_on_trace += 1
-
-            self.data_for_spatial_graph = \
-                self.data_for_temporal_graph.transpose()
+                # init point history (ring buffers of points, cumulative
+                # distances and data, views in order are given to plots)
+                self.point_history = RingBuffer(self.nMaxPoints, (2,), int)
+                self.cumdist_history = RingBuffer(self.nMaxPoints)
+                self.data_history = RingBuffer(
+                    self.nMaxPoints, (self.number_of_dates,), fill=np.nan)
+                self.add_point()
+            # more than one point:
+            # check if point already in history:
+            elif not (self.pointer_ij == self.all_pointer_ij[
+                    :len(self.point_history)]).all(1).any():
+                self.add_point()
 
         elif self.plot_istate == PROFILE:
             # print("PlotModel.py -- self.plot_istate == PROFILE")
@@ -271,42 +454,32 @@ class PlotModel(QObject):
                     (self.nMaxPoints, self.number_of_dates),
                     np.nan)
                 self.data_for_temporal_graph[0] = np.array(self.thispoint_disp)
+                self.swath_std = None
+            elif self.swath_half_width > 0:
+                # more than one point, swath profile
+                self.update_swath_values(profile_vertices)
             else:
                 # more than one point
-                if len(profile_points) <= self.nMaxPoints:
-                    # fill all_pointers with points from profile
-                    self.all_pointer_ij[:len(profile_points)] = profile_points
-                    self.pts_on_trace = len(profile_points)
-
+                self.swath_std = None
+                if len(profile_points) <= self.nProfilePoints:
+                    # all points (pixels) of the profile line(s)
+                    trace = profile_points
                 else:
-                    # more than nMaxPoints, subsample profile line(s)
-                    # sample the indices of all points along traced profile
-                    # ind = np.random.choice(range(1,
-                    #                              len(list(profile_points))-1),
-                    #                        self.nMaxPoints-2,
-                    #                        replace=False)
-                    # self.all_pointer_ij[0] = profile_points[0]
-                    # self.all_pointer_ij[-1] = profile_points[-1]
-                    # self.all_pointer_ij[1:-1] = [
-                    #     profile_points[i] for i in sorted(ind)]
-                    self.pts_on_trace = self.nMaxPoints
-
-                # load displacement for all points
+                    # more than nProfilePoints, sample points evenly spaced
+                    # along traced profile line(s)
+                    trace = sample_polyline(profile_vertices,
+                                            self.nProfilePoints)
+                self.all_pointer_ij = trace
+                self.pts_on_trace = len(trace)
+
+                # load displacement for all points (one read)
                 # put into data_for_temporal_graph
-                self.data_for_temporal_graph = np.full(
-                    (self.nMaxPoints, self.number_of_dates),
-                    np.nan)
-                for p in range(self.pts_on_trace):
-                    self.data_for_temporal_graph[p] = np.array(
-                        self.loader.load_profile(*self.all_pointer_ij[p]))
+                self.data_for_temporal_graph = self.loader.load_profiles(
+                    trace, bilinear=self.bilinear_profile)
 
                 # calculate distances, cumulative distances
-                for p in range(1, self.pts_on_trace):
-                    self.distances[p] = np.sqrt(
-                        (self.all_pointer_ij[p, 0] -
-                         self.all_pointer_ij[p-1, 0])**2
-                        + (self.all_pointer_ij[p, 1] -
-                           self.all_pointer_ij[p-1, 1])**2)
+                self.distances = np.concatenate(
+                    ([0.], self.loader.distances(trace)))
                 self.cumdistances = np.cumsum(self.distances)
 
             # in all cases where Profile or Points tool is active
@@ -315,7 +488,6 @@ class PlotModel(QObject):
                 self.data_for_temporal_graph.transpose()
 
         elif self.plot_istate == LIVE:
-            print("PlotModel.py -- self.plot_istate == LIVE")
             if (not self.ready_for_REF and
                 not self.ready_for_PROFILE and
                 not self.ready_for_POINTS):
@@ -324,8 +496,6 @@ class PlotModel(QObject):
                 self.data_for_temporal_graph = self.thispoint_disp
                 # self.data_for_spatial_graph = np.full((1), np.nan)
 
-        print("PlotModel -- update_values -- finished")
-
 
     def clear_data(self):
         """
@@ -340,6 +510,9 @@ class PlotModel(QObject):
         print("PlotModel -- clear data")
         self.disp = None
         self.all_pointer_ij = None
+        self.point_history = None
+        self.swath_std = None
+        self.swath = None
         self.data_for_temporal_graph = []
         self.data_for_spatial_graph = []
         self.cumdistances = []
@@ -352,6 +525,10 @@ class PlotModel(QObject):
         assert self.plot_istate in [0, 3, 4, 5], \
             'plot interaction: wrong value'
 
+    @pyqtSlot(bool)
+    def set_bilinear_profile(self, checked):
+        self.bilinear_profile = checked
+
     @pyqtSlot(bool)
     def set_ready_for_POINTS(self, checked):
         print("PlotModel -- set_ready_for_POINTS")
@@ -586,8 +763,8 @@ class PlotModel_gps(QObject):
 
         Parameters
         ----------
-        ref_pointers : list
-            list of tuple (i, j) coordinates of ref point(s).
+        ref_pointers : array
+            n-by-2 array of (i, j) coordinates of ref point(s).
 
         Returns
         -------
@@ -596,18 +773,10 @@ class PlotModel_gps(QObject):
         """
         print("PlotModel_GPS. -- update_ref_values")
 
-        if len(ref_pointers) == 1:
-            self.ref_data = self.loader.load_profile(
-                ref_pointers[0][0],
-                ref_pointers[0][1])
-
+        all_ref_data = self.loader.load_profiles(ref_pointers)
+        if len(all_ref_data) == 1:
+            self.ref_data = all_ref_data[0]
         else:
-            all_ref_data = np.empty((len(ref_pointers),
-                                     self.number_of_dates))
-            for i in range(len(ref_pointers)):
-                all_ref_data[i] = self.loader.load_profile(
-                    ref_pointers[i][0],
-                    ref_pointers[i][1])
             self.ref_data = all_ref_data.mean(axis=0)
         print("PlotModel_GPS. -- update_ref_values -- finished")
 
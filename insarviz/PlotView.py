@@ -6,7 +6,7 @@ import numpy as np
 import datetime, re
 
 from PyQt5.QtCore import (
-    pyqtSignal, pyqtSlot,
+    pyqtSignal, pyqtSlot, QRectF,
     )
 
 
@@ -23,6 +23,7 @@ from insarviz.utils import (
     )
 
 from .Interaction import IDLE, DRAG, ZOOM, POINTS, LIVE, PROFILE, REF
+from .instrument import span
 
 from .custom_widgets import AnimatedToggle
 
@@ -128,7 +129,7 @@ class DateMarker(pg.InfiniteLine):
         self.sigposChanged.emit(self.idx)
 
     @pyqtSlot(int)
-    def on_slider_changed(self, slidervalue):
+    def on_slider_changed(self, slidervalue=None):
         """
         Receive signal when MainWindow's slider position changed, update
         line position accordingly
@@ -148,6 +149,113 @@ class DateMarker(pg.InfiniteLine):
         self.setPos(pos=current_date)
 
 
+def grey_lut(start, end, n=16):
+    """n greys from start to end (0-255), e.g. to color lines by date"""
+    return [(v, v, v) for v in np.linspace(start, end, n).astype(int)]
+
+
+class MultiLineItem(pg.GraphicsObject):
+    """
+    Lines sharing the same x values (e.g. one line per date on the spatial
+    plot), drawn as one QPainterPath per color of a lookup table instead of
+    one PlotDataItem per line: updating all lines is one setData call.
+    Lines are split where values are nan.
+    """
+
+    def __init__(self, lut=((128, 128, 128),), antialias=True):
+        """
+        Parameters
+        ----------
+        lut : sequence, optional
+            colors (anything accepted by pg.mkColor), lines are colored by
+            order: first lines with first color... The default is one grey.
+        antialias : bool, optional
+            draw antialiased lines. The default is True.
+
+        """
+        super().__init__()
+        self.antialias = antialias
+        self.x = np.empty(0)
+        self.y = np.empty((0, 0))
+        self.paths = []  # (pen, QPainterPath) for each color
+        self.bounds = QRectF()
+        self.setLut(lut)
+
+    def setLut(self, lut):
+        """set colors of lines (see __init__)"""
+        self.pens = [pg.mkPen(color) for color in lut]
+        self.build()
+
+    def setData(self, x, y):
+        """
+        Parameters
+        ----------
+        x : array
+            n x values.
+        y : array
+            number of lines-by-n y values.
+
+        """
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.atleast_2d(np.asarray(y, dtype=float))
+        self.build()
+
+    def build(self):
+        """build the paths of lines (one path per color)"""
+        self.prepareGeometryChange()
+        self.paths = []
+        nlines, n = self.y.shape
+        finite = np.isfinite(self.y) & np.isfinite(self.x)
+        if n == 0 or not finite.any():
+            self.bounds = QRectF()
+            self.update()
+            return
+        # point k is connected to point k+1 of the same line if both are
+        # finite:
+        connect = np.zeros_like(finite)
+        connect[:, :-1] = finite[:, :-1] & finite[:, 1:]
+        color = np.arange(nlines) * len(self.pens) // nlines
+        x = np.broadcast_to(self.x, self.y.shape)
+        for c, pen in enumerate(self.pens):
+            lines = color == c
+            keep = finite[lines]
+            if keep.any():
+                path = pg.arrayToQPath(x[lines][keep], self.y[lines][keep],
+                                       connect=connect[lines][keep],
+                                       finiteCheck=False)
+                self.paths.append((pen, path))
+        x, y = x[finite], self.y[finite]
+        self.bounds = QRectF(x.min(), y.min(),
+                             x.max() - x.min(), y.max() - y.min())
+        self.update()
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        if self.bounds.isNull():
+            return None, None
+        if ax == 0:
+            return self.bounds.left(), self.bounds.right()
+        return self.bounds.top(), self.bounds.bottom()
+
+    def boundingRect(self):
+        # pad by a few pixels (lines' width, flat lines):
+        px, py = self.pixelVectors()
+        if px is None:
+            return self.bounds
+        dx, dy = 2. * px.length(), 2. * py.length()
+        return self.bounds.adjusted(-dx, -dy, dx, dy)
+
+    def viewTransformChanged(self):
+        # padding of boundingRect depends on pixel size
+        self.prepareGeometryChange()
+
+    def paint(self, p, *args):
+        if self.antialias:
+            p.setRenderHint(p.Antialiasing)
+        for pen, path in self.paths:
+            p.setPen(pen)
+            p.drawPath(path)
+
+
 
 
 # VIEWS ########################################################################################################################
@@ -356,7 +464,7 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
                 title="<b>Spatial profile</b><br>1 line/date<br>")
             self.main_plot.setLabel('bottom',
                                     "Distance along profile line",
-                                    units='pixel')
+                                    units=self.plot_model.distance_units)
             self.nPlots = self.plot_model.number_of_dates
             # pen = np.ones(self.nPlots)
 
@@ -366,18 +474,35 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
 
         # plot curves init, all their data is None
         self.curves = []
-        for idx in range(self.nPlots):
-            self.curve = pg.PlotDataItem(pen='w', #pg.mkPen(
-                                            #(255, 255, 255, pen[idx]),
-                                            #width=2),
-                                         symbol='o',
-                                         symbolSize=5,
-                                         antialias=True)
-            self.curve.opts['name'] = idx
-            self.curve.sigPointsClicked.connect(self.dataPointsClicked)
-            # self.curve.sigClicked.connect(self.plotLoadedData_toRef)
-            self.main_plot.addItem(self.curve)
-            self.curves.append(self.curve)
+        if self.ptype == 'spatial':
+            # all dates as a single item, current date drawn (and clickable)
+            # on top of it:
+            self.lines = MultiLineItem()
+            self.main_plot.addItem(self.lines)
+            self.date_curve = pg.PlotDataItem(symbol='o',
+                                              symbolSize=5,
+                                              antialias=True)
+            self.date_curve.sigPointsClicked.connect(self.dataPointsClicked)
+            self.main_plot.addItem(self.date_curve)
+            self.curves.append(self.date_curve)
+        else:
+            for idx in range(self.nPlots):
+                self.curve = pg.PlotDataItem(pen='w', #pg.mkPen(
+                                                #(255, 255, 255, pen[idx]),
+                                                #width=2),
+                                             symbol='o',
+                                             symbolSize=5,
+                                             antialias=True)
+                self.curve.opts['name'] = idx
+                self.curve.sigPointsClicked.connect(self.dataPointsClicked)
+                # self.curve.sigClicked.connect(self.plotLoadedData_toRef)
+                self.main_plot.addItem(self.curve)
+                self.curves.append(self.curve)
+
+        if self.ptype == 'spatial':
+            # +- std of swath profile's bins at current date:
+            self.swath_errors = pg.ErrorBarItem(beam=0, pen=(255, 128, 0))
+            self.main_plot.addItem(self.swath_errors)
 
         self.setStyle(0)
 
@@ -425,7 +550,7 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
             elif self.ptype == 'spatial':
                 self.zoom_plot.setLabel('bottom',
                                         "Distance along profile line",
-                                        units='pixel')
+                                        units=self.plot_model.distance_units)
                 # pen = np.ones(self.nPlots)
 
             self.icurve2 = pg.PlotDataItem(pen=pg.mkPen((255, 0, 0), width=2),
@@ -436,13 +561,22 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
             self.zoom_plot.addItem(self.icurve2)
 
             self.curves2 = []
-            for idx in range(self.nPlots):
-                self.curve2 = pg.PlotDataItem(pen='w', #pen[idx],
-                                              symbol='o',
-                                              symbolSize=5,
-                                              antialias=True)
-                self.zoom_plot.addItem(self.curve2)
-                self.curves2.append(self.curve2)
+            if self.ptype == 'spatial':
+                self.lines2 = MultiLineItem()
+                self.zoom_plot.addItem(self.lines2)
+                self.date_curve2 = pg.PlotDataItem(symbol='o',
+                                                   symbolSize=5,
+                                                   antialias=True)
+                self.zoom_plot.addItem(self.date_curve2)
+                self.curves2.append(self.date_curve2)
+            else:
+                for idx in range(self.nPlots):
+                    self.curve2 = pg.PlotDataItem(pen='w', #pen[idx],
+                                                  symbol='o',
+                                                  symbolSize=5,
+                                                  antialias=True)
+                    self.zoom_plot.addItem(self.curve2)
+                    self.curves2.append(self.curve2)
 
             if self.curves[0].dataBounds(1)[1] is not None:
                 # data already plotted in main_plot, set same data in zoom plot
@@ -460,6 +594,7 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
 
     
     @pyqtSlot()
+    @span('myPlotWidget.plotLoadedData')
     def plotLoadedData(self):
         """
         Update plots with displacement data corresponding to
@@ -469,7 +604,6 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
         Called by mouseMoveEvent and MousePressEvent on Map
 
         """
-        print("myPlotWidget -- plotLoadedData")
         # remove nodata message if any:
         try:
             self.main_plot.removeItem(self.nd_text)
@@ -484,8 +618,10 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
         if self.ptype == 'temporal':
             x = np.array(self.plot_model.timestamps)
             y = self.plot_model.data_for_temporal_graph
-            nb_lines = min(self.plot_model.pts_on_trace,
-                           self.plot_model.nMaxPoints)
+            nb_lines = min(self.plot_model.pts_on_trace, len(y))
+            # at most nPlots curves, evenly spaced along profile:
+            rows = np.linspace(0, nb_lines-1, min(nb_lines, self.nPlots))
+            rows = np.rint(rows).astype(int)
             # print("x = ",x)
             # print("y = ",y)
             # print("nb_lines = ",nb_lines)
@@ -498,13 +634,14 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
             if self.plot_model.plot_istate != 4:
                 # to prevent prb with nans:
                 i = min(self.plot_model.pts_on_trace,
-                        self.plot_model.nMaxPoints)
+                        len(self.plot_model.cumdistances))
                 x = self.plot_model.cumdistances[:i]
                 try:
                     y = y[:, :i]
                 except IndexError:
                     print('clear first')
                 nb_lines = self.plot_model.number_of_dates
+                rows = range(nb_lines)
 
         # if all y is no data, display message:
         if np.isnan(y).all():
@@ -541,12 +678,59 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
                 self.icurve2.hide()
             except AttributeError:
                 pass
-            for line in range(nb_lines):
-                c[line].setData(x, y[line], name=str(line))
+            if self.ptype == 'spatial':
+                # all dates at once, then current date:
+                self.lines.setData(x, y)
                 if self.parentWidget().zoom_button.isChecked():
-                    cz[line].setData(x, y[line], name=str(line))
+                    self.lines2.setData(x, y)
+                self.update_date_curve()
+            else:
+                for line, row in enumerate(rows):
+                    c[line].setData(x, y[row], name=str(row))
+                    if self.parentWidget().zoom_button.isChecked():
+                        cz[line].setData(x, y[row], name=str(row))
+
+    def update_date_curve(self):
+        """
+        Show current date's line (and swath errors) on spatial plot, on top
+        of all dates' lines.
 
-        print("myPlotWidget -- plotLoadedData --finished")
+        Returns
+        -------
+        None
+        """
+        date = self.plot_model.date_number
+        pairs = [(self.lines, self.date_curve)]
+        window = self.parentWidget()
+        if window is not None and window.zoom_button.isChecked():
+            pairs.append((self.lines2, self.date_curve2))
+        for lines, curve in pairs:
+            if date is None or date >= len(lines.y):
+                curve.setData([], [])
+            else:
+                curve.setData(lines.x, lines.y[date], name=str(date))
+        self.update_swath_errors()
+
+    def update_swath_errors(self):
+        """
+        Show +- std of swath profile's bins at current date on spatial plot
+        (hidden if profile is not a swath profile).
+
+        Returns
+        -------
+        None
+        """
+        std = self.plot_model.swath_std
+        date = self.plot_model.date_number
+        if std is None or date is None or not len(std):
+            self.swath_errors.hide()
+            return
+        n = len(std)
+        self.swath_errors.setData(
+            x=np.asarray(self.plot_model.cumdistances[:n]),
+            y=self.plot_model.data_for_spatial_graph[date, :n],
+            height=2.*std[:, date])
+        self.swath_errors.show()
 
     def updateZoomPlot(self):
         """
@@ -678,10 +862,10 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
                 for i in range(self.nPlots):
                     self.curves[i].setPen(0.5)#(255, 255, 255, pen[i]))
             elif self.ptype == 'spatial':
-                for i in self.main_plot.curves:
-                    i.setPen(0.5)
-                self.main_plot.curves[self.plot_model.date_number].setPen(
-                    {'color': 'w', 'width': 4})
+                # older dates darker:
+                self.lines.setLut(grey_lut(60, 200))
+                self.date_curve.setPen({'color': 'w', 'width': 4})
+                self.update_date_curve()
 
             try:
                 self.zoom_plot.setTitle(self.zoom_plot.titleLabel.text,
@@ -691,11 +875,12 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
                 ax1z.setPen(), ax2z.setPen()
                 ax1z.setTextPen(), ax2z.setTextPen()
                 # if self.ptype == 'spatial':
-                for i in self.curves2:
-                    i.setPen(0.5)
                 if self.ptype == 'spatial':
-                    self.curves2[self.plot_model.date_number].setPen(
-                        {'color': 'w', 'width': 4})
+                    self.lines2.setLut(grey_lut(60, 200))
+                    self.date_curve2.setPen({'color': 'w', 'width': 4})
+                else:
+                    for i in self.curves2:
+                        i.setPen(0.5)
             except AttributeError:
                 pass
 
@@ -713,10 +898,10 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
                 for i in range(self.nPlots):
                     self.curves[i].setPen(0.5)#(0, 0, 0, pen[i]))
             elif self.ptype == 'spatial':
-                for i in self.main_plot.curves:
-                    i.setPen(0.5)
-                self.main_plot.curves[self.plot_model.date_number].setPen(
-                    {'color': 'k', 'width': 4})
+                # older dates lighter:
+                self.lines.setLut(grey_lut(200, 60))
+                self.date_curve.setPen({'color': 'k', 'width': 4})
+                self.update_date_curve()
 
             try:
                 self.zoom_plot.setTitle(
@@ -726,11 +911,12 @@ class myPlotWidget(pg.GraphicsLayoutWidget):
                 ax1z.setPen('k'), ax2z.setPen('k')
                 ax1z.setTextPen('k'), ax2z.setTextPen('k')
                 # if self.ptype == 'spatial':
-                for i in self.curves2:
-                    i.setPen(0.5)
                 if self.ptype == 'spatial':
-                    self.curves2[self.plot_model.date_number].setPen(
-                    {'color': 'k', 'width': 4})
+                    self.lines2.setLut(grey_lut(200, 60))
+                    self.date_curve2.setPen({'color': 'k', 'width': 4})
+                else:
+                    for i in self.curves2:
+                        i.setPen(0.5)
 
             except AttributeError:
                 pass
@@ -1091,6 +1277,7 @@ class myPlotWidget_gps(pg.GraphicsLayoutWidget):
 
     
     @pyqtSlot()
+    @span('myPlotWidget_gps.plotLoadedData')
     def plotLoadedData(self):
         """
         Update plots with displacement data corresponding to
@@ -1101,7 +1288,6 @@ class myPlotWidget_gps(pg.GraphicsLayoutWidget):
 
         """
         # remove nodata message if any:
-        print("myPlotWidget_gps -- plotLoadData")
         try:
             self.main_plot.removeItem(self.nd_text)
             self.main_plot.autoRange()
@@ -1227,8 +1413,6 @@ class myPlotWidget_gps(pg.GraphicsLayoutWidget):
         #         if self.parentWidget().zoom_button.isChecked():
         #             cz[line].setData(x, y[line], name=str(line))
 
-        print("myPlotWidget_gps -- plotLoadData -- finished")
-
     # @pyqtSlot(bool)
     # def init_zoom(self, checked):
     #     """
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# imports ###################################################################
+
+import time
+
+from PyQt5.QtCore import (
+    QObject, QTimer, pyqtSlot
+    )
+
+# refresh scheduler #########################################################
+
+
+class RefreshScheduler(QObject):
+    """
+    Deferred, merged refresh of plots (or any view).
+
+    Events (mouse moves on Map, slider ticks...) mark refresh functions as
+    dirty instead of calling them. A single-shot timer calls each dirty
+    function once, at most once per interval: a burst of events between two
+    frames costs one refresh per plot. The number of requests, refreshes
+    and the time spent are recorded for each function.
+    """
+
+    interval = 16  # ms between refreshes (about 60 per second)
+
+    def __init__(self, interval=None):
+        """
+        RefreshScheduler
+
+        Parameters
+        ----------
+        interval : int or None, optional
+            min time (ms) between refreshes. The default is None (class
+            attribute interval).
+
+        Returns
+        -------
+        None.
+
+        """
+        super().__init__()
+        if interval is not None:
+            self.interval = interval
+        self.dirty = {}  # refresh function: name, in order of request
+        self.names = {}  # refresh function: name given to slot
+        # name: [requests, refreshes, total time (s), max time (s)]
+        self.stats = {}
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+        self.last_flush = 0.  # time of last flush (s)
+
+    def schedule(self, refresh, name=None):
+        """
+        Mark refresh as dirty: it will be called (once) at next flush.
+
+        Parameters
+        ----------
+        refresh : callable
+            refresh function, without arguments (e.g. bound method of a
+            plot widget).
+        name : str or None, optional
+            name of refresh in statistics. The default is None (name given
+            to slot, or function's qualified name).
+
+        Returns
+        -------
+        None.
+
+        """
+        if name is None:
+            name = self.names.get(refresh) or getattr(
+                refresh, '__qualname__', repr(refresh))
+        self.dirty[refresh] = name
+        self.stats.setdefault(name, [0, 0, 0., 0.])[0] += 1
+        if not self.timer.isActive():
+            wait = self.interval - 1000. * (time.perf_counter() -
+                                            self.last_flush)
+            self.timer.start(max(0, int(wait)))
+
+    def slot(self, refresh, name=None):
+        """
+        Function (to be connected to a signal) scheduling refresh, whatever
+        the signal's arguments.
+
+        Parameters
+        ----------
+        refresh : callable
+            refresh function, see schedule.
+        name : str or None, optional
+            name of refresh in statistics. The default is None.
+
+        Returns
+        -------
+        callable
+
+        """
+        if name is not None:
+            self.names[refresh] = name
+
+        def request(*args):
+            self.schedule(refresh)
+        return request
+
+    @pyqtSlot()
+    def flush(self):
+        """call dirty refresh functions now"""
+        self.last_flush = time.perf_counter()
+        dirty, self.dirty = self.dirty, {}
+        for refresh, name in dirty.items():
+            t0 = time.perf_counter()
+            refresh()
+            dt = time.perf_counter() - t0
+            stats = self.stats[name]
+            stats[1] += 1
+            stats[2] += dt
+            stats[3] = max(stats[3], dt)
+
+    def report(self):
+        """
+        Returns
+        -------
+        str
+            one line per refresh function: number of requests, of
+            refreshes, mean and max refresh time, total time.
+
+        """
+        lines = [f"{'refresh':<40} {'requests':>8} {'refreshes':>9} "
+                 f"{'mean ms':>8} {'max ms':>8} {'total s':>8}"]
+        for name, (requests, refreshes, total, longest) in sorted(
+                self.stats.items(), key=lambda item: -item[1][2]):
+            mean = 1000. * total / refreshes if refreshes else 0.
+            lines.append(f"{name:<40} {requests:>8} {refreshes:>9} "
+                         f"{mean:>8.1f} {1000. * longest:>8.1f} "
+                         f"{total:>8.2f}")
+        return '\n'.join(lines)
+
+    def reset_stats(self):
+        self.stats = {name: [0, 0, 0., 0.] for name in self.stats}
@@ -2,6 +2,8 @@
 
 """Bresenham algorithm for line drawing."""
 
+import numpy as np
+
 
 def line(x0, y0, x1, y1):
     """returns list of indices of pixels for the line from (x0, y0) to (x1, y1)
@@ -55,6 +57,60 @@ def line(x0, y0, x1, y1):
     return idxs
 
 
+def polyline(points):
+    """returns (N, 2) int array of indices of pixels for the polyline going
+    through points, using Bresenham's algorithm (same pixels as line) on
+    each segment, vectorized over all pixels of all segments.
+
+    both ends are included, joints between segments appear only once.
+
+    Parameters
+    ----------
+    points : array-like
+        (n, 2) coordinates (row, col) or (col, row) of the polyline
+        vertices, n >= 1
+
+    Examples
+    --------
+    >>> from insarviz.bresenham import polyline
+    >>> polyline([(0, 0), (4, 3), (8, 3)]).tolist()
+    [[0, 0], [1, 1], [2, 2], [3, 2], [4, 3], [5, 3], [6, 3], [7, 3], [8, 3]]
+    """
+    points = np.asarray(points, dtype=np.int64).reshape((-1, 2))
+    if len(points) == 1:
+        return points.copy()
+    p0, p1 = points[:-1], points[1:]
+    d = p1 - p0
+    sign = np.where(d > 0, 1, -1)
+    d = np.abs(d)
+    # major axis: 0 if |dx| > |dy| (as in line), 1 otherwise
+    major = (d[:, 0] <= d[:, 1]).astype(np.int64)
+    dmaj = d[np.arange(len(d)), major]
+    dmin = d[np.arange(len(d)), 1 - major]
+
+    # one pixel per step along major axis, first pixel of each segment
+    # (except the first segment) is the last pixel of previous segment
+    n = dmaj + 1
+    n[1:] -= 1
+    seg = np.repeat(np.arange(len(d)), n)
+    start = np.cumsum(n) - n
+    step = np.arange(n.sum()) - start[seg]
+    step[seg > 0] += 1  # skip duplicated joints
+
+    # closed form of Bresenham's decision variable:
+    # minor-axis offset is floor((2*dmin*step + dmaj) / (2*dmaj))
+    dmaj_s, dmin_s = dmaj[seg], dmin[seg]
+    minor = (2 * dmin_s * step + dmaj_s) // np.maximum(2 * dmaj_s, 1)
+
+    out = np.empty((len(seg), 2), dtype=np.int64)
+    major_s = major[seg]
+    out[:, 0] = p0[seg, 0] + sign[seg, 0] * np.where(major_s == 0,
+                                                     step, minor)
+    out[:, 1] = p0[seg, 1] + sign[seg, 1] * np.where(major_s == 0,
+                                                     minor, step)
+    return out
+
+
 # example:
 # import numpy as np
 # X0, Y0, X1, Y1 = 0, 0, 4, 3
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+"""
+Conversion of a cube (folder of .bin bands, GTiff, ENVI, HDF5...) to a dual
+layout HDF5 cube read efficiently both by bands (Map) and by time series
+(plots), see ts_viz convert:
+
+- 'timeseries': bands in spatial tiles (1 x TILE x TILE chunks),
+- 'series': the same values in time-contiguous chunks (all bands x
+  SERIES_TILE x SERIES_TILE),
+- 'overviews/<factor>': cubes decimated by powers of 2, down to
+  OVERVIEW_SIZE pixels,
+- 'date' and MintPy georeferencing attributes (X_FIRST, Y_STEP, EPSG...),
+
+along with the temporal statistics sidecar (see insarviz.temporal_stats).
+The cube is converted by tiles of TILE x TILE pixels (all bands) in worker
+processes, which also encode (and optionally compress) the chunks, at most
+two tiles per worker being in memory at once. Cube.open opens the converted cube (named after
+the source, see core.hdf5.container_name) instead of its source.
+"""
+
+# imports ###################################################################
+
+import logging
+import os
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+
+from insarviz.core import Cube, cube_pool, worker_cube
+from insarviz.core.hdf5 import LAYOUT, container_name
+
+logger = logging.getLogger(__name__)
+
+TILE = 256  # side of band chunks and of converted tiles
+SERIES_TILE = 16  # side of time series chunks (and smallest overview chunks)
+OVERVIEW_SIZE = 256  # max size (px) of the smallest overview's largest side
+COMPRESSION_LEVEL = 1  # gzip level (float data compresses little)
+
+# tiles #####################################################################
+
+
+def overview_factors(shape):
+    """decimation factors (powers of 2) of overviews of a cube's bands"""
+    factors = []
+    f = 1
+    while -(-max(shape) // f) > OVERVIEW_SIZE:
+        f *= 2
+        factors.append(f)
+    return factors
+
+
+def _pad(chunk, shape):
+    """chunk padded with nan to full chunk shape (edges of the cube)"""
+    if chunk.shape == tuple(shape):
+        return np.ascontiguousarray(chunk)
+    padded = np.full(shape, np.nan, dtype=chunk.dtype)
+    padded[tuple(slice(0, n) for n in chunk.shape)] = chunk
+    return padded
+
+
+def _convert_tile(tile, chunks, compress, cube=None):
+    """
+    job: read tile (row, col, height, width, in file order) of cube (the
+    worker process' cube by default, see core.cube_pool), decimate it and
+    encode its chunks
+
+    Returns
+    -------
+    list
+        (dataset name, chunk offset, chunk bytes) of the chunks of the tile
+        in each dataset of chunks.
+    dict
+        {dataset name: (offset, data)} of decimated tiles smaller than a
+        chunk of their overview (written by the caller).
+
+    """
+    if cube is None:
+        cube = worker_cube()
+    r0, c0, height, width = tile
+    h = cube.dataset.shape[0]
+    if cube.flipped:
+        data = cube.load_window(c0, h - (r0 + height), width, height)[:, ::-1]
+    else:
+        data = cube.load_window(c0, r0, width, height)
+
+    def encode(chunk, shape):
+        chunk = _pad(chunk, shape)
+        if not compress:
+            return chunk.tobytes()
+        # HDF5 shuffle filter (bytes grouped by significance), then gzip
+        shuffled = chunk.view('uint8').reshape((-1, chunk.itemsize)).T
+        return zlib.compress(shuffled.tobytes(), COMPRESSION_LEVEL)
+
+    encoded, partial = [], {}
+    for name, (ct, ch, cw) in chunks.items():
+        f = int(name.split('/')[1]) if name.startswith('overviews/') else 1
+        # same grid as whole decimated bands:
+        part = data[:, (-r0) % f::f, (-c0) % f::f]
+        r, c = -(-r0 // f), -(-c0 // f)
+        if f * ch > TILE or f * cw > TILE:
+            # decimated tile smaller than a chunk (large factors)
+            partial[name] = ((r, c), part)
+            continue
+        for i in range(0, part.shape[1], ch):
+            for j in range(0, part.shape[2], cw):
+                for k in range(0, len(part), ct):
+                    encoded.append((name, (k, r + i, c + j),
+                                    encode(part[k:k+ct, i:i+ch, j:j+cw],
+                                           (ct, ch, cw))))
+    return encoded, partial
+
+
+# conversion ################################################################
+
+
+def convert(cube, filename=None, workers=None, compress=False, stats=True,
+            progress=None):
+    """
+    Convert cube to a dual layout HDF5 cube (see module description).
+
+    Parameters
+    ----------
+    cube : Cube
+        cube to convert.
+    filename : str or None, optional
+        output file, written under a temporary name and renamed when done.
+        The default is None (container_name of cube's file, opened instead
+        of it by Cube.open).
+    workers : int or None, optional
+        number of worker processes (1: convert in this process). The default
+        is None (number of CPUs).
+    compress : bool, optional
+        gzip compress chunks (smaller file, slower conversion and reads).
+        The default is False.
+    stats : bool, optional
+        compute the temporal statistics sidecar. The default is True.
+    progress : callable or None, optional
+        called as progress(done, total) after each tile, conversion is
+        cancelled if it returns True. The default is None.
+
+    Returns
+    -------
+    str or None
+        output file name, None if cancelled.
+
+    """
+    import h5py
+    if filename is None:
+        filename = container_name(cube.dataset.name)
+    nt, (h, w) = len(cube), cube.dataset.shape
+    tiles = [(r, c, min(TILE, h - r), min(TILE, w - c))
+             for r in range(0, h, TILE) for c in range(0, w, TILE)]
+    options = dict(compression='gzip', compression_opts=COMPRESSION_LEVEL,
+                   shuffle=True) if compress else {}
+
+    part = filename + '.part'
+    f = h5py.File(part, 'w')
+    try:
+        layouts = [('timeseries', (nt, h, w), (1, TILE, TILE)),
+                   ('series', (nt, h, w), (nt, SERIES_TILE, SERIES_TILE))]
+        for factor in overview_factors((h, w)):
+            side = max(TILE // factor, SERIES_TILE)
+            layouts.append((f'overviews/{factor}',
+                            (nt, -(-h // factor), -(-w // factor)),
+                            (1, side, side)))
+        chunks = {}
+        for name, shape, chunk in layouts:
+            chunks[name] = f.create_dataset(
+                name, shape, 'float32', fillvalue=np.nan,
+                chunks=tuple(min(c, s) for c, s in zip(chunk, shape)),
+                **options).chunks
+        _write_metadata(f, cube)
+
+        def store(result):
+            encoded, partial = result
+            for name, offset, data in encoded:
+                f[name].id.write_direct_chunk(offset, data)
+            for name, ((r, c), data) in partial.items():
+                f[name][:, r:r+data.shape[1], c:c+data.shape[2]] = data
+
+        workers = workers or os.cpu_count() or 1
+        completed = True
+        if workers == 1 or len(tiles) < 2:
+            for done, tile in enumerate(tiles, 1):
+                store(_convert_tile(tile, chunks, compress, cube))
+                if progress is not None and progress(done, len(tiles)):
+                    completed = False
+                    break
+        else:
+            with cube_pool(cube, workers) as pool:
+                todo, running, done = iter(tiles), set(), 0
+                while completed:
+                    # at most 2 tiles per worker in memory:
+                    for tile in todo:
+                        running.add(pool.submit(_convert_tile, tile, chunks,
+                                                compress))
+                        if len(running) >= 2 * workers:
+                            break
+                    if not running:
+                        break
+                    finished, running = wait(running,
+                                             return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        store(future.result())
+                        done += 1
+                    if progress is not None and progress(done, len(tiles)):
+                        for future in running:
+                            future.cancel()
+                        completed = False
+    except BaseException:
+        f.close()
+        os.remove(part)
+        raise
+    f.close()
+    if not completed:
+        os.remove(part)
+        return None
+    os.replace(part, filename)
+
+    if stats:
+        from insarviz.temporal_stats import temporal_stats_maps
+        temporal_stats_maps(Cube(filename=filename), workers)
+    return filename
+
+
+def _write_metadata(f, cube):
+    """dates, georeferencing and layout attributes of h5py file f"""
+    dates = cube._dates()
+    if not isinstance(dates, range) and len(dates) == len(cube):
+        f.create_dataset('date', data=np.array(dates, dtype='S8'))
+    t, crs = cube.dataset.transform, cube.dataset.crs
+    if not t.is_identity and t.b == 0. and t.d == 0.:
+        f.attrs.update(X_FIRST=t.c, Y_FIRST=t.f, X_STEP=t.a, Y_STEP=t.e)
+        if crs is not None and crs.to_epsg() is not None:
+            f.attrs['EPSG'] = crs.to_epsg()
+        elif crs is not None:
+            f.attrs['crs_wkt'] = crs.to_wkt()
+        else:
+            f.attrs['X_UNIT'] = 'pixel'
+    f.attrs.update(insarviz_layout=LAYOUT, source=str(cube.dataset.name))
+
+
+# command line ##############################################################
+
+
+def main(argv=None):
+    """ts_viz convert -i CUBE [-o OUTPUT]"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="ts_viz convert",
+        description=("convert a cube to a dual layout HDF5 cube (band tiles "
+                     "and time series chunks, overviews, temporal "
+                     "statistics), opened instead of the cube afterwards"))
+    parser.add_argument("-i", required=True,
+                        help="input cube filename (or folder of bands)")
+    parser.add_argument("-o", default=None,
+                        help=("output file, default: input name + "
+                              "'.insarviz.h5' (opened instead of the input "
+                              "by ts_viz)"))
+    parser.add_argument("-k", "--keep", default=None,
+                        help="stack file, if input is a folder of bands")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, default: all cores")
+    parser.add_argument("--compress", action="store_true",
+                        help=("gzip compress chunks (smaller file, slower "
+                              "conversion and reads)"))
+    parser.add_argument("--no-stats", action="store_true",
+                        help="do not compute temporal statistics")
+    parser.add_argument("-v", type=int, default=3,
+                        help=("set logging level: 0 critical, 1 error, "
+                              "2 warning, 3 info, 4 debug, default=info"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=[logging.CRITICAL, logging.ERROR, logging.WARNING,
+               logging.INFO, logging.DEBUG][args.v])
+
+    t0 = time.perf_counter()
+    cube = Cube(args.keep or "stack.tif")
+    # convert the input itself, not a former conversion of it:
+    cube.open(args.i, converted=False)
+    output = args.o or container_name(args.i)
+    convert(cube, output, args.workers, args.compress, not args.no_stats)
+    logger.info(f"{args.i} ({len(cube)} bands/dates, {cube.dataset.width}x"
+                f"{cube.dataset.height}) converted to {output} "
+                f"({os.path.getsize(output) / 2**20:.0f} MB) in "
+                f"{time.perf_counter() - t0:.1f} s")
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+"""
+Qt-free core of insarviz: cube access (Cube), GPS stations (GpsNetwork)
+and band statistics (Stats), usable from scripts and worker processes. The
+Qt classes (Loader, Loader_gps, MapModel...) are adapters over it.
+"""
+
+from insarviz.core.cube import Cube, cube_pool, worker_cube
+from insarviz.core.gps import GpsNetwork
+from insarviz.core.hdf5 import H5Dataset
+from insarviz.core.stats import Stats, band_histogram
+from insarviz.core.zarrstore import ZarrDataset
+
+__all__ = ['Cube', 'GpsNetwork', 'H5Dataset', 'Stats', 'ZarrDataset',
+           'band_histogram', 'cube_pool', 'worker_cube']
@@ -0,0 +1,718 @@
+# -*- coding: utf-8 -*-
+
+"""
+Data cube access: open a dataset (or stack a folder of dated bands), read
+bands, time series and windows in texture/data orientation with nodata set
+to nan. Without Qt, picklable (the dataset is reopened after unpickling), so
+that it can be used from scripts and worker processes.
+"""
+
+# imports ###################################################################
+
+import glob
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from insarviz.core.hdf5 import H5Dataset, container_name, is_hdf5
+from insarviz.core.zarrstore import ZarrDataset, is_zarr
+from insarviz.instrument import span
+
+logger = logging.getLogger(__name__)
+
+# threads reading (decoding) band files when a folder is stacked:
+STACK_THREADS = min(16, 2 * (os.cpu_count() or 1))
+
+# cube ######################################################################
+
+
+class Cube():
+    """
+    Dataset of bands/dates (rasterio, or h5py for HDF5/NetCDF files and zarr
+    for Zarr stores, see insarviz.core.hdf5 and insarviz.core.zarrstore),
+    read in texture/data orientation: GTiff and ENVI files (and HDF5/Zarr
+    cubes with rows from top to bottom) are flipped upside down.
+    """
+
+    # load_profiles reads the window bounding the points if it holds at most
+    # max_window_ratio pixels per point:
+    max_window_ratio = 16
+
+    def __init__(self, stack_file="stack.tif", filename=None,
+                 chunk_cache=None):
+        """
+        Parameters
+        ----------
+        stack_file : str, optional
+            file written when a folder of bands is opened (see open). The
+            default is "stack.tif".
+        filename : str or None, optional
+            file (or folder) to open. The default is None (see open).
+        chunk_cache : int or None, optional
+            chunk cache size (bytes) of HDF5/NetCDF files. The default is
+            None (see insarviz.core.hdf5.H5Dataset).
+
+        Returns
+        -------
+        None.
+
+        """
+        self.stack_file = stack_file
+        self.chunk_cache = chunk_cache
+        # dataset reads may come from worker threads (e.g. stats of derived
+        # views), rasterio datasets must not be read concurrently:
+        self.lock = threading.Lock()
+        self.weights = None  # per-pixel weights (e.g. coherence), see open_weights
+        self.metadata = {}  # see get_metadata
+        if filename is not None:
+            self.open(filename)
+
+    def __getstate__(self):
+        # datasets and locks do not pickle: reopen by name
+        state = self.__dict__.copy()
+        del state['lock']
+        dataset = state.pop('dataset', None)
+        state['dataset_name'] = None if dataset is None else dataset.name
+        return state
+
+    def __setstate__(self, state):
+        name = state.pop('dataset_name')
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        if name is not None:
+            self.dataset = self._open_dataset(name)
+
+    def __len__(self):
+        """
+        Length of dataset = number of bands/dates.
+
+        Returns
+        -------
+        int
+            number of band/dates.
+
+        """
+        return len(self.dataset.indexes)
+
+    @property
+    def flipped(self):
+        """True if dataset rows are in reverse texture/data order"""
+        # geotiff opens with GTiff or ENVI rasterio driver, is flipped ud
+        if self.dataset.profile["driver"] in ('HDF5', 'Zarr'):
+            return not self.dataset.bottom_up
+        return self.dataset.profile["driver"] in ('GTiff', 'ENVI')
+
+    @property
+    def nodata(self):
+        """nodata value of dataset"""
+        return self.dataset.profile['nodata']
+
+    def open(self, filename, converted=True, progress=None):
+        """
+        Open data file and store dataset. A folder of bands (files named
+        after their date, e.g. 20200101T000000*.bin) is first stacked in
+        stack_file, each band's description being its date (see
+        _stack_folder).
+
+        Parameters
+        ----------
+        filename : str, path
+            Name of the file (or folder) to load (with path).
+        converted : bool, optional
+            open the dual layout cube converted from filename instead (see
+            insarviz.convert), if it is up to date. The default is True.
+        progress : callable or None, optional
+            called as progress(done, total) after each band stacked,
+            stacking (and opening) is cancelled if it returns True. The
+            default is None.
+
+        Returns
+        -------
+        dict or None
+            rasterio profile of dataset, None if cancelled (the former
+            dataset is kept).
+
+        """
+        logger.debug(f"open {filename}")
+        container = container_name(filename)
+        if (converted and not is_hdf5(filename)
+                and os.path.exists(container)
+                and os.path.getmtime(container) >= os.path.getmtime(filename)):
+            logger.info(f"open {container}, converted from {filename}")
+            filename = container
+        if is_hdf5(filename) or is_zarr(filename):
+            self.dataset = self._open_dataset(filename)
+            return self.dataset.profile
+        if os.path.isdir(filename):
+            if not self._stack_folder(filename, progress):
+                logger.info(f"stacking of {filename} cancelled")
+                return None
+            filename = self.stack_file
+
+        self.dataset = self._open_dataset(filename)
+        return self.dataset.profile
+
+    def _stack_folder(self, folder, progress=None):
+        """
+        Stack a folder of bands (files named after their date, e.g.
+        20200101T000000*.bin) in stack_file, each band's description being
+        its date. A stack_file kept from a former stacking of folder (see
+        ts_viz --keep) is reused: bands of new dates are appended to it (and
+        to its temporal statistics, see insarviz.temporal_stats), it is
+        stacked again only if its bands were changed or removed.
+
+        Files are read by a pool of threads (see _read_bands) and their
+        bands written in order in this thread. The stack keeps the layout of
+        the files (band sequential ENVI .bin files: each band contiguous,
+        as read by Map, and bands appendable).
+
+        Parameters
+        ----------
+        folder : str, path
+            folder of bands.
+        progress : callable or None, optional
+            see open. The default is None.
+
+        Returns
+        -------
+        bool
+            False if cancelled (stack_file removed, or left unchanged if
+            bands were to be appended to it).
+
+        """
+        # rasterio is imported on first use (see ts_viz startup time)
+        import rasterio
+        target = "{}/*".format(folder)
+        file_list = [x for x in glob.glob(target)
+                     if re.search(r"\d{8}T\d{6}.*bin$", x)]
+        file_list.sort()
+        dates = [re.search(r"\d{8}", os.path.basename(x))[0]
+                 for x in file_list]
+        # Read metadata of first file
+        with rasterio.open(file_list[0]) as src0:
+            meta = src0.meta
+
+        # Update meta to reflect the number of layers
+        meta.update(count=len(file_list))
+        # Update meta to reflect the option 'nodata=0' used when opening
+        meta.update(nodata=0.0)
+        source = os.path.abspath(folder)
+
+        kept = self._kept_bands(source, meta, file_list, dates)
+        if kept == len(file_list):
+            logger.info(f"{self.stack_file} is up to date with {folder}")
+            return True
+        if kept:
+            logger.info(f"append {len(file_list) - kept} bands of {folder} "
+                        f"to {self.stack_file}")
+            # imported here: insarviz.temporal_stats imports insarviz.core
+            from insarviz import temporal_stats
+            cached = temporal_stats.read_sidecar(self.stack_file)
+            if not self._append_bands(file_list[kept:], dates[kept:],
+                                      progress):
+                return False
+            if cached is not None:
+                # closed here, open opens the stack again
+                self.dataset = self._open_dataset(self.stack_file)
+                try:
+                    temporal_stats.extend_sidecar(self, cached)
+                finally:
+                    self.dataset.close()
+            return True
+
+        # Write each layer to stack, in order
+        completed = True
+        bands = _read_bands(file_list)
+        with rasterio.open(self.stack_file, 'w', **meta) as dataset:
+            files = dataset.files
+            for id, band in enumerate(bands, start=1):
+                dataset.write_band(id, band)
+                dataset.set_band_description(id, dates[id-1])
+                if progress is not None and progress(id, len(file_list)):
+                    completed = False
+                    break
+            bands.close()
+            dataset.update_tags(source=source)
+        if not completed:
+            for x in files:
+                if os.path.exists(x):
+                    os.remove(x)
+        return completed
+
+    def _kept_bands(self, source, meta, file_list, dates):
+        """
+        number of bands of stack_file, stacked from folder source, that are
+        up to date: same size, type and georeferencing as meta, bands of the
+        first dates whose files were not modified since. 0 if stack_file
+        must be stacked again (missing, changed or removed bands...).
+        """
+        import rasterio
+        if not os.path.exists(self.stack_file):
+            return 0
+        try:
+            with rasterio.open(self.stack_file) as stack:
+                same = (stack.tags().get('source') == source
+                        and stack.driver == meta['driver']
+                        and (stack.width, stack.height, stack.dtypes[0],
+                             stack.crs, stack.transform)
+                        == (meta['width'], meta['height'], meta['dtype'],
+                            meta['crs'], meta['transform']))
+                stacked = stack.descriptions
+                envi = stack.tags(ns='ENVI')
+        except rasterio.errors.RasterioIOError:
+            return 0
+        n = len(stacked)
+        mtime = os.path.getmtime(self.stack_file)
+        if (not same or n > len(dates) or tuple(dates[:n]) != stacked
+                or any(os.path.getmtime(x) > mtime for x in file_list[:n])):
+            return 0
+        if n < len(dates):
+            # bands can be appended to (complete) band sequential ENVI files
+            size = n * meta['width'] * meta['height'] * \
+                np.dtype(meta['dtype']).itemsize
+            if (meta['driver'] != 'ENVI' or envi.get('interleave') != 'bsq'
+                    or envi.get('header_offset', '0') != '0'
+                    or os.path.getsize(self.stack_file) != size):
+                return 0
+        return n
+
+    def _append_bands(self, file_list, dates, progress=None):
+        """append bands of file_list, dates being their descriptions, to a
+        band sequential ENVI stack_file (see _kept_bands), False if
+        cancelled (see open)"""
+        import rasterio
+        with rasterio.open(self.stack_file) as stack:
+            count, dtype = stack.count, np.dtype(stack.dtypes[0])
+            big_endian = stack.tags(ns='ENVI').get('byte_order') == '1'
+            header = [x for x in stack.files if x.endswith('.hdr')][0]
+        dtype = dtype.newbyteorder('>' if big_endian else '<')
+        # raw data of bands follow each other:
+        size = os.path.getsize(self.stack_file)
+        bands = _read_bands(file_list)
+        with open(self.stack_file, 'ab') as f:
+            for done, band in enumerate(bands, start=1):
+                f.write(band.astype(dtype).tobytes())
+                if progress is not None and progress(done, len(file_list)):
+                    bands.close()
+                    f.truncate(size)
+                    return False
+        with open(header) as f:
+            text = f.read()
+        text = re.sub(r"(?m)^bands\s*=\s*\d+",
+                      f"bands   = {count + len(file_list)}", text)
+        with open(header, 'w') as f:
+            f.write(text)
+        with rasterio.open(self.stack_file, 'r+') as dataset:
+            for id, date_str in enumerate(dates, start=count+1):
+                dataset.set_band_description(id, date_str)
+        return True
+
+    def _open_dataset(self, filename):
+        """open a data file (rasterio, h5py for HDF5/NetCDF files, zarr for
+        Zarr stores)"""
+        if is_hdf5(filename):
+            return H5Dataset(filename, chunk_cache=self.chunk_cache)
+        if is_zarr(filename):
+            return ZarrDataset(filename)
+        import rasterio
+        return rasterio.open(filename, nodata=0)
+
+    def _dates(self):
+        """
+        If dates are available in data file (or metadata in same location),
+        get dates, otherwise make a list of band numbers.
+
+        Returns
+        -------
+        _d : list
+            -if dates are available in data file
+            (or metadata in same location): list of dates
+            - if not: range of band numbers
+
+        """
+        if None in self.dataset.descriptions:
+            # dates are not available (no metadata/aux file):
+            _d = range(self.__len__())
+            if self.dataset.profile["driver"] == 'ENVI':
+                if re.search(r"\d{8}", self.dataset.name):
+                    date_str = re.search(r"\d{8}", self.dataset.name)[0]
+                    _d = [date_str]
+        else:
+            _d = [d[-8:] for d in self.dataset.descriptions]
+
+        return _d
+
+    @span('Cube.load_band')
+    def load_band(self, i=0):
+        """
+        load band i from dataset, in texture/data orientation
+
+        Parameters
+        ----------
+        i : int, optional
+            Band number to load. The default is 0.
+
+        Returns
+        -------
+        band : array
+            Loaded band data.
+        TYPE
+            nodata value in band i.
+        TYPE
+            type of data in band i.
+        """
+        from rasterio.enums import Resampling
+        dataset = self.dataset
+        index = dataset.indexes[i]
+        with self.lock:
+            band = dataset.read(index,
+                                out_shape=(dataset.height//1,
+                                           dataset.width//1),
+                                resampling=Resampling.nearest)
+        if self.flipped:
+            band = np.flipud(band)
+        if dataset.profile["driver"] == 'ENVI':
+            # nodata of ENVI files is nan with current datasets
+            return band, 0.0, dataset.dtypes[i]
+        return band, dataset.profile.get('nodata', None), dataset.dtypes[i]
+
+    @span('Cube.load_profile')
+    def load_profile(self, i, j):
+        """
+        Load data corresponding to all bands/dates, at point (i,j)
+        (texture/data coordinates)
+
+        Parameters
+        ----------
+        i : float or int
+            col number
+        j : float or int
+            row number
+
+        Returns
+        -------
+        array
+            dataset values at point (i,j) (in texture/data coordinates)
+            for all bands/dates.
+
+        """
+        try:
+            dataset = self.dataset
+        except AttributeError:
+            return []
+        i, j = int(i), int(j)
+        if self.flipped:
+            j = dataset.shape[0] - (j+1)
+
+        with self.lock:
+            data = dataset.read(dataset.indexes,
+                                window=(
+                                    (j, j+1), (i, i+1))).reshape((self.__len__()))
+
+        # set nodata to nan
+        data[data == self.nodata] = np.nan
+        return data
+
+    @span('Cube.load_profiles')
+    def load_profiles(self, points, bilinear=False):
+        """
+        Load data corresponding to all bands/dates, at several points
+        (texture/data coordinates), reading the window bounding the points
+        at once instead of one read per point.
+
+        Parameters
+        ----------
+        points : array
+            n-by-2 array of (i, j) coordinates (col, row) of the points, may
+            be fractional (e.g. points sampled along a profile line).
+        bilinear : bool, optional
+            if True, interpolate values bilinearly between the 4 pixels
+            surrounding each point (nan if one of them is nodata), otherwise
+            take the value of the nearest pixel. The default is False.
+
+        Returns
+        -------
+        array
+            n-by-number of bands/dates array of dataset values at points
+            (nodata set to nan).
+
+        """
+        dataset = self.dataset
+        points = np.asarray(points, dtype=float).reshape((-1, 2))
+        if bilinear:
+            return self._load_bilinear(points)
+        points = np.rint(points).astype(int)
+        i, j = points[:, 0], points[:, 1]
+        if self.flipped:
+            j = dataset.shape[0] - (j+1)
+
+        i0, j0 = i.min(), j.min()
+        width, height = i.max()+1 - i0, j.max()+1 - j0
+        if width * height <= self.max_window_ratio * len(points) + 4096:
+            # compact set of points (rectangle...): read bounding window
+            with self.lock:
+                window = dataset.read(dataset.indexes,
+                                      window=((j0, j0+height),
+                                              (i0, i0+width)))
+            data = window[:, j-j0, i-i0].T.astype(float)
+        else:
+            # sparse set of points (long line...): read one row span per row
+            data = np.empty((len(points), self.__len__()))
+            row_numbers, inverse = np.unique(j, return_inverse=True)
+            for r, row in enumerate(row_numbers):
+                on_row = np.flatnonzero(inverse == r)
+                c0, c1 = i[on_row].min(), i[on_row].max()+1
+                with self.lock:
+                    rows = dataset.read(dataset.indexes,
+                                        window=((row, row+1), (c0, c1)))
+                data[on_row] = rows[:, 0, i[on_row]-c0].T
+
+        # set nodata to nan
+        data[data == self.nodata] = np.nan
+        return data
+
+    @span('Cube.load_window')
+    def load_window(self, i0, j0, width, height):
+        """
+        Load data corresponding to all bands/dates, in a window (one read)
+
+        Parameters
+        ----------
+        i0, j0 : int
+            texture/data coordinates (col, row) of the window's first pixel.
+        width, height : int
+            size of the window.
+
+        Returns
+        -------
+        array
+            number of bands/dates-by-height-by-width float32 array of dataset
+            values, in texture/data orientation (first row is row j0),
+            nodata set to nan.
+
+        """
+        dataset = self.dataset
+        if self.flipped:
+            rows = (dataset.shape[0] - (j0+height), dataset.shape[0] - j0)
+        else:
+            rows = (j0, j0+height)
+        with self.lock:
+            data = dataset.read(dataset.indexes,
+                                window=(rows, (i0, i0+width))).astype('float32')
+        if self.flipped:
+            data = data[:, ::-1]
+
+        # set nodata to nan
+        data[data == self.nodata] = np.nan
+        return data
+
+    def open_weights(self, filename):
+        """
+        Open a single band raster of per-pixel weights (e.g. coherence) with
+        the same size as dataset, used for weighted reference series.
+
+        Parameters
+        ----------
+        filename : str, path
+            Name of the file to load (with path).
+
+        Returns
+        -------
+        None.
+
+        """
+        import rasterio
+        with rasterio.open(filename) as src:
+            if src.shape != self.dataset.shape:
+                raise ValueError(f"weights {src.shape} and dataset "
+                                 f"{self.dataset.shape} sizes differ")
+            weights = src.read(1).astype('float32')
+            nd = src.nodata
+            # geotiff opens with GTiff or ENVI rasterio driver, is flipped ud
+            if src.driver in ('GTiff', 'ENVI'):
+                weights = np.flipud(weights)
+        if nd is not None:
+            weights[weights == nd] = 0.
+        weights[~np.isfinite(weights)] = 0.
+        self.weights = weights
+
+    def _load_bilinear(self, points):
+        """
+        bilinear interpolation of data at points, see load_profiles
+        """
+        h, w = self.dataset.shape
+        corner = np.floor(points).astype(int)
+        corner[:, 0] = np.clip(corner[:, 0], 0, max(w-2, 0))
+        corner[:, 1] = np.clip(corner[:, 1], 0, max(h-2, 0))
+        fi, fj = np.clip(points - corner, 0., 1.).T
+        weights = np.stack(((1-fi)*(1-fj), fi*(1-fj), (1-fi)*fj, fi*fj),
+                           axis=1)[..., None]
+        corners = np.minimum(corner[:, None] + [(0, 0), (1, 0), (0, 1), (1, 1)],
+                             (w-1, h-1))
+        # read each pixel once:
+        pixels, inverse = np.unique(corners.reshape((-1, 2)), axis=0,
+                                    return_inverse=True)
+        values = self.load_profiles(pixels)[inverse.reshape(-1)].reshape(
+            (len(points), 4, -1))
+        return np.where(weights > 0., weights * values, 0.).sum(axis=1)
+
+    def distances(self, points):
+        """
+        Distances between consecutive points (texture/data coordinates), in
+        dataset's crs units (pixels if dataset is not georeferenced).
+
+        Parameters
+        ----------
+        points : array
+            n-by-2 array of (i, j) coordinates (col, row) of the points.
+
+        Returns
+        -------
+        array
+            n-1 distances.
+
+        """
+        dcol, drow = np.diff(np.asarray(points, dtype=float).reshape((-1, 2)),
+                             axis=0).T
+        if self.flipped:
+            drow = -drow
+        t = self.dataset.transform
+        return np.hypot(t.a*dcol + t.b*drow, t.d*dcol + t.e*drow)
+
+    def texture_coords(self, x, y):
+        """
+        Texture/data coordinates of points given in dataset's crs.
+
+        Parameters
+        ----------
+        x, y : float or array
+            coordinates (e.g. east, north) of the points.
+
+        Returns
+        -------
+        i, j : array
+            fractional texture/data coordinates (col, row) of the points,
+            pixel (i, j) spanning [i, i+1) x [j, j+1).
+
+        """
+        i, row = ~self.dataset.transform * (np.asarray(x, dtype=float),
+                                            np.asarray(y, dtype=float))
+        if self.flipped:
+            return i, self.dataset.shape[0] - row
+        return i, row
+
+    def distance_units(self):
+        """
+        units of distances (see distances)
+        """
+        crs = self.dataset.crs
+        if crs is None or self.dataset.transform.is_identity:
+            return 'pixel'
+        if crs.is_geographic:
+            return 'degree'
+        units = crs.linear_units
+        return 'm' if units in ('metre', 'meter') else units
+
+    def get_metadata(self, filename):
+        """
+        creates a dictionnary containing all metadata entries,
+        if a '.meta' file exists in same repo as the datacube file
+
+        Parameters
+        ----------
+        filename : str
+            name of the datacube file
+
+        Returns
+        -------
+        dict
+            metadata (also stored in metadata attribute).
+
+        """
+        metafilename = filename.split('.')[0] + '.meta'
+        self.metadata = {}
+        try:
+            with open(metafilename) as f:
+                for line in f:
+                    (key, val) = line.split(sep=': ', maxsplit=1)
+                    self.metadata[key] = val.strip()
+        except FileNotFoundError:
+            logger.info(f"no metadata file found ({metafilename})")
+        return self.metadata
+
+
+# stacking ##################################################################
+
+
+def _read_bands(file_list, threads=STACK_THREADS):
+    """
+    Generator of the (first) bands of file_list, in order, read by a pool of
+    threads (rasterio releases the GIL while reading and decoding) at most
+    2 x threads files ahead of the consumer, so that memory stays bounded.
+    Closing it cancels the reads ahead.
+    """
+    import rasterio
+
+    def read(layer):
+        with rasterio.open(layer) as src1:
+            return src1.read(1)
+
+    todo = iter(file_list)
+    with ThreadPoolExecutor(threads, thread_name_prefix='stack-read') as pool:
+        ahead = deque(pool.submit(read, layer)
+                      for _, layer in zip(range(2 * threads), todo))
+        try:
+            while ahead:
+                band = ahead.popleft().result()
+                for layer in todo:
+                    ahead.append(pool.submit(read, layer))
+                    break
+                yield band
+        finally:
+            for future in ahead:
+                future.cancel()
+
+
+# worker processes ##########################################################
+
+_worker_cube = None  # cube of this worker process, see cube_pool
+
+
+def _set_worker_cube(cube):
+    global _worker_cube
+    _worker_cube = cube
+
+
+def worker_cube():
+    """cube of this worker process (see cube_pool), None outside of them"""
+    return _worker_cube
+
+
+def cube_pool(cube, workers=None):
+    """
+    Pool of worker processes each holding a copy of cube (pickled once per
+    process, dataset reopened), returned by worker_cube in jobs.
+
+    Parameters
+    ----------
+    cube : Cube
+        cube to read from in worker processes.
+    workers : int or None, optional
+        number of worker processes. The default is None (number of CPUs).
+
+    Returns
+    -------
+    ProcessPoolExecutor
+
+    """
+    # spawn: do not fork the (multithreaded, Qt) main process
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_set_worker_cube, initargs=(cube,))
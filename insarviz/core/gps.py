@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""
+GPS stations time series, read from a folder of WebObs-format text files
+(one file per station, named after the station), located in the raster of
+a dataset.
+"""
+
+# imports ###################################################################
+
+import glob
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+DATE = re.compile(r"\d{4}\s\d{2}\s\d{2}")
+
+# gps network ###############################################################
+
+
+class GpsNetwork():
+    """
+    GPS stations of a folder: gps_data[station] holds dates ('date', POSIX
+    timestamps), displacements relative to first date ('east', 'north',
+    'up') and first values ('ref_east'...), projected coordinates
+    ('ref_east_pj', 'ref_north_pj') and position in the dataset's raster
+    ('ref_east_ras', 'ref_north_ras', texture/data coordinates).
+    """
+
+    def __init__(self, gps_folder, metadata):
+        """
+        Parameters
+        ----------
+        gps_folder : str
+            folder of station files (*.txt).
+        metadata : dict
+            rasterio profile of the dataset (crs, width, height, transform).
+
+        Returns
+        -------
+        None.
+
+        """
+        self.metadata = metadata
+        # Read data from metadata
+        self.crs = re.split(r":", str(self.metadata['crs']))[1]
+        self.width = re.search(r"\d+", str(self.metadata['width']))[0]
+        self.height = re.search(r"\d+", str(self.metadata['height']))[0]
+        self.transf = self.metadata['transform']
+
+        # Create gps dictionary data
+        self.gps_data = {}
+        if os.path.isdir(gps_folder):
+            target = "{}/*".format(gps_folder)
+            file_list = [x for x in glob.glob(target)
+                         if re.search(r".*\.txt$", x)]
+            file_list.sort()
+            # Fill gps_data file by file
+            for file in file_list:
+                with open(file, 'r') as f:
+                    lines = f.readlines()
+                self.sta_name = re.split(r"\.", os.path.basename(file))[0]
+                self.gps_data[self.sta_name] = self.parse_station(lines)
+        logger.debug(f"{len(self.gps_data)} GPS stations in {gps_folder}")
+
+    def __len__(self):
+        return len(self.gps_data)
+
+    def parse_station(self, lines):
+        """
+        Data of a station, see class description.
+
+        Parameters
+        ----------
+        lines : list
+            lines of the station's file.
+
+        Returns
+        -------
+        dict
+            station's data.
+
+        """
+        station = {}
+        station['date'] = self.get_gps_file_x_axis(lines)
+        station['east'], station['ref_east'] = self.get_gps_file_y_axis(lines, 6)
+        station['north'], station['ref_north'] = self.get_gps_file_y_axis(lines, 7)
+        station['up'], station['ref_up'] = self.get_gps_file_y_axis(lines, 8)
+
+        ref_east_pj, ref_north_pj = self.get_coord(lines)
+        if ref_east_pj != 0 and ref_north_pj != 0:
+            station['ref_east_pj'] = ref_east_pj
+            station['ref_north_pj'] = ref_north_pj
+            # position of station in the raster, using transform
+            station['ref_east_ras'] = int((ref_east_pj - self.transf.c)/self.transf.a)
+            station['ref_north_ras'] = int((self.transf.f - ref_north_pj)/abs(self.transf.e))
+            # The raster is inverted in insarviz for north orientation, the
+            # southest is 0 and northest the height value
+            station['ref_north_ras'] = int(self.height) - station['ref_north_ras']
+        else:
+            station['ref_east_pj'] = 0
+            station['ref_north_pj'] = 0
+            station['ref_east_ras'] = 0
+            station['ref_north_ras'] = 0
+        return station
+
+    def get_gps_file_x_axis(self, lines):
+        """ Function to extract time from gps file in 3 actios:
+            1. extract date into an array the line containing informations
+            2. convert date into time struct object
+            3. convert date into float time from epoch
+            """
+        date_array = [DATE.search(x)[0] for x in lines if DATE.search(x)]
+        date_array_py = [time.strptime(x, "%Y %m %d") for x in date_array]
+        date_array_py = [time.mktime(x) for x in date_array_py]
+        return date_array_py
+
+    def get_gps_file_y_axis(self, lines, position):
+        """ Function to extract specific data from gps file in 3 actios:
+            1. extract East value from line containing informations
+            2. Make vaule relative to the 1st one
+            """
+        orientation_array = [re.split(r"\s", x)[position] for x in lines
+                             if DATE.search(x)]
+        orientation_array_rel = [(float(x) - float(orientation_array[0]))
+                                 for x in orientation_array]
+        return orientation_array_rel, orientation_array[0]
+
+    def get_coord(self, lines):
+        """ Function to extract specific data from gps file in 3 actios:
+            1. extract coordinate from line containing informations
+            2. Make vaule relative to the 1st one
+            """
+        coord_x = 0
+        coord_y = 0
+        try:
+            coord = [re.search(r"\d+.+\d+", x)[0] for x in lines
+                     if re.search(r"COORD", x)]
+            coord_x = re.split(r"\s", str(coord[0]))[0]
+            coord_y = re.split(r"\s", str(coord[0]))[1]
+        except (IndexError, TypeError):
+            logger.info("Coordinate not found")
+        return int(coord_x), int(coord_y)
+
+    def load_profile(self, station):
+        """
+        Time series of a station.
+
+        Parameters
+        ----------
+        station : str
+            station name.
+
+        Returns
+        -------
+        tuple
+            dates (POSIX timestamps), north, east and up displacements.
+
+        """
+        data = self.gps_data[station]
+        return data['date'], data['north'], data['east'], data['up']
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+
+"""
+Chunked HDF5 and NetCDF4 (HDF5 based) cubes, read with h5py (optional
+dependency) through the subset of the rasterio dataset interface used by
+Cube (shape, profile, descriptions, read...), e.g. MintPy timeseries.h5 or
+NSBAS NetCDF outputs.
+
+The cube is the 3d dataset (bands/dates, rows, columns) named after one of
+DATA_NAMES (or the largest 3d numeric dataset). Dates are read from a date
+dataset (MintPy, YYYYMMDD strings) or from the CF time coordinate of the
+first dimension; georeferencing from MintPy attributes (X_FIRST, X_STEP...)
+or from the CF coordinates of the last two dimensions.
+
+Reads go through HDF5's chunk cache, sized so that it holds at least the
+chunks of a time series (a column of chunks along the dates), besides
+those of the last bands: hovering pixels of the same chunks (or reading
+neighbouring bands) does not read and decompress them again.
+
+Dual layout cubes (see insarviz.convert) are read by bands from spatially
+tiled chunks and by time series (several bands) from time-contiguous
+chunks, reduced resolution reads come from their overviews.
+"""
+
+# imports ###################################################################
+
+import logging
+import os
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = ('.h5', '.hdf5', '.he5', '.nc', '.nc4', '.cdf')
+# dual layout cubes written by insarviz.convert: band chunks in the cube's
+# dataset, time series chunks in 'series', decimated cubes in 'overviews':
+LAYOUT = 'insarviz dual layout 1'
+CONTAINER_SUFFIX = '.insarviz.h5'
+DATA_NAMES = ('timeseries', 'displacement', 'depl_cumule', 'data')
+DATE_NAMES = ('date', 'dates')
+# default chunk cache size (bytes), see H5Dataset:
+CHUNK_CACHE = 64 * 2**20
+# seconds per CF time unit:
+TIME_UNITS = dict(seconds=1, minutes=60, hours=3600, days=86400)
+
+
+def is_hdf5(filename):
+    """True if filename is a HDF5/NetCDF file (by extension)"""
+    return os.path.splitext(str(filename))[1].lower() in EXTENSIONS
+
+
+def container_name(filename):
+    """
+    name of the dual layout cube converted from filename (file or folder),
+    opened instead of it by Cube.open when up to date
+    """
+    return os.path.normpath(str(filename)) + CONTAINER_SUFFIX
+
+
+def _next_prime(n):
+    """smallest prime number >= n (number of slots of a chunk cache)"""
+    n = max(int(n), 2)
+    while any(n % d == 0 for d in range(2, int(n**.5) + 1)):
+        n += 1
+    return n
+
+
+def mintpy_georeferencing(attrs):
+    """
+    Georeferencing of MintPy attributes (X_FIRST, Y_FIRST: corner of first
+    pixel, X_STEP, Y_STEP: pixel size, EPSG or crs_wkt, X_UNIT).
+
+    Parameters
+    ----------
+    attrs : dict
+        attributes of a file or dataset.
+
+    Returns
+    -------
+    tuple or None
+        (affine transform, rasterio CRS or None), None if attrs have no
+        georeferencing.
+
+    """
+    if not all(k in attrs for k in ('X_FIRST', 'Y_FIRST', 'X_STEP',
+                                    'Y_STEP')):
+        return None
+    from affine import Affine
+    from rasterio.crs import CRS
+    transform = Affine(float(attrs['X_STEP']), 0., float(attrs['X_FIRST']),
+                       0., float(attrs['Y_STEP']), float(attrs['Y_FIRST']))
+    if 'EPSG' in attrs:
+        return transform, CRS.from_epsg(int(attrs['EPSG']))
+    if 'crs_wkt' in attrs:
+        return transform, CRS.from_wkt(attrs['crs_wkt'])
+    if 'deg' in str(attrs.get('X_UNIT', 'degrees')).lower():
+        return transform, CRS.from_epsg(4326)
+    return transform, None
+
+
+def date_strings(values):
+    """
+    dates (YYYYMMDD) of an array of date strings (bytes or str starting
+    with YYYYMMDD), None if values are not dates
+    """
+    dates = [d.decode() if isinstance(d, bytes) else str(d) for d in values]
+    if not all(re.match(r"\d{8}", d) for d in dates):
+        return None
+    return tuple(d[:8] for d in dates)
+
+
+def cf_dates(values, units):
+    """
+    dates (YYYYMMDD) of CF time coordinate values, None if units (e.g.
+    'days since 2017-01-01') are not supported
+    """
+    if isinstance(units, bytes):
+        units = units.decode()
+    match = isinstance(units, str) and re.match(
+        r"(\w+) since (\d{4}-\d{2}-\d{2})", units)
+    if not match or match[1] not in TIME_UNITS:
+        return None
+    seconds = np.rint(np.asarray(values, dtype=float) * TIME_UNITS[match[1]])
+    dates = np.datetime64(match[2], 's') + seconds.astype('timedelta64[s]')
+    return tuple(d.replace('-', '') for d in
+                 np.datetime_as_string(dates, unit='D'))
+
+
+def cf_georeferencing(x, y, mapping=None, x_name='x'):
+    """
+    Georeferencing of CF coordinates of pixel centers.
+
+    Parameters
+    ----------
+    x, y : array
+        coordinates of columns and rows (regularly spaced).
+    mapping : dict or None, optional
+        attributes of the grid mapping variable (crs_wkt or spatial_ref).
+        The default is None.
+    x_name : str, optional
+        name of the x coordinate, longitudes (EPSG:4326 if mapping has no
+        crs) if it starts with 'lon'. The default is 'x'.
+
+    Returns
+    -------
+    tuple
+        (affine transform, rasterio CRS or None).
+
+    """
+    from affine import Affine
+    from rasterio.crs import CRS
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    dx, dy = (x[-1] - x[0]) / (len(x) - 1), (y[-1] - y[0]) / (len(y) - 1)
+    transform = Affine(dx, 0., x[0] - dx/2, 0., dy, y[0] - dy/2)
+    for key in ('crs_wkt', 'spatial_ref'):
+        if key in (mapping or {}):
+            wkt = mapping[key]
+            return transform, CRS.from_wkt(
+                wkt.decode() if isinstance(wkt, bytes) else wkt)
+    if x_name.lower().startswith('lon'):
+        return transform, CRS.from_epsg(4326)
+    return transform, None
+
+
+# datasets ##################################################################
+
+
+class ArrayDataset():
+    """
+    Cube of bands/dates stored as 3d arrays (bands/dates, rows, columns),
+    read like a rasterio dataset (1-based band indexes, windows as ((row
+    start, row stop), (col start, col stop)) in file order). Subclasses set
+    data (read by bands), series (read by time series), overviews ({factor:
+    decimated cube}), height, width and indexes.
+    """
+
+    def read(self, indexes=None, window=None, out_shape=None, **kwargs):
+        """
+        Read bands (1-based indexes) in a window, like rasterio's read.
+        Single bands are read from data, several bands from series (e.g. the
+        time series layout of dual layout cubes), and reduced resolution
+        reads (out_shape) from overviews.
+
+        Parameters
+        ----------
+        indexes : int or sequence of int or None, optional
+            band (2d result) or bands (3d result). The default is None
+            (all bands).
+        window : tuple or None, optional
+            ((row start, row stop), (col start, col stop)) in file order.
+            The default is None (whole bands).
+        out_shape : tuple or None, optional
+            shape of the result (nearest neighbour resampling). The default
+            is None (window's shape).
+        **kwargs :
+            other rasterio arguments (resampling...), ignored.
+
+        Returns
+        -------
+        array
+
+        """
+        if window is None:
+            window = ((0, self.height), (0, self.width))
+        (r0, r1), (c0, c1) = window
+        if indexes is None:
+            indexes = self.indexes
+        source = self.data if np.ndim(indexes) == 0 else self.series
+        if out_shape is not None and self.overviews:
+            # largest decimation not below the requested resolution:
+            ratio = min((r1 - r0) / out_shape[-2], (c1 - c0) / out_shape[-1])
+            factors = [f for f in self.overviews if f <= ratio]
+            if factors:
+                f = max(factors)
+                source = self.overviews[f]
+                r0, r1, c0, c1 = r0 // f, -(-r1 // f), c0 // f, -(-c1 // f)
+        if np.ndim(indexes) == 0:
+            data = source[int(indexes) - 1, r0:r1, c0:c1]
+        else:
+            bands = np.asarray(indexes, dtype=int) - 1
+            if (np.diff(bands) == 1).all():
+                # contiguous bands (e.g. all of them): one hyperslab
+                data = source[bands[0]:bands[-1]+1, r0:r1, c0:c1]
+            else:
+                order, inverse = np.unique(bands, return_inverse=True)
+                data = source[order.tolist(), r0:r1, c0:c1][inverse]
+        if out_shape is not None and tuple(out_shape[-2:]) != data.shape[-2:]:
+            rows = np.linspace(0, data.shape[-2] - 1, out_shape[-2]).round()
+            cols = np.linspace(0, data.shape[-1] - 1, out_shape[-1]).round()
+            data = data[..., rows.astype(int)[:, None], cols.astype(int)]
+        return data
+
+
+class H5Dataset(ArrayDataset):
+    """
+    Cube stored in a HDF5/NetCDF4 file, see ArrayDataset.
+    """
+
+    def __init__(self, filename, chunk_cache=None):
+        """
+        Parameters
+        ----------
+        filename : str, path
+            HDF5 or NetCDF4 file.
+        chunk_cache : int or None, optional
+            size (bytes) of the chunk cache, at least the size of the chunks
+            of a time series. The default is None (CHUNK_CACHE, or more to
+            hold the chunks of a time series).
+
+        Returns
+        -------
+        None.
+
+        """
+        try:
+            import h5py
+        except ImportError:
+            raise RuntimeError("HDF5/NetCDF files need h5py, convert "
+                               f"{filename} to GeoTIFF instead")
+        self.name = filename
+        with h5py.File(filename, 'r') as f:
+            path = self._find_data(f)
+            data = f[path]
+            shape, chunks, dtype = data.shape, data.chunks, data.dtype
+            dual = f.attrs.get('insarviz_layout') == LAYOUT
+            # chunks read by time series:
+            series_chunks = f['series'].chunks if dual else chunks
+        cache, slots = self._cache_size(shape, series_chunks, dtype,
+                                        chunk_cache)
+        self.file = h5py.File(filename, 'r', rdcc_nbytes=cache,
+                              rdcc_nslots=slots)
+        self.data = self.file[path]
+        self.series = self.file['series'] if dual else self.data
+        self.overviews = {int(f): ov for f, ov in
+                          self.file['overviews'].items()} if dual else {}
+        self.count, self.height, self.width = shape
+        self.shape = (self.height, self.width)
+        self.indexes = tuple(range(1, self.count+1))
+        self.dtypes = (str(dtype),) * self.count
+        self.block_shapes = [chunks[1:] if chunks else (1, self.width)] \
+            * self.count
+        self.descriptions = self._read_dates()
+        self.transform, self.crs = self._georeferencing()
+        # rows from top to bottom (like GeoTIFF files) unless the y
+        # coordinate of a georeferenced file increases with rows:
+        self.bottom_up = (not self.transform.is_identity
+                          and self.transform.e > 0)
+        self.profile = dict(
+            driver='HDF5', dtype=str(dtype), nodata=self._nodata(),
+            width=self.width, height=self.height, count=self.count,
+            crs=self.crs, transform=self.transform, variable=path,
+            chunks=chunks, chunk_cache=cache)
+        if dual:
+            self.profile.update(series_chunks=series_chunks,
+                                overviews=sorted(self.overviews))
+        logger.debug(f"open {filename}:{path} {shape} chunks {chunks}, "
+                     f"cache {cache} bytes")
+
+    def close(self):
+        self.file.close()
+
+    # file structure ########################################################
+
+    @staticmethod
+    def _find_data(f):
+        """path of the cube's dataset in h5py file f"""
+        found = []
+
+        def visit(path, item):
+            if (getattr(item, 'ndim', 0) == 3
+                    and item.dtype.kind in 'iuf'):
+                found.append((path.split('/')[-1] in DATA_NAMES, item.size,
+                              path))
+        f.visititems(visit)
+        if not found:
+            raise ValueError(f"no 3d dataset in {f.filename}")
+        return max(found)[2]
+
+    @staticmethod
+    def _cache_size(shape, chunks, dtype, chunk_cache):
+        """chunk cache size (bytes) and number of slots, see __init__"""
+        cache = CHUNK_CACHE if chunk_cache is None else int(chunk_cache)
+        if not chunks:
+            return cache, 521
+        chunk = int(np.prod(chunks)) * np.dtype(dtype).itemsize
+        column = -(-shape[0] // chunks[0]) * chunk  # chunks of a time series
+        if chunk_cache is None:
+            cache = max(cache, 4 * column)
+        elif cache < column:
+            logger.warning(f"chunk cache ({cache} bytes) smaller than the "
+                           f"chunks of a time series ({column} bytes): time "
+                           "series will be read from the file at each call")
+        # HDF5 advice: prime number of slots, ~100 times the cached chunks
+        return cache, _next_prime(100 * max(cache // chunk, 1))
+
+    def _attrs(self):
+        """attributes of the cube's dataset and of the file (root)"""
+        attrs = dict(self.file.attrs)
+        attrs.update(self.data.attrs)
+        return {k: v.decode() if isinstance(v, bytes) else v
+                for k, v in attrs.items()}
+
+    def _dimension(self, axis):
+        """CF coordinate (dimension scale) of axis, None if not available"""
+        try:
+            scales = self.data.dims[axis]
+            scale = scales[0] if len(scales) else None
+        except (IndexError, KeyError, RuntimeError):
+            return None
+        if scale is None:
+            return None
+        # netCDF dimensions without coordinate variable are empty scales:
+        name = scale.attrs.get('NAME', b'')
+        if isinstance(name, bytes):
+            name = name.decode(errors='replace')
+        return None if 'not a netCDF variable' in name else scale
+
+    def _read_dates(self):
+        """
+        band descriptions: dates (YYYYMMDD) if available, None otherwise
+        """
+        for name in DATE_NAMES:
+            if name in self.file and len(self.file[name]) == self.count:
+                dates = date_strings(self.file[name][()])
+                if dates is not None:
+                    return dates
+        time = self._dimension(0)
+        if time is not None:
+            dates = cf_dates(time[()], time.attrs.get('units'))
+            if dates is not None:
+                return dates
+        return (None,) * self.count
+
+    def _georeferencing(self):
+        """
+        affine transform (file rows and columns to x, y) and crs (rasterio
+        CRS, None if not georeferenced)
+        """
+        from affine import Affine
+        attrs = self._attrs()
+        georeferencing = mintpy_georeferencing(attrs)
+        if georeferencing is not None:
+            return georeferencing
+        y, x = self._dimension(1), self._dimension(2)
+        if x is None or y is None or len(x) < 2 or len(y) < 2:
+            return Affine.identity(), None
+        mapping = attrs.get('grid_mapping')
+        mapping = (dict(self.file[mapping].attrs)
+                   if mapping is not None and mapping in self.file else {})
+        return cf_georeferencing(x[()], y[()], mapping,
+                                 x.name.split('/')[-1])
+
+    def _nodata(self):
+        """fill value of the cube's dataset, nan if not set"""
+        for key in ('_FillValue', 'missing_value', 'NO_DATA_VALUE'):
+            value = self.data.attrs.get(key, self.file.attrs.get(key))
+            try:
+                return float(np.ravel(value)[0])
+            except (TypeError, ValueError, IndexError):
+                continue
+        return np.nan
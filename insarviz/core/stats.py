@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+Statistics of a band (percentiles, histogram) and its normalized texture
+data, as shown by Map and its palette.
+"""
+
+# imports ###################################################################
+
+import numpy as np
+
+# statistics ################################################################
+
+
+def band_histogram(band, target_size=200, nbins=500):
+    """
+    Histogram of a band's finite values, computed on a regular subsample of
+    the band (same as pyqtgraph's ImageItem.getHistogram, without the need
+    for a graphics item, so that it can run outside of the GUI thread).
+
+    Parameters
+    ----------
+    band : 2d array
+        band data, nodata set to nan.
+    target_size : int, optional
+        approximate size of the subsample along each axis.
+        The default is 200.
+    nbins : int, optional
+        number of bins. The default is 500.
+
+    Returns
+    -------
+    tuple
+        (bins, counts) arrays, bins are the left edges of the bins.
+        (None, None) if band contains no finite value.
+
+    """
+    step = (max(1, int(np.ceil(band.shape[0] / target_size))),
+            max(1, int(np.ceil(band.shape[1] / target_size))))
+    data = band[::step[0], ::step[1]]
+    data = data[np.isfinite(data)]
+    if data.size == 0:
+        return None, None
+    mn, mx = data.min(), data.max()
+    if mx == mn:
+        mx += 1
+    counts, edges = np.histogram(data, bins=np.linspace(mn, mx, nbins))
+    return edges[:-1], counts
+
+
+class Stats():
+    """
+    Percentiles and histogram of a band's valid values (neither nodata nor
+    nan), and its texture data normalized between min and max.
+    """
+
+    percentiles = (0, 5, 95, 100)
+
+    def __init__(self, band, nodata=None):
+        """
+        Parameters
+        ----------
+        band : 2d array
+            band data (e.g. Cube.load_band), left unchanged.
+        nodata : float or None, optional
+            nodata value of band, in addition to nan. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        band = np.asarray(band)
+        self.background = ~np.isfinite(band)
+        if nodata is not None:
+            self.background |= band == nodata
+        # band with nodata set to nan:
+        self.band = np.where(self.background, np.nan, band).astype(
+            band.dtype if band.dtype.kind == 'f' else 'float64')
+        valid = self.band[~self.background]
+        if valid.size == 0:
+            valid = np.zeros(1)
+        self.v_i, self.v_5, self.v_95, self.v_a = np.percentile(
+            valid, self.percentiles)
+
+    @property
+    def levels(self):
+        """(min, 5th percentile, 95th percentile, max)"""
+        return self.v_i, self.v_5, self.v_95, self.v_a
+
+    def histogram(self):
+        """(bins, counts) of valid values, see band_histogram"""
+        return band_histogram(self.band)
+
+    def texture(self):
+        """
+        Texture data: band normalized between min and max, and opacity.
+
+        Returns
+        -------
+        array
+            height-by-width-by-2 float32 array of (normalized value,
+            opacity), opacity being 0 on background (normalized value 0 or
+            nodata normalized).
+
+        """
+        h, w = self.band.shape
+        z = np.ones((h, w, 2), dtype='float32')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z[:, :, 0] = (self.band - self.v_i) / (self.v_a - self.v_i)
+        z[:, :, 0][self.background] = 0.
+        z[:, :, 1][self.background] = 0.
+        return z
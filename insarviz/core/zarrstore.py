@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+"""
+Zarr stores (local directories) of cubes chunked along (time, y, x), read
+with zarr (optional dependency) like rasterio datasets (see
+hdf5.ArrayDataset). The cube is the store's 3d array (or the one named
+after one of hdf5.DATA_NAMES in a group), dates come from a 'date' array,
+a 'dates' attribute or a CF time coordinate (e.g. stores written by
+xarray), georeferencing from MintPy attributes or CF x/y coordinates.
+
+Reads are split along chunk boundaries and the chunks are fetched and
+decompressed (Blosc, Zstd... release the GIL) concurrently by a pool of
+threads, for bands, windows and time series spanning several chunks.
+
+New acquisitions are appended along the time axis with append: only the
+last (partial) time chunks and the new ones are written, the rest of the
+store is left unchanged.
+"""
+
+# imports ###################################################################
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from insarviz.core.hdf5 import (
+    DATA_NAMES, ArrayDataset, cf_dates, cf_georeferencing, date_strings,
+    mintpy_georeferencing,
+    )
+
+READ_THREADS = min(32, (os.cpu_count() or 1) + 4)
+_pool = None  # chunk reading threads, see read_pool
+
+
+def is_zarr(filename):
+    """True if filename is a Zarr store (directory, v2 or v3)"""
+    filename = str(filename)
+    return os.path.isdir(filename) and (
+        filename.rstrip('/\\').lower().endswith('.zarr')
+        or any(os.path.exists(os.path.join(filename, name))
+               for name in ('.zarray', '.zgroup', 'zarr.json')))
+
+
+def read_pool():
+    """threads reading chunks, shared by all stores of the process"""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=READ_THREADS,
+                                   thread_name_prefix='zarr-read')
+    return _pool
+
+
+def _import_zarr(filename):
+    try:
+        import zarr
+    except ImportError:
+        raise RuntimeError("Zarr stores need zarr, convert "
+                           f"{filename} to GeoTIFF instead")
+    return zarr
+
+
+def _open_cube(root):
+    """(cube's array, its name in group root or None) of a store"""
+    if not hasattr(root, 'array_keys'):
+        return root, None
+    found = [(name in DATA_NAMES, root[name].size, name)
+             for name in root.array_keys()
+             if root[name].ndim == 3 and root[name].dtype.kind in 'iuf']
+    if not found:
+        raise ValueError(f"no 3d array in Zarr store {root}")
+    name = max(found)[2]
+    return root[name], name
+
+
+# reading ###################################################################
+
+
+def _spans(start, stop, chunk):
+    """[start, stop) split at chunk boundaries"""
+    edges = list(range(start - start % chunk + chunk, stop, chunk))
+    return list(zip([start] + edges, edges + [stop]))
+
+
+class ChunkReader():
+    """
+    3d array read by chunks in parallel: array[bands, rows, cols] with
+    bands an int, a slice or a list, rows and cols slices.
+    """
+
+    def __init__(self, array):
+        self.array = array
+        self.shape, self.dtype, self.chunks = (array.shape, array.dtype,
+                                               array.chunks)
+
+    def __getitem__(self, key):
+        bands, rows, cols = key
+        if isinstance(bands, list):
+            bands = np.asarray(bands)
+            b0 = bands.min()
+            return self[b0:bands.max()+1, rows, cols][bands - b0]
+        single = not isinstance(bands, slice)
+        if single:
+            bands = slice(int(bands), int(bands) + 1)
+        box = [s.indices(n)[:2] for s, n in zip((bands, rows, cols),
+                                                self.shape)]
+        out = np.empty([max(b - a, 0) for a, b in box], dtype=self.dtype)
+        parts = [(t, r, c)
+                 for t in _spans(*box[0], self.chunks[0])
+                 for r in _spans(*box[1], self.chunks[1])
+                 for c in _spans(*box[2], self.chunks[2])] if out.size else []
+
+        def read(part):
+            source = tuple(slice(a, b) for a, b in part)
+            target = tuple(slice(a - o, b - o)
+                           for (a, b), (o, _) in zip(part, box))
+            out[target] = self.array[source]
+
+        if len(parts) == 1:
+            read(parts[0])
+        elif parts:
+            # list: wait for all reads (and raise their exceptions)
+            list(read_pool().map(read, parts))
+        return out[0] if single else out
+
+
+class ZarrDataset(ArrayDataset):
+    """
+    Cube stored in a Zarr store, see ArrayDataset.
+    """
+
+    def __init__(self, filename):
+        """
+        Parameters
+        ----------
+        filename : str, path
+            Zarr store (directory).
+
+        Returns
+        -------
+        None.
+
+        """
+        zarr = _import_zarr(filename)
+        self.name = filename
+        self.root = zarr.open(filename, mode='r')
+        array, path = _open_cube(self.root)
+        self.data = self.series = ChunkReader(array)
+        self.overviews = {}
+        self.count, self.height, self.width = array.shape
+        self.shape = (self.height, self.width)
+        self.indexes = tuple(range(1, self.count+1))
+        self.dtypes = (str(array.dtype),) * self.count
+        self.block_shapes = [tuple(array.chunks[1:])] * self.count
+        attrs = {} if path is None else dict(self.root.attrs)
+        attrs.update(array.attrs)
+        # xarray: names of the dimensions' coordinates
+        self.dimensions = attrs.get('_ARRAY_DIMENSIONS', [None] * 3)
+        self.descriptions = self._read_dates(attrs)
+        self.transform, self.crs = self._georeferencing(attrs)
+        self.bottom_up = (not self.transform.is_identity
+                          and self.transform.e > 0)
+        nodata = np.nan
+        for key in ('_FillValue', 'missing_value', 'NO_DATA_VALUE'):
+            try:
+                nodata = float(attrs[key])
+                break
+            except (KeyError, TypeError, ValueError):
+                continue
+        self.profile = dict(
+            driver='Zarr', dtype=str(array.dtype), nodata=nodata,
+            width=self.width, height=self.height, count=self.count,
+            crs=self.crs, transform=self.transform, variable=path,
+            chunks=tuple(array.chunks), threads=READ_THREADS)
+
+    def close(self):
+        pass
+
+    def _coordinate(self, axis):
+        """CF coordinate array of axis (xarray stores), None if missing"""
+        name = self.dimensions[axis]
+        if name is None or not hasattr(self.root, 'array_keys') \
+                or name not in self.root:
+            return None
+        return self.root[name]
+
+    def _read_dates(self, attrs):
+        """band descriptions: dates (YYYYMMDD) if available, None otherwise"""
+        if hasattr(self.root, 'array_keys') and 'date' in self.root:
+            dates = date_strings(self.root['date'][:])
+            if dates is not None and len(dates) == self.count:
+                return dates
+        if len(attrs.get('dates', ())) == self.count:
+            dates = date_strings(attrs['dates'])
+            if dates is not None:
+                return dates
+        time = self._coordinate(0)
+        if time is not None:
+            dates = cf_dates(time[:], time.attrs.get('units'))
+            if dates is not None and len(dates) == self.count:
+                return dates
+        return (None,) * self.count
+
+    def _georeferencing(self, attrs):
+        """affine transform and crs (None if not georeferenced)"""
+        from affine import Affine
+        georeferencing = mintpy_georeferencing(attrs)
+        if georeferencing is not None:
+            return georeferencing
+        y, x = self._coordinate(1), self._coordinate(2)
+        if x is None or y is None or len(x[:]) < 2 or len(y[:]) < 2:
+            return Affine.identity(), None
+        mapping = attrs.get('grid_mapping')
+        mapping = (dict(self.root[mapping].attrs)
+                   if mapping is not None and mapping in self.root else {})
+        return cf_georeferencing(x[:], y[:], mapping, self.dimensions[2])
+
+
+# writing ###################################################################
+
+
+def append(filename, bands, dates=None):
+    """
+    Append bands/dates to a Zarr store. The last chunks along the time axis
+    are rewritten if they are partial (number of bands/dates not a multiple
+    of the time chunk size), new chunks are written after them and the
+    other chunks are left unchanged.
+
+    Parameters
+    ----------
+    filename : str, path
+        Zarr store (directory).
+    bands : array
+        band (2d) or bands (3d) in file order.
+    dates : list or None, optional
+        dates (YYYYMMDD) of bands, appended to the store's 'date' array or
+        'dates' attribute. The default is None.
+
+    Returns
+    -------
+    int
+        number of bands/dates of the store.
+
+    """
+    zarr = _import_zarr(filename)
+    root = zarr.open(filename, mode='r+')
+    array, path = _open_cube(root)
+    bands = np.asarray(bands, dtype=array.dtype).reshape(
+        (-1,) + tuple(array.shape[1:]))
+    array.append(bands, axis=0)
+    if dates is not None:
+        if path is not None and 'date' in root:
+            root['date'].append(np.asarray(dates, dtype=root['date'].dtype))
+        else:
+            array.attrs['dates'] = list(array.attrs.get('dates', [])) \
+                + list(dates)
+    return array.shape[0]
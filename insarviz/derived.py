@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+"""
+Derived cubes: cubes computed lazily from a source cube (Loader or another
+derived cube) by a temporal transform applied to each pixel's time series
+(moving average or median, detrended residuals, increments, reference
+correction). They have the same load_band/load_profile(s)/load_window
+interface as Loader, so that Map and plots can show them in place of the
+dataset, and compute them by square chunks of pixels (all bands/dates), or
+band by band from the few bands a transform needs, memoized up to a memory
+budget.
+"""
+
+# imports ###################################################################
+
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from insarviz.velocity import design_matrix, fit_block, years
+
+# transforms ################################################################
+# transforms take a number of bands/dates-by-n array of time series (nan for
+# nodata) and return an array of the same shape. Transforms of band/date i
+# depending only on bands/dates i - before to i + after have a span attribute
+# (before, after) and take the number of the first band/date of data as
+# second argument, so that a band can be derived from a few bands only (see
+# DerivedCube.load_band)
+
+
+def moving_average(window):
+    """centered moving average over window bands/dates (nan ignored)"""
+    def transform(data, first=0):
+        return _moving(data, window, np.nanmean)
+    transform.span = (window // 2, window - 1 - window // 2)
+    return transform
+
+
+def moving_median(window):
+    """centered moving median over window bands/dates (nan ignored)"""
+    def transform(data, first=0):
+        return _moving(data, window, np.nanmedian)
+    transform.span = (window // 2, window - 1 - window // 2)
+    return transform
+
+
+def _moving(data, window, statistic):
+    """statistic over centered windows, truncated at first/last dates"""
+    half = window // 2
+    padded = np.pad(data, ((half, window - 1 - half), (0, 0)),
+                    constant_values=np.nan)
+    windows = sliding_window_view(padded, window, axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-nan windows
+        return statistic(windows, axis=-1)
+
+
+def detrend(timestamps):
+    """residuals of each pixel's linear trend (see velocity.fit_block)"""
+    X, _ = design_matrix(years(timestamps))
+
+    def transform(data):
+        params, _ = fit_block(data, X)
+        return data - X @ params
+    return transform
+
+
+def increments(data, first=0):
+    """difference between each band/date and the previous one (nan first)"""
+    return np.concatenate((np.full_like(data[:1], np.nan),
+                           np.diff(data, axis=0)))
+
+
+increments.span = (1, 0)
+
+
+def reference(ref_series):
+    """subtract a reference value (e.g. reference zone mean) from each band"""
+    ref_series = np.asarray(ref_series, dtype=float)[:, None]
+
+    def transform(data, first=0):
+        return data - ref_series[first:first+len(data)]
+    transform.span = (0, 0)
+    return transform
+
+
+# derived cube ##############################################################
+
+
+class DerivedCube():
+    """
+    Cube derived from source by transform, computed on demand by square
+    chunks of chunk_size pixels (all bands/dates at once), or by bands if
+    transform has a span (see transforms above), memoized in least recently
+    used order up to cache_size bytes. Other attributes (dataset, metadata,
+    _dates, distances...) are those of source.
+    """
+
+    chunk_size = 256  # side of chunks, in pixels
+    cache_size = 2**28  # max size of memoized chunks, in bytes
+
+    def __init__(self, source, transform, name=None):
+        """
+        Parameters
+        ----------
+        source : Loader or DerivedCube
+            cube to derive from.
+        transform : callable
+            temporal transform of time series, see transforms above.
+        name : str or None, optional
+            name of derived cube. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.source = source
+        self.transform = transform
+        self.name = name
+        # (chunk col, chunk row): data, and ('band', i): band
+        self.chunks = OrderedDict()
+        self.cached_bytes = 0
+        # bands may be loaded from worker threads (playback, derived stats)
+        self.chunk_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name == 'source':  # not initialized yet
+            raise AttributeError(name)
+        return getattr(self.source, name)
+
+    def __len__(self):
+        return len(self.source)
+
+    def chunk(self, ci, cj):
+        """
+        Derived data of a chunk (computed if not memoized).
+
+        Parameters
+        ----------
+        ci, cj : int
+            chunk col and row numbers.
+
+        Returns
+        -------
+        array
+            number of bands/dates-by-height-by-width float32 array (height
+            and width may be smaller than chunk_size on the last row/col).
+
+        """
+        def compute():
+            h, w = self.source.dataset.shape
+            size = self.chunk_size
+            i0, j0 = ci * size, cj * size
+            width, height = min(size, w - i0), min(size, h - j0)
+            data = self.source.load_window(i0, j0, width, height)
+            data = self.transform(data.reshape((len(data), -1)))
+            return data.astype('float32').reshape((-1, height, width))
+        return self._memoized((ci, cj), compute)
+
+    def _memoized(self, key, compute):
+        """data of key in chunks, computed (outside of chunk_lock) and
+        memoized if missing"""
+        with self.chunk_lock:
+            if key in self.chunks:
+                self.chunks.move_to_end(key)
+                return self.chunks[key]
+        data = compute()
+        with self.chunk_lock:
+            if key in self.chunks:
+                # computed meanwhile by another thread
+                self.chunks.move_to_end(key)
+                return self.chunks[key]
+            self.chunks[key] = data
+            self.cached_bytes += data.nbytes
+            while self.cached_bytes > self.cache_size and len(self.chunks) > 1:
+                _, dropped = self.chunks.popitem(last=False)
+                self.cached_bytes -= dropped.nbytes
+        return data
+
+    def load_window(self, i0, j0, width, height):
+        """
+        Load derived data of all bands/dates in a window, see
+        Loader.load_window.
+        """
+        data = np.empty((len(self), height, width), dtype='float32')
+        size = self.chunk_size
+        for cj in range(j0 // size, (j0 + height - 1) // size + 1):
+            for ci in range(i0 // size, (i0 + width - 1) // size + 1):
+                chunk = self.chunk(ci, cj)
+                # intersection of chunk and window:
+                a0, a1 = max(i0, ci * size), min(i0 + width, (ci+1) * size)
+                b0, b1 = max(j0, cj * size), min(j0 + height, (cj+1) * size)
+                data[:, b0-j0:b1-j0, a0-i0:a1-i0] = \
+                    chunk[:, b0-cj*size:b1-cj*size, a0-ci*size:a1-ci*size]
+        return data
+
+    def load_band(self, i=0):
+        """
+        Load derived band i (texture/data orientation), see
+        Loader.load_band; nodata is nan. If transform has a span, band i is
+        derived from source bands i - before to i + after only.
+        """
+        span = getattr(self.transform, 'span', None)
+        if span is not None:
+            return self._memoized(('band', i),
+                                  lambda: self._derive_band(i, span)), \
+                None, 'float32'
+        h, w = self.source.dataset.shape
+        size = self.chunk_size
+        band = np.empty((h, w), dtype='float32')
+        for cj in range(-(-h // size)):
+            for ci in range(-(-w // size)):
+                band[cj*size:(cj+1)*size, ci*size:(ci+1)*size] = \
+                    self.chunk(ci, cj)[i]
+        return band, None, 'float32'
+
+    def _derive_band(self, i, span):
+        """derived band i, from source bands in span (before, after) of i"""
+        h, w = self.source.dataset.shape
+        first, last = max(0, i - span[0]), min(len(self), i + span[1] + 1)
+        data = np.empty((last - first, h * w))
+        for k in range(first, last):
+            band, nd, _ = self.source.load_band(k)
+            data[k - first] = band.ravel()
+            if nd is not None:
+                data[k - first][data[k - first] == nd] = np.nan
+        band = self.transform(data, first)[i - first]
+        return band.astype('float32').reshape((h, w))
+
+    def load_profile(self, i, j):
+        """
+        Load derived data of all bands/dates at point (i, j), see
+        Loader.load_profile.
+        """
+        data = np.asarray(self.source.load_profile(i, j), dtype=float)
+        return self.transform(data[:, None])[:, 0]
+
+    def load_profiles(self, points, bilinear=False):
+        """
+        Load derived data of all bands/dates at several points, see
+        Loader.load_profiles.
+        """
+        data = self.source.load_profiles(points, bilinear=bilinear)
+        return self.transform(data.T).T
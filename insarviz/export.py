@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Headless export of Map frames (PNG files) or animations (GIF/MP4), using
+the CPU renderer (insarviz.map.cpu_render), see ts_viz --export-frames.
+"""
+
+# imports ###################################################################
+
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from insarviz.core import Stats
+from insarviz.map.cpu_render import (
+    get_palette, render_band, draw_stations, write_png,
+    )
+
+logger = logging.getLogger(__name__)
+
+ANIMATION_FORMATS = ('.gif', '.mp4')
+
+# export ####################################################################
+
+
+def _render(band, nodata, palette, levels, background, stations):
+    """worker process job: render one band"""
+    rgba = render_band(band, palette, *levels, nodata=nodata,
+                       background=background)
+    if stations:
+        draw_stations(rgba, stations)
+    return rgba
+
+
+def _read_bands(loader, bands, out):
+    """
+    reader thread: put (index, band, nodata) in bounded queue out, then None
+    (end of bands), or the exception raised reading a band
+    """
+    try:
+        for i in bands:
+            band, nd, _ = loader.load_band(i)
+            out.put((i, band, nd))
+    except Exception as e:
+        # re-raised by export_frames
+        out.put(e)
+    else:
+        out.put(None)
+
+
+class FfmpegWriter():
+    """
+    Write frames to an animated GIF or MP4 file by piping raw RGBA frames
+    to a local ffmpeg executable.
+    """
+
+    def __init__(self, filename, width, height, fps):
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg executable not found, needed to write "
+                               f"{filename}, export PNG frames instead")
+        cmd = [ffmpeg, '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgba',
+               '-s', f"{width}x{height}", '-r', str(fps), '-i', '-']
+        if filename.endswith('.mp4'):
+            # yuv420p needs even dimensions
+            cmd += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                    '-pix_fmt', 'yuv420p', '-vcodec', 'libx264']
+        cmd += [filename]
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, rgba):
+        self.process.stdin.write(rgba.tobytes())
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError("ffmpeg failed")
+
+    def kill(self):
+        """stop ffmpeg (export failed), the output file is incomplete"""
+        self.process.kill()
+        self.process.wait()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+
+def export_frames(loader, output, palette='grey', levels=None, bands=None,
+                  fps=5, workers=None, background=None, stations=None):
+    """
+    Render bands and write them as PNG frames or as an animation.
+
+    Bands are read in order by a reader thread into a bounded queue, color
+    coded by a pool of worker processes (at most 2 bands per worker in
+    flight) and written in order.
+
+    Parameters
+    ----------
+    loader : Loader or Cube
+        Loader or cube with an opened dataset.
+    output : str
+        output directory for PNG frames (created if needed), or .gif/.mp4
+        animation file name.
+    palette : str, bytes or array, optional
+        palette, see cpu_render.get_palette. The default is 'grey'.
+    levels : tuple or None, optional
+        (v_0, v_1) data values mapped to palette bounds. The default is None
+        (5th and 95th percentiles of the middle band, as in ts_viz).
+    bands : iterable or None, optional
+        bands to export, in order. The default is None (all bands).
+    fps : int, optional
+        frame rate of animations. The default is 5.
+    workers : int or None, optional
+        number of worker processes. The default is None (number of CPUs).
+    background : tuple or None, optional
+        RGBA color of nodata pixels. The default is None (transparent).
+    stations : dict or None, optional
+        {name: (i, j)} GPS stations to draw. The default is None.
+
+    Returns
+    -------
+    list
+        names of written files.
+
+    """
+    palette = get_palette(palette)
+    if bands is None:
+        bands = range(len(loader))
+    bands = list(bands)
+    if levels is None:
+        stats = Stats(*loader.load_band(len(loader) // 2)[:2])
+        levels = (stats.v_5, stats.v_95)
+    logger.info(f"export {len(bands)} bands to {output}, levels {levels}")
+
+    animation = output.lower().endswith(ANIMATION_FORMATS)
+    if not animation:
+        os.makedirs(output, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    names = []
+    writer = None
+
+    read_queue = queue.Queue(maxsize=2 * workers)
+    reader = threading.Thread(target=_read_bands,
+                              args=(loader, bands, read_queue),
+                              daemon=True)
+    reader.start()
+
+    def write(i, rgba):
+        nonlocal writer
+        if animation:
+            if writer is None:
+                writer = FfmpegWriter(output, rgba.shape[1], rgba.shape[0],
+                                      fps)
+                names.append(output)
+            writer.write(rgba)
+        else:
+            name = os.path.join(output, f"frame_{i:04d}.png")
+            write_png(name, rgba)
+            names.append(name)
+        logger.debug(f"exported band {i}")
+
+    # spawn: do not fork the process running the reader thread (and Qt)
+    pool = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        with pool:
+            in_flight = deque()
+            while True:
+                item = read_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                i, band, nd = item
+                in_flight.append((i, pool.submit(_render, band, nd, palette,
+                                                 levels, background,
+                                                 stations)))
+                if len(in_flight) >= 2 * workers:
+                    i, future = in_flight.popleft()
+                    write(i, future.result())
+            while in_flight:
+                i, future = in_flight.popleft()
+                write(i, future.result())
+    except BaseException:
+        if writer is not None:
+            writer.kill()
+            if os.path.exists(output):
+                os.remove(output)
+        raise
+    if writer is not None:
+        writer.close()
+    return names
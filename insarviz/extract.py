@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+
+"""
+Headless extraction of time series at many points, polygons (mean of their
+pixels) or GPS stations, see ts_viz extract.
+
+Features are rasterized to pixels, pixels are grouped by square blocks of
+the cube and each block is read once (window bounding its pixels) in worker
+processes. Series are written (CSV or Parquet, one row per series, one
+column per band/date) as soon as all the blocks of their feature are read.
+"""
+
+# imports ###################################################################
+
+import csv
+import datetime
+import json
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from insarviz.core import Cube, GpsNetwork, cube_pool, worker_cube
+from insarviz.reference import region_mask
+from insarviz.velocity import BLOCK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# features ##################################################################
+
+
+class Feature():
+    """
+    Named point, polygon or GPS station, rasterized to pixels (texture/data
+    coordinates, pixels outside of the cube are dropped).
+    """
+
+    def __init__(self, name, kind, pixels, station=None):
+        self.name = name
+        self.kind = kind  # 'point', 'polygon' or 'station'
+        self.pixels = _pixel(pixels).reshape((-1, 2))
+        self.station = station
+
+
+def _pixel(coords):
+    """pixel of fractional texture/data coordinates (robust to round-off)"""
+    return np.floor(np.round(np.asarray(coords, dtype=float), 6)).astype(int)
+
+
+def _to_texture(cube, x, y, crs=None):
+    """texture/data coordinates of points given in crs (default: cube's)"""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if crs is not None and cube.dataset.crs is not None:
+        from pyproj import Transformer
+        transformer = Transformer.from_crs(crs, cube.dataset.crs,
+                                           always_xy=True)
+        x, y = transformer.transform(x, y)
+    return cube.texture_coords(x, y)
+
+
+def _polygon_pixels(vertices):
+    """pixels of a polygon given by fractional texture coordinates"""
+    i0, j0, mask = region_mask(_pixel(vertices))
+    jj, ii = np.nonzero(mask)
+    return np.stack((ii + i0, jj + j0), axis=1)
+
+
+def read_features(filename, cube, crs=None, gps=None):
+    """
+    Read features to extract from a CSV or GeoJSON file.
+
+    CSV files have a name column, and either i and j (texture/data
+    coordinates) or x and y (coordinates in crs) columns of points, or a
+    station column (GPS station names). GeoJSON files have Point and Polygon
+    features, named by their 'name' property; a 'station' property refers to
+    a GPS station.
+
+    Parameters
+    ----------
+    filename : str
+        .csv, .json or .geojson file.
+    cube : Cube
+        cube to extract from.
+    crs : str or None, optional
+        crs of x/y or GeoJSON coordinates. The default is None (cube's crs
+        for CSV files, EPSG:4326 for GeoJSON files, see RFC 7946).
+    gps : GpsNetwork or None, optional
+        GPS stations referred to by features. The default is None.
+
+    Returns
+    -------
+    list
+        Features.
+
+    """
+    def station(name):
+        if gps is None:
+            raise ValueError(f"station {name}: needs a GPS folder (--gps)")
+        data = gps.gps_data[name]
+        i, j = _to_texture(cube, data['ref_east_pj'], data['ref_north_pj'])
+        return Feature(name, 'station', [(i, j)], station=name)
+
+    features = []
+    if filename.lower().endswith(('.json', '.geojson')):
+        with open(filename) as f:
+            collection = json.load(f)
+        crs = crs or 'EPSG:4326'
+        for k, feature in enumerate(collection['features']):
+            properties = feature.get('properties') or {}
+            name = str(properties.get('name', k))
+            if properties.get('station'):
+                features.append(station(properties['station']))
+                continue
+            geometry = feature['geometry']
+            coords = np.asarray(geometry['coordinates'], dtype=float)
+            if geometry['type'] == 'Point':
+                i, j = _to_texture(cube, *coords[:2], crs)
+                features.append(Feature(name, 'point', [(i, j)]))
+            elif geometry['type'] == 'Polygon':
+                ring = np.asarray(geometry['coordinates'][0], dtype=float)
+                i, j = _to_texture(cube, ring[:, 0], ring[:, 1], crs)
+                features.append(Feature(
+                    name, 'polygon',
+                    _polygon_pixels(np.stack((i, j), axis=1))))
+            else:
+                raise ValueError(f"feature {name}: unsupported geometry "
+                                 f"{geometry['type']}")
+    else:
+        import pandas as pd
+        table = pd.read_csv(filename)
+        names = (table['name'].astype(str) if 'name' in table
+                 else table.index.astype(str))
+        if 'station' in table:
+            features = [station(s) for s in table['station']]
+        elif {'i', 'j'} <= set(table.columns):
+            features = [Feature(n, 'point', [(i, j)]) for n, i, j in
+                        zip(names, table['i'], table['j'])]
+        elif {'x', 'y'} <= set(table.columns):
+            i, j = _to_texture(cube, table['x'], table['y'], crs)
+            features = [Feature(n, 'point', [p]) for n, p in
+                        zip(names, zip(i, j))]
+        else:
+            raise ValueError(f"{filename}: needs i/j, x/y or station "
+                             "columns")
+
+    h, w = cube.dataset.shape
+    for feature in features:
+        inside = ((feature.pixels >= 0) & (feature.pixels < (w, h))).all(1)
+        if not inside.all():
+            logger.warning(f"{feature.name}: {np.sum(~inside)} pixel(s) "
+                           "outside of cube")
+            feature.pixels = feature.pixels[inside]
+    return features
+
+
+# extraction ################################################################
+
+
+def _extract_block(window, pixels, ids, cube=None):
+    """
+    job: sum and count of valid values of each feature's pixels in a window
+    of cube, cube being the worker process' cube by default (see
+    core.cube_pool)
+
+    Returns
+    -------
+    ids : array
+        features of the window.
+    sums, counts : array
+        number of features-by-number of bands/dates arrays.
+
+    """
+    if cube is None:
+        cube = worker_cube()
+    i0, j0, width, height = window
+    data = cube.load_window(i0, j0, width, height)
+    values = data[:, pixels[:, 1] - j0, pixels[:, 0] - i0].T
+    valid = np.isfinite(values)
+    ids, inverse = np.unique(ids, return_inverse=True)
+    sums = np.zeros((len(ids), values.shape[1]))
+    counts = np.zeros((len(ids), values.shape[1]))
+    np.add.at(sums, inverse, np.where(valid, values, 0.))
+    np.add.at(counts, inverse, valid)
+    return ids, sums, counts
+
+
+def blocks(features, block_size):
+    """
+    Group pixels of features by block_size x block_size blocks.
+
+    Returns
+    -------
+    list
+        (window (i0, j0, width, height) bounding the block's pixels, n-by-2
+        pixels, n feature numbers) of each block, in raster order.
+
+    """
+    if not features:
+        return []
+    pixels = np.concatenate([f.pixels for f in features])
+    ids = np.concatenate([np.full(len(f.pixels), k)
+                          for k, f in enumerate(features)])
+    keys = pixels[:, ::-1] // block_size  # (block row, block col)
+    order = np.lexsort((keys[:, 1], keys[:, 0]))
+    pixels, ids, keys = pixels[order], ids[order], keys[order]
+    starts = np.flatnonzero(np.r_[True, (np.diff(keys, axis=0) != 0).any(1)])
+    result = []
+    for p, q in zip(starts, np.r_[starts[1:], len(pixels)]):
+        (i0, j0), (i1, j1) = pixels[p:q].min(0), pixels[p:q].max(0)
+        result.append(((int(i0), int(j0), int(i1 - i0 + 1), int(j1 - j0 + 1)),
+                       pixels[p:q], ids[p:q]))
+    return result
+
+
+def extract(cube, features, reference=None, workers=None, block_size=None):
+    """
+    Time series of features (mean of their valid pixels at each band/date),
+    yielded as soon as all the blocks of a feature are read.
+
+    Parameters
+    ----------
+    cube : Cube
+        cube to extract from.
+    features : list
+        Features, see read_features.
+    reference : Feature or None, optional
+        feature whose series is subtracted from all series. The default is
+        None.
+    workers : int or None, optional
+        number of worker processes (1: read in this process). The default is
+        None (number of CPUs).
+    block_size : int or None, optional
+        side of blocks of pixels read at once. The default is None (at most
+        BLOCK_SIZE values per block).
+
+    Yields
+    ------
+    Feature, array
+        feature and its series (nan if no valid pixel).
+
+    """
+    nt = len(cube)
+    if block_size is None:
+        block_size = max(16, int(np.sqrt(BLOCK_SIZE / nt)))
+    ref = 0.
+    if reference is not None:
+        ref = next(extract(cube, [reference], workers=1,
+                           block_size=block_size))[1]
+
+    todo = blocks(features, block_size)
+    remaining = defaultdict(int)
+    for _, _, ids in todo:
+        for k in np.unique(ids):
+            remaining[k] += 1
+    sums = np.zeros((len(features), nt))
+    counts = np.zeros((len(features), nt))
+
+    def done(result):
+        ids, s, c = result
+        sums[ids] += s
+        counts[ids] += c
+        for k in ids:
+            remaining[k] -= 1
+            if remaining[k] == 0:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    series = np.where(counts[k] > 0, sums[k] / counts[k],
+                                      np.nan)
+                yield features[k], series - ref
+
+    # features without pixels (outside of the cube):
+    for k, feature in enumerate(features):
+        if k not in remaining:
+            yield feature, np.full(nt, np.nan)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(todo) < 2:
+        for window, pixels, ids in todo:
+            yield from done(_extract_block(window, pixels, ids, cube))
+    else:
+        with cube_pool(cube, workers) as pool:
+            futures = [pool.submit(_extract_block, *block) for block in todo]
+            for future in as_completed(futures):
+                yield from done(future.result())
+
+
+# gps comparison ############################################################
+
+
+def gps_los(gps, station, timestamps, los):
+    """
+    GPS displacement of a station projected on the line of sight, at
+    timestamps (linear interpolation, nan outside of the GPS series),
+    relative to the first timestamp with a value.
+
+    Parameters
+    ----------
+    gps : GpsNetwork
+        GPS stations.
+    station : str
+        station name.
+    timestamps : array
+        POSIX timestamps of bands/dates.
+    los : tuple
+        (east, north, up) components of the line of sight unit vector.
+
+    Returns
+    -------
+    array
+        displacement at each band/date.
+
+    """
+    date, north, east, up = (np.asarray(a, dtype=float)
+                             for a in gps.load_profile(station))
+    displacement = los[0] * east + los[1] * north + los[2] * up
+    series = np.interp(timestamps, date, displacement, left=np.nan,
+                       right=np.nan)
+    valid = np.flatnonzero(np.isfinite(series))
+    if valid.size:
+        series -= series[valid[0]]
+    return series
+
+
+# output ####################################################################
+
+
+class CsvWriter():
+    def __init__(self, filename, columns):
+        self.file = open(filename, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter():
+    def __init__(self, filename, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow, write a .csv "
+                               "file instead")
+        self.pyarrow = pyarrow
+        self.columns = columns
+        fields = [pyarrow.field(c, pyarrow.string()) for c in columns[:2]]
+        fields += [pyarrow.field(c, pyarrow.float64()) for c in columns[2:]]
+        self.schema = pyarrow.schema(fields)
+        self.writer = pyarrow.parquet.ParquetWriter(filename, self.schema)
+
+    def write(self, rows):
+        arrays = list(zip(*rows))
+        self.writer.write_table(self.pyarrow.Table.from_arrays(
+            [self.pyarrow.array(a, type=f.type)
+             for a, f in zip(arrays, self.schema)],
+            schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def _dates(cube):
+    """band/date labels and POSIX timestamps (None without dates)"""
+    dates = cube._dates()
+    if isinstance(dates, range):
+        return [str(d) for d in dates], None
+    return list(dates), np.array([
+        datetime.datetime.strptime(d, "%Y%m%d").timestamp() for d in dates])
+
+
+def main(argv=None):
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(
+        prog="ts_viz extract",
+        description=("extract time series at points, polygons or GPS "
+                     "stations of a cube"))
+    parser.add_argument("features",
+                        help=("CSV (name, i/j or x/y or station columns) or "
+                              "GeoJSON (Point, Polygon) file"))
+    parser.add_argument("-i", required=True, help="input cube filename")
+    parser.add_argument("-o", required=True,
+                        help="output .csv or .parquet file (needs pyarrow)")
+    parser.add_argument("-k", "--keep", default=None,
+                        help="stack file, if input is a folder of bands")
+    parser.add_argument("--crs", default=None,
+                        help=("crs of x/y or GeoJSON coordinates, default: "
+                              "cube's crs (CSV), EPSG:4326 (GeoJSON)"))
+    parser.add_argument("--reference", default=None, metavar="NAME",
+                        help="subtract the series of feature NAME")
+    parser.add_argument("--gps", default=None,
+                        help="directory of GPS files, for station features")
+    parser.add_argument("--los", type=float, nargs=3, default=None,
+                        metavar=("E", "N", "U"),
+                        help=("line of sight unit vector: add GPS LOS "
+                              "displacement rows for stations"))
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, default: all cores")
+    parser.add_argument("--block-size", type=int, default=None,
+                        help="side (pixels) of blocks read at once")
+    parser.add_argument("--chunk-cache", type=float, default=None,
+                        metavar="MB",
+                        help="chunk cache size of HDF5/NetCDF cubes (MB)")
+    parser.add_argument("-v", type=int, default=3,
+                        help=("set logging level: 0 critical, 1 error, "
+                              "2 warning, 3 info, 4 debug, default=info"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=[logging.CRITICAL, logging.ERROR, logging.WARNING,
+               logging.INFO, logging.DEBUG][args.v])
+
+    t0 = time.perf_counter()
+    cube = Cube(args.keep or "stack.tif", args.i,
+                chunk_cache=args.chunk_cache and int(args.chunk_cache * 2**20))
+    gps = None if args.gps is None else GpsNetwork(args.gps,
+                                                   cube.dataset.profile)
+    features = read_features(args.features, cube, args.crs, gps)
+    reference = None
+    if args.reference is not None:
+        try:
+            reference = next(f for f in features if f.name == args.reference)
+        except StopIteration:
+            raise SystemExit(f"no feature named {args.reference}")
+    labels, timestamps = _dates(cube)
+    if args.los is not None and timestamps is None:
+        raise SystemExit("GPS comparison needs dates in the cube")
+
+    columns = ['name', 'series'] + labels
+    if args.o.lower().endswith('.parquet'):
+        writer = ParquetWriter(args.o, columns)
+    else:
+        writer = CsvWriter(args.o, columns)
+    n = 0
+    try:
+        for feature, series in extract(cube, features, reference,
+                                       args.workers, args.block_size):
+            rows = [[feature.name, feature.kind] + series.tolist()]
+            if feature.station is not None and args.los is not None:
+                rows.append([feature.name, 'gps_los'] + gps_los(
+                    gps, feature.station, timestamps, args.los).tolist())
+            writer.write(rows)
+            n += 1
+    finally:
+        writer.close()
+    logger.info(f"{n} series of {len(labels)} bands/dates written to "
+                f"{args.o} in {time.perf_counter() - t0:.1f} s")
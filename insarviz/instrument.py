@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+Timing spans of hot paths (band and time series loading, Map painting,
+plots...). Functions decorated with span are timed only when instrumentation
+is enabled (ts_viz -v 4): each call is added to its span's statistics
+(count, total and max time, histogram of durations) and to a trace that can
+be dumped in Chrome trace format (chrome://tracing, Perfetto). Disabled,
+a span costs a global flag check.
+"""
+
+# imports ###################################################################
+
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+enabled = False
+max_events = 10**6  # trace events kept (first ones)
+NBINS = 25  # histogram bins: <1 µs, [1, 2) µs, [2, 4) µs... >= 2**23 µs
+
+stats = {}  # span name: [count, total (s), max (s), histogram]
+events = []  # Chrome trace complete events
+_lock = threading.Lock()
+_t0 = time.perf_counter()
+
+# spans #####################################################################
+
+
+def span(name=None):
+    """
+    Decorator timing calls of a function when instrumentation is enabled.
+
+    Parameters
+    ----------
+    name : str or None, optional
+        name of the span. The default is None (function's qualified name).
+
+    Returns
+    -------
+    callable
+        decorator.
+
+    """
+    def decorator(function):
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(label, t0, time.perf_counter())
+        return wrapper
+    return decorator
+
+
+def record(name, t0, t1):
+    """add a call of span name from t0 to t1 (perf_counter times)"""
+    duration = t1 - t0
+    k = min(max(int(np.log2(duration * 1e6)) + 1, 0), NBINS - 1) \
+        if duration > 1e-6 else 0
+    with _lock:
+        s = stats.get(name)
+        if s is None:
+            s = stats[name] = [0, 0., 0., np.zeros(NBINS, dtype=int)]
+        s[0] += 1
+        s[1] += duration
+        s[2] = max(s[2], duration)
+        s[3][k] += 1
+        if len(events) < max_events:
+            events.append((name, t0, duration, threading.get_ident()))
+
+
+def enable(trace=None):
+    """
+    Enable instrumentation.
+
+    Parameters
+    ----------
+    trace : str or None, optional
+        Chrome trace file written at exit. The default is None (no file).
+
+    Returns
+    -------
+    None.
+
+    """
+    global enabled
+    enabled = True
+    if trace is not None:
+        atexit.register(dump_trace, trace)
+
+
+def reset():
+    with _lock:
+        stats.clear()
+        events.clear()
+
+
+# reports ###################################################################
+
+
+def percentile(histogram, q):
+    """upper bound (s) of the histogram bin holding the q-th percentile"""
+    rank = np.searchsorted(np.cumsum(histogram), q / 100. * histogram.sum())
+    return 2.**rank * 1e-6
+
+
+def report():
+    """
+    Returns
+    -------
+    str
+        one line per span: number of calls, mean, median and 95th
+        percentile (upper bounds of histogram bins), max and total time,
+        and histogram of durations (log2 bins from 1 µs).
+
+    """
+    bars = ' ▁▂▃▄▅▆▇█'
+    lines = [f"{'span':<36} {'calls':>7} {'mean ms':>8} {'p50 ms':>8} "
+             f"{'p95 ms':>8} {'max ms':>8} {'total s':>8}  histogram "
+             "(1 µs, 2 µs... bins)"]
+    with _lock:
+        items = sorted(stats.items(), key=lambda item: -item[1][1])
+        for name, (count, total, longest, histogram) in items:
+            used = np.flatnonzero(histogram)
+            first, last = used[0], used[-1] + 1
+            scaled = histogram[first:last] / histogram.max()
+            bins = ''.join(bars[int(np.ceil(v * (len(bars) - 1)))]
+                           for v in scaled)
+            lines.append(
+                f"{name:<36} {count:>7} {1000. * total / count:8.3f} "
+                f"{1000. * percentile(histogram, 50):8.3f} "
+                f"{1000. * percentile(histogram, 95):8.3f} "
+                f"{1000. * longest:8.3f} {total:8.2f}  "
+                f"{' ' * first}{bins}")
+    return '\n'.join(lines)
+
+
+def dump_trace(filename):
+    """write recorded calls as a Chrome trace (JSON) file"""
+    pid = os.getpid()
+    with _lock:
+        trace = [dict(name=name, ph='X', pid=pid, tid=tid,
+                      ts=1e6 * (t0 - _t0), dur=1e6 * duration)
+                 for name, t0, duration, tid in events]
+    with open(filename, 'w') as f:
+        json.dump(dict(traceEvents=trace, displayTimeUnit='ms'), f)
+    logger.info(f"{len(trace)} timing spans written to {filename}")
@@ -91,6 +91,8 @@ class AbstractMapView(QOpenGLWidget):
         self.program = self.init_program()
         glActiveTexture(GL_TEXTURE0+DATA_UNIT)
         set_uniform(self.program, 'values', DATA_UNIT)
+        glActiveTexture(GL_TEXTURE0+DIFF_UNIT)
+        set_uniform(self.program, 'values2', DIFF_UNIT)
         glActiveTexture(GL_TEXTURE0+PALETTE_UNIT)
         set_uniform(self.program, b'palette', PALETTE_UNIT)
         set_uniform(self.program, 'v_0', 0.)
@@ -103,6 +105,16 @@ class AbstractMapView(QOpenGLWidget):
         v_i, v_a = self.model.tex_vi, self.model.tex_va
         set_uniform(self.program, 'v_i', v_i)
         set_uniform(self.program, 'v_a', v_a)
+        # derived view (band differencing, reference subtraction):
+        set_uniform(self.program, 'v2_i', self.model.diff_vi)
+        set_uniform(self.program, 'v2_a', self.model.diff_va)
+        set_uniform(self.program, 'diff',
+                    float(self.model.diff_band is not None
+                          and self.model.layer is None))
+        set_uniform(self.program, 'ref', self.model.ref_offset)
+        if self.model.layer is not None:
+            # layers have their own range, see Palette.update_bounds
+            return
         self.v_i = min(self.v_i, v_i)
         self.v_a = max(self.v_a, v_a)
         if old_state != (self.v_i, self.v_a):
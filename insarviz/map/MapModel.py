@@ -3,37 +3,91 @@
 
 # imports ###################################################################
 
+import threading
+from collections import OrderedDict
+
 from PyQt5.QtCore import (
-    QObject, pyqtSignal, pyqtSlot
+    QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
     )
 
-from PyQt5.QtGui import QPainter, QBrush, QColor
+from PyQt5.QtGui import QPainter, QBrush, QColor, QOpenGLContext
 
 from OpenGL.GL import (
-    glEnable, glGenTextures, glBindTexture,
+    glEnable, glGenTextures, glDeleteTextures, glBindTexture,
     glTexParameter, glTexImage2D, glGenerateMipmap,
     glDisable, GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER,
     GL_NEAREST, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR,
-    GL_LUMINANCE_ALPHA, GL_FLOAT,
+    GL_LUMINANCE_ALPHA, GL_LUMINANCE16_ALPHA16, GL_FLOAT,
     glActiveTexture, GL_TEXTURE0, 
     glBegin, glVertex2f, glEnd, GL_LINE_LOOP, glClear, glColor3f, glLineWidth
     )
+from OpenGL.GL.ARB.texture_float import (
+    glInitTextureFloatARB, GL_LUMINANCE_ALPHA32F_ARB
+    )
 
 import numpy as np
-from scipy.interpolate import interp1d
 
 
 from insarviz.map.Shaders import (
     DATA_UNIT, SEL_UNIT, PALETTE_UNIT
     )
 
-from pyqtgraph import ImageItem
+from insarviz.utils import (
+    get_neighbors_idxs, sample_polyline,
+    )
+
+from insarviz.core import Stats
 
-from insarviz.utils import get_neighbors_idxs
+from insarviz.instrument import span
 
 from insarviz.Interaction import IDLE, DRAG, ZOOM, POINTS, LIVE, PROFILE
 
-from insarviz.bresenham import line
+from insarviz.bresenham import polyline
+
+# workers ###################################################################
+
+
+class DerivedStatsSignals(QObject):
+    finished = pyqtSignal(object, object)
+
+
+class DerivedStatsWorker(QRunnable):
+    """
+    Compute percentiles and histogram of a derived view
+    (band i - band j - reference offset) outside of the GUI thread.
+    """
+
+    def __init__(self, loader, key):
+        """
+        Parameters
+        ----------
+        loader : QObject
+            Loader used to load bands from dataset.
+        key : tuple
+            (i, j, ref_offset, loader id): band, band to subtract (or None),
+            reference offset of the derived view and id of loader.
+        """
+        super().__init__()
+        self.loader = loader
+        self.key = key
+        self.signals = DerivedStatsSignals()
+
+    def run(self):
+        i, j, ref_offset, _ = self.key
+        band, nd, _ = self.loader.load_band(i)
+        band = band.astype('float64')
+        if nd is not None:
+            band[band == nd] = np.nan
+        if j is not None:
+            band2, nd2, _ = self.loader.load_band(j)
+            if nd2 is not None:
+                band2 = np.where(band2 == nd2, np.nan, band2)
+            band -= band2
+        band -= ref_offset
+        stats = Stats(band)
+        self.signals.finished.emit(
+            self.key, stats.levels + (stats.histogram(),))
+
 
 # map model #################################################################
 
@@ -47,16 +101,36 @@ class MapModel(QObject):
     tex_height = 512
     tex_vi = 0.  # min
     tex_va = 1.  # max
+    tex_format = None  # internal format of band textures, see make_texture
+    max_textures = 64  # band textures kept on the GPU, see load_texture
+    gl_view = None  # view whose (shared) GL context owns the textures
 
     sel_id = 0  # tex id for selection layer
     selection = None  # selection layer
 
-    profile_points = []  # points selected by user for profile
+    ov_id = 0  # tex id for decimated overview layer (Minimap)
+    overview_size = 256  # max size (px) of the overview's largest side
+
+    # derived view: band - diff_band - ref_offset, computed by the shaders
+    diff_band = None  # band subtracted from current band (None: disabled)
+    diff_id = 0  # tex id of diff_band
+    diff_ov_id = 0  # tex id of diff_band's overview
+    diff_vi = 0.  # min
+    diff_va = 1.  # max
+    ref_series = None  # reference value per band (None: disabled)
+    ref_offset = 0.  # reference value subtracted from current band
+    reset_levels = False  # set palette levels when derived stats are ready
+
+    # layers: maps computed from the whole dataset (e.g. velocity), shown
+    # instead of bands
+    layer = None  # name of current layer (None: current band is shown)
 
     # signals
     texture_changed = pyqtSignal()
     bounds_changed = pyqtSignal()
     init_histo_vals = pyqtSignal(tuple)
+    derived_stats_ready = pyqtSignal(tuple)
+    layers_changed = pyqtSignal()
 
     # init values for center and scale (zoom level)
     cx = tex_width // 2
@@ -73,15 +147,22 @@ class MapModel(QObject):
     ready_for_GPS = False
 
     all_pointers_ij = None
+    swath_half_width = 0  # half width of swath profiles (0: line profiles)
     ref_pointers = None
+    ref_vertices = None  # vertices of ref zone (pixel, rectangle, polygon)
 
-    def __init__(self, loader, nMaxPoints):
+    def __init__(self, loader, nMaxPoints, nProfilePoints=None):
         """MapModel
 
         Parameters
         ----------
         loader : QObject
             Loader used to load dataset from file.
+        nMaxPoints : int
+            max number of points in POINTS mode.
+        nProfilePoints : int or None, optional
+            max number of points sampled along profile lines. The default is
+            None (nMaxPoints).
 
         Returns
         -------
@@ -91,16 +172,34 @@ class MapModel(QObject):
         super().__init__()
         self.loader = loader
         self.nMaxPoints = nMaxPoints
-        self.textures = {}
+        self.nProfilePoints = nProfilePoints or nMaxPoints
+        self.textures = OrderedDict()  # least recently shown first
+        self.overviews = {}
         self.histograms = {}
+        self.prefetched = {}  # bands prepared in advance, see prepare_band
+        # prefetched is filled by another thread (see add_prefetched), with
+        # bands of the current loader (generation) only:
+        self.prefetch_lock = threading.Lock()
+        self.generation = 0
+        self.derived_stats = {}
+        self.pending_stats = set()
+        self.layers = {}  # name: (height-by-width map, unit), see add_layer
+        # points (pixels) of profile line, points selected by user for it:
+        self.profile_points = np.empty((0, 2), dtype=int)
+        self.profile_vertices = np.empty((0, 2), dtype=int)
 
 
 
         print("MapModel -- object creation -- finished")
 
+    @span('MapModel.show_band')
     def show_band(self, i):
         """
         Load, generate (if not existing) and show the texture of the ith band.
+        If a band to subtract (diff_band) and/or a reference series are set,
+        the derived view (band i - band diff_band - reference) is computed on
+        the GPU, its histogram and percentiles are computed lazily on a
+        worker thread.
 
         Parameters
         ----------
@@ -112,133 +211,457 @@ class MapModel(QObject):
         None.
 
         """
+        first = self.i < 0
         self.i = i
-        print("MapModel - show_band")
+        self.layer = None
         # band data
-        try:  # looking up cache
-            (self.tex_id,
-             self.tex_width, self.tex_height,
-             self.tex_vi, self.tex_v5,
-             self.tex_v95, self.tex_va,
-             ) = self.textures[i]
+        (self.tex_id,
+         self.tex_width, self.tex_height,
+         self.tex_vi, self.tex_v5,
+         self.tex_v95, self.tex_va,
+         ) = self.load_texture(i)
+        self.ov_id = self.overviews[i]
+
+        if first:  # first band loading
+            self.cx = self.tex_width // 2
+            self.cy = self.tex_height // 2
+            self.z = 1.
+            self.bounds_changed.emit()
+            # set colorbar histogram levels to current 5/95th percentiles
+            self.init_histo_vals.emit((self.tex_v5, self.tex_v95,))
+            self.update_selection()
+
+        # band to subtract and reference offset (derived view)
+        if self.diff_band is not None:
+            (self.diff_id, _, _,
+             self.diff_vi, _, _, self.diff_va,
+             ) = self.load_texture(self.diff_band)
+            self.diff_ov_id = self.overviews[self.diff_band]
+        self.ref_offset = 0.
+        if self.ref_series is not None:
+            self.ref_offset = self.ref_series[i]
+            if self.diff_band is not None:
+                self.ref_offset -= self.ref_series[self.diff_band]
+            self.ref_offset = float(np.nan_to_num(self.ref_offset))
+        if self.is_derived():
+            self.request_derived_stats()
+
+        self.texture_changed.emit()
+
+    def set_loader(self, loader):
+        """
+        Show bands of another cube with the same size (e.g. a derived cube,
+        see insarviz.derived): drop cached bands and derived views (layers
+        are kept) and show current band again.
+
+        Parameters
+        ----------
+        loader : Loader or DerivedCube
+            cube to load bands from.
 
+        Returns
+        -------
+        None.
+
+        """
+        self.loader = loader
+        self.free_textures([k for k in self.textures
+                            if not isinstance(k, str)])
+        with self.prefetch_lock:
+            # bands being prepared from the former loader will be dropped
+            self.generation += 1
+            self.prefetched.clear()
+        self.derived_stats.clear()
+        if self.i > -1 and self.layer is None:
+            self.reset_levels = True
+            self.show_band(self.i)
+            if not self.is_derived():
+                self.init_histo_vals.emit((self.tex_v5, self.tex_v95,))
+
+    def add_layer(self, name, data, unit=None):
+        """
+        Add (or replace) a layer, i.e. a map computed from the whole dataset
+        (e.g. mean velocity) that can be shown instead of bands, with its own
+        percentiles and histogram.
+
+        Parameters
+        ----------
+        name : str
+            name of layer.
+        data : array
+            height-by-width map, in texture/data orientation (nan where
+            undefined).
+        unit : str or None, optional
+            unit of values (palette axis label). The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.layers[name] = (np.asarray(data, dtype='float32'), unit)
+        if name in self.textures:  # drop outdated texture
+            self.free_textures([name])
+        self.layers_changed.emit()
+
+    def show_layer(self, name):
+        """
+        Show a layer added with add_layer instead of current band (band
+        differencing and reference subtraction do not apply to layers). The
+        palette keeps its own levels and colormap for each layer.
+
+        Parameters
+        ----------
+        name : str or None
+            name of layer, None to show current band again.
+
+        Returns
+        -------
+        None.
+
+        """
+        if name is None:
+            self.show_band(self.i)
+            return
+        (self.tex_id,
+         self.tex_width, self.tex_height,
+         self.tex_vi, self.tex_v5,
+         self.tex_v95, self.tex_va,
+         ) = self.load_texture(name)
+        self.ov_id = self.overviews[name]
+        self.layer = name
+        self.ref_offset = 0.
+        self.texture_changed.emit()
+
+    def current_key(self):
+        """
+        key of the shown texture in textures and histograms: current layer's
+        name or current band number.
+        """
+        return self.i if self.layer is None else self.layer
+
+    def unit(self):
+        """unit of shown values (None if unknown)"""
+        if self.layer is not None:
+            return self.layers[self.layer][1]
+        return self.loader.metadata.get('Value_unit')
+
+    def load_texture(self, i):
+        """
+        Load band i and generate its texture, overview and histogram if they
+        are not already cached. Uses the band prepared in advance by
+        prepare_band (e.g. by the playback prefetcher) if available.
+
+        Parameters
+        ----------
+        i : int or str
+            Band/date number or layer name to be loaded.
+
+        Returns
+        -------
+        tuple
+            (texture id, width, height, min, 5th percentile,
+             95th percentile, max)
+
+        """
+        try:  # looking up cache
+            self.textures.move_to_end(i)
+            return self.textures[i]
         except KeyError:
-            # print("MapModel - show_band -- exception l118")
+            pass
+
+        with self.prefetch_lock:
+            prepared = self.prefetched.pop(i, None)
+        if prepared is None:
+            prepared = self.prepare_band(i)
+        z, ov, (v_i, v_5, v_95, v_a), hist = prepared
+
+        h, w = z.shape[:2]
+        self.band_h = h
+        self.band_w = w
+
+        texture_id = self.make_texture(z)
+        self.overviews[i] = self.make_texture(ov, mipmap=False)
+
+        # store band texture param
+        self.textures[i] = (texture_id,
+                            w, h,
+                            v_i, v_5,
+                            v_95, v_a)
+
+        # store histogram:
+        self.hist = self.histograms[i] = hist
+
+        # drop least recently shown bands (not the shown/subtracted ones)
+        bands = [k for k in self.textures if not isinstance(k, str)]
+        excess = len(bands) - self.max_textures
+        if excess > 0:
+            self.free_textures([k for k in bands
+                                if k not in (i, self.i, self.diff_band)
+                                ][:excess])
+
+        return self.textures[i]
+
+    def free_textures(self, keys):
+        """
+        Drop the textures, overviews and histograms of bands/layers keys
+        and delete their GL textures.
+
+        Parameters
+        ----------
+        keys : list
+            Band/date numbers or layer names.
+
+        Returns
+        -------
+        None.
+
+        """
+        ids = []
+        for key in keys:
+            ids += [self.textures.pop(key)[0], self.overviews.pop(key)]
+            self.histograms.pop(key, None)
+        if not ids:
+            return
+        if QOpenGLContext.currentContext() is not None:
+            glDeleteTextures(ids)
+        elif self.gl_view is not None:
+            # contexts are shared (AA_ShareOpenGLContexts): any view's will do
+            self.gl_view.makeCurrent()
+            glDeleteTextures(ids)
+            self.gl_view.doneCurrent()
+
+    def prepare_band(self, i):
+        """
+        CPU part of band loading: read band i, compute its percentiles,
+        normalized texture data, decimated overview and histogram. Makes no
+        OpenGL call, so it can run on a worker thread.
+
+        Parameters
+        ----------
+        i : int or str
+            Band/date number or layer name (see add_layer) to be loaded.
+
+        Returns
+        -------
+        tuple
+            (texture data, overview data, (min, 5th percentile,
+             95th percentile, max), histogram)
+
+        """
+        if isinstance(i, str):
+            stats = Stats(self.layers[i][0])
+        else:
             band, nd, dtype = self.loader.load_band(i)
             assert dtype == 'float32'
+            # nodata and nan (nodata of derived cubes) are background
+            stats = Stats(band, nd)
 
-            # band data
-            if nd is None:
-                bg = np.zeros_like(band)
-            else:
-                bg = (band == nd)
+        z = stats.texture()
+        h, w = z.shape[:2]
 
-            # print("bg = ", bg)
-            v_i, v_5, v_95, v_a = np.percentile(band[~bg], [0, 5, 95, 100])
-            v = (band-v_i)/(v_a-v_i)
+        # decimated overview for Minimap, taken from this stats pass so
+        # that Minimap never samples the full resolution texture:
+        step = max(1, -(-max(h, w) // self.overview_size))
+        ov = np.ascontiguousarray(z[::step, ::step])
 
-            h, w = band.shape
-            z = np.ones((h, w, 2), dtype='float32')
-            z[:, :, 0] = v
-            z[:, :, 1][bg] = 0.
+        return z, ov, stats.levels, stats.histogram()
 
+    def add_prefetched(self, i, prepared, generation):
+        """
+        Store band i prepared in advance (see prepare_band) from another
+        thread, unless the loader changed since its preparation started.
 
-            self.band_h = h
-            self.band_w = w
+        Parameters
+        ----------
+        i : int
+            Band/date number.
+        prepared : tuple
+            see prepare_band.
+        generation : int
+            value of generation when preparation started.
 
-            glEnable(GL_TEXTURE_2D)
-            texture_id = glGenTextures(1)
-            glActiveTexture(GL_TEXTURE0+DATA_UNIT)
-            glBindTexture(GL_TEXTURE_2D, texture_id)
-            glTexParameter(GL_TEXTURE_2D,
-                           GL_TEXTURE_MAG_FILTER,
-                           GL_NEAREST)
-            glTexParameter(GL_TEXTURE_2D,
-                           GL_TEXTURE_MIN_FILTER,
-                           GL_LINEAR_MIPMAP_LINEAR)
+        Returns
+        -------
+        None.
 
-            glTexImage2D(
-                GL_TEXTURE_2D,
-                0, GL_LUMINANCE_ALPHA,
-                w, h, 0,
-                GL_LUMINANCE_ALPHA,
-                GL_FLOAT,
-                z
-                )
-            glGenerateMipmap(GL_TEXTURE_2D)
-            glBindTexture(GL_TEXTURE_2D, 0)
-            glDisable(GL_TEXTURE_2D)
-
-            # store band texture param
-            self.textures[i] = (
-                self.tex_id,
-                self.tex_width, self.tex_height,
-                self.tex_vi, self.tex_v5,
-                self.tex_v95, self.tex_va,
-                ) = (
-                    texture_id,
-                    w, h,
-                    v_i, v_5,
-                    v_95, v_a,
-                    )
-
-            # make and store histogram:
-            band[bg] = np.nan
-            iband = ImageItem(band)
-            self.hist = iband.getHistogram()
-            self.histograms[i] = self.hist
-
-        if len(self.textures) == 1:  # first band loading
-            print("MapModel.py -- showMap -- set histogram l180")
-            print("texv5: tex_v95 = {} - {} ".format(self.tex_v5, self.tex_v95))
-            self.cx = self.tex_width // 2
-            self.cy = self.tex_height // 2
-            self.z = 1.
-            self.bounds_changed.emit()
-            # set colorbar histogram levels to current 5/95th percentiles
-            self.init_histo_vals.emit((self.tex_v5, self.tex_v95,))
-            self.update_selection()
+        """
+        with self.prefetch_lock:
+            if generation == self.generation:
+                self.prefetched[i] = prepared
 
-        self.texture_changed.emit()
+    def is_band_ready(self, i):
+        """
+        True if band i can be shown without reading the dataset.
+        """
+        return i in self.textures or i in self.prefetched
+
+    def is_derived(self):
+        """
+        True if the Map shows a derived view (band difference and/or
+        reference subtraction) instead of the plain band.
+        """
+        return (self.layer is None
+                and (self.diff_band is not None
+                     or self.ref_series is not None))
+
+    def derived_key(self):
+        """
+        key identifying the currently displayed derived view in
+        derived_stats.
+        """
+        return (self.i, self.diff_band, self.ref_offset, id(self.loader))
+
+    def set_diff_band(self, j):
+        """
+        Set the band to be subtracted from the displayed band.
+
+        Parameters
+        ----------
+        j : int or None
+            Band/date number to subtract, None to disable differencing.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.diff_band = j
+        self.reset_levels = True
+        if self.i > -1 and self.layer is None:
+            self.show_band(self.i)
+            if not self.is_derived():
+                self.init_histo_vals.emit((self.tex_v5, self.tex_v95,))
+
+    def set_ref_series(self, ref_series):
+        """
+        Set the reference values (one per band/date) to be subtracted from
+        the displayed band.
+
+        Parameters
+        ----------
+        ref_series : array or None
+            reference value for each band/date (e.g. mean of reference zone),
+            None to disable reference subtraction on Map.
+
+        Returns
+        -------
+        None.
 
+        """
+        self.ref_series = ref_series
+        self.reset_levels = True
+        if self.i > -1 and self.layer is None:
+            self.show_band(self.i)
+            if not self.is_derived():
+                self.init_histo_vals.emit((self.tex_v5, self.tex_v95,))
+
+    def request_derived_stats(self):
+        """
+        Compute percentiles and histogram of the current derived view on a
+        worker thread (if not already available), derived_stats_ready is
+        emitted when done.
+        """
+        key = self.derived_key()
+        if key in self.derived_stats:
+            self.on_derived_stats(key, self.derived_stats[key])
+        elif key not in self.pending_stats:
+            self.pending_stats.add(key)
+            worker = DerivedStatsWorker(self.loader, key)
+            worker.signals.finished.connect(self.on_derived_stats)
+            QThreadPool.globalInstance().start(worker)
+
+    @pyqtSlot(object, object)
+    def on_derived_stats(self, key, stats):
+        """
+        Store stats computed by a DerivedStatsWorker, forward them to the
+        palette if they correspond to the current view.
+        """
+        self.pending_stats.discard(key)
+        self.derived_stats[key] = stats
+        if self.is_derived() and key == self.derived_key():
+            self.derived_stats_ready.emit(stats)
+            if self.reset_levels:
+                self.reset_levels = False
+                self.init_histo_vals.emit((stats[1], stats[2]))
+
+    def make_texture(self, z, mipmap=True):
+        """
+        Upload a (h, w, 2) luminance/alpha array to a new 2D texture, as
+        32-bit floats (16-bit normalized values if float textures are not
+        supported): bands are subtracted from each other in the shader, 8
+        bits would lose small differences between dates.
 
+        Parameters
+        ----------
+        z : array
+            h-by-w-by-2 float32 array (normalized value, alpha).
+        mipmap : bool, optional
+            Generate mipmaps (needed for the zoomable Map). The default is
+            True.
 
+        Returns
+        -------
+        int
+            OpenGL texture id.
 
-        print("MapModel - show_band -- finished")
+        """
+        h, w = z.shape[:2]
+        if self.tex_format is None:
+            self.tex_format = (GL_LUMINANCE_ALPHA32F_ARB
+                               if glInitTextureFloatARB()
+                               else GL_LUMINANCE16_ALPHA16)
+        glEnable(GL_TEXTURE_2D)
+        texture_id = glGenTextures(1)
+        glActiveTexture(GL_TEXTURE0+DATA_UNIT)
+        glBindTexture(GL_TEXTURE_2D, texture_id)
+        glTexParameter(GL_TEXTURE_2D,
+                       GL_TEXTURE_MAG_FILTER,
+                       GL_NEAREST)
+        glTexParameter(GL_TEXTURE_2D,
+                       GL_TEXTURE_MIN_FILTER,
+                       GL_LINEAR_MIPMAP_LINEAR if mipmap else GL_NEAREST)
 
+        glTexImage2D(
+            GL_TEXTURE_2D,
+            0, self.tex_format,
+            w, h, 0,
+            GL_LUMINANCE_ALPHA,
+            GL_FLOAT,
+            z
+            )
+        if mipmap:
+            glGenerateMipmap(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+        return texture_id
 
-    def show_points(self, pointers, highlight=None):
+    def show_points(self, pointers, highlight=None, dropped=None):
         """ update selected points values for selection texture,
         launch map update to show currently selected points
 
          Parameters
         ----------
         pointers : tuple, array
-            tuple or nMaxPoints+1-by-2 array with all currently selected
-            points texture coordinates + oldest previously selected point,
-            to be unselected on Map
+            tuple with texture coordinates of newly selected point, or
+            nMaxPoints-by-2 array with all currently selected points texture
+            coordinates (oldest first)
         highlight : None or int
             None or id of the curve selected by user on plots to be
             highlighted, corresponding point on Map is highlighted accordingly
+        dropped : None or array
+            None or texture coordinates of the oldest previously selected
+            point, dropped from selection (nMaxPoints reached), to be
+            unselected on Map
 
          """
         # reset formerly highlighted point:
-
-        print("MapModel - show_points")
-
-
-
         self.selection[self.selection == 2] = 0
 
+        if dropped is not None:
+            self.selection[int(dropped[1]), int(dropped[0])] = 0
         if isinstance(pointers, tuple):
-            self.selection[int(pointers[1]), pointers[0]] = 1
-        elif len(pointers) > self.nMaxPoints:
-            self.selection[int(pointers[-1, 1]), int(pointers[-1, 0])] = 1
-            self.selection[int(pointers[0, 1]), int(pointers[0, 0])] = 0
-        else:
-            coord = (pointers[np.max(np.nonzero(pointers)), 0],
-                     pointers[np.max(np.nonzero(pointers)), 1])
-            self.selection[int(coord[1]), int(coord[0])] = 1
+            self.selection[int(pointers[1]), int(pointers[0])] = 1
 
         # highlight point if clicked on temporal plot:
         # highlight is curve name (number) on temporal plot
@@ -256,10 +679,7 @@ class MapModel(QObject):
 
         self.update_selection()
 
-        print("MapModel - show_points -- finished")
-
-
-
+    @span('MapModel.show_profile')
     def show_profile(self, pointers):
         """
         first point selected by user (start): shows in red as in show_points
@@ -277,30 +697,30 @@ class MapModel(QObject):
         None.
 
         """
-        print("MapModel - show_profile")
         # reset formerly highlighted point:
         self.selection[self.selection == 2] = 0
 
         # starting from second point, get points between new and last selected
         # to draw line:
         if self.selection.sum() > 1.:
-            line_points = line(*self.profile_points[-1], *pointers)
-            self.profile_points += line_points[1:]
-
-            # subsample if more than nMaxPoints:
-            if len(self.profile_points) > self.nMaxPoints:
+            line_points = polyline((self.profile_points[-1], pointers))
+            self.profile_points = np.concatenate((self.profile_points,
+                                                  line_points[1:]))
+            self.profile_vertices = np.concatenate((self.profile_vertices,
+                                                    [pointers]))
+
+            # subsample if more than nProfilePoints:
+            if len(self.profile_points) > self.nProfilePoints:
                 self.all_pointers_ij = self.subsample_profile(
-                    self.profile_points)
-
+                    self.profile_vertices)
 
             # add points to selection for display on map:
-            for point in self.profile_points:
-                self.selection[int(point[1]), int(point[0])] = 1.
-            for point in self.all_pointers_ij:
-                self.selection[int(point[1]), int(point[0])] = 5.
+            self.draw_profile()
 
         else:  # first point
-            self.profile_points.append(pointers)
+            self.profile_points = np.array([pointers], dtype=int)
+            self.profile_vertices = self.profile_points.copy()
+            self.all_pointers_ij = None
             # add current point to selection:
             self.selection[int(pointers[1]), pointers[0]] = 1.
 
@@ -308,64 +728,99 @@ class MapModel(QObject):
 
         print("MapModel - show_profile -- finished")
 
-    def subsample_profile(self, points):
+    def draw_profile(self):
         """
-
-
-        Parameters
-        ----------
-        points : array
-            n-by-2 array of x,y coordinates of all points in the profile line.
+        add profile line, its subsamples and the outline of its swath (if
+        swath_half_width > 0) to selection
+        """
+        self.selection[self.selection == 3] = 0.
+        self.selection[self.profile_points[:, 1],
+                       self.profile_points[:, 0]] = 1.
+        if self.all_pointers_ij is not None:
+            self.selection[self.all_pointers_ij[:, 1],
+                           self.all_pointers_ij[:, 0]] = 5.
+        if self.swath_half_width > 0:
+            outline = self.swath_outline()
+            self.selection[outline[:, 1], outline[:, 0]] = 3.
+
+    def swath_outline(self):
+        """
+        Pixels of the outline of the swath (rectangle of half width
+        swath_half_width around each segment of the profile line).
 
         Returns
         -------
         array
-            nMaxPoints-by-2 array of x,y coordinates of (sub)equally distant
-            subsamples on the profile line.
+            n-by-2 array of (i, j) texture coordinates of the pixels (inside
+            texture).
 
         """
-        print("MapModel - subsample_profile")
-
-
-        x = np.array(points)[:,0]
-        y = np.array(points)[:,1]
+        vertices = self.profile_vertices.astype(float)
+        outline = [np.empty((0, 2), dtype=int)]
+        for a, b in zip(vertices[:-1], vertices[1:]):
+            length = np.hypot(*(b - a))
+            if length == 0.:
+                continue
+            normal = np.array((a[1] - b[1], b[0] - a[0])) / length
+            normal *= self.swath_half_width
+            corners = (a + normal, b + normal, b - normal, a - normal,
+                       a + normal)
+            outline.append(polyline(np.rint(corners).astype(int)))
+        outline = np.concatenate(outline)
+        inside = ((outline >= 0) &
+                  (outline < (self.tex_width, self.tex_height))).all(1)
+        return outline[inside]
+
+    @pyqtSlot(int)
+    def set_swath_half_width(self, half_width):
+        """
+        set half width of swath profiles (0: line profiles), update swath
+        outline on Map
+        """
+        self.swath_half_width = half_width
+        if len(self.profile_vertices) > 1:
+            self.draw_profile()
+            self.update_selection()
 
-        distance = np.cumsum(np.sqrt( np.ediff1d(x, to_begin=0)**2 + np.ediff1d(y, to_begin=0)**2 ))
-        distance = distance/distance[-1]
+    def subsample_profile(self, vertices):
+        """
 
-        fx, fy = interp1d(distance, x), interp1d(distance, y)
 
-        alpha = np.linspace(0, 1, self.nMaxPoints)
-        x_regular = np.round(fx(alpha)).astype(int)
-        y_regular = np.round(fy(alpha)).astype(int)
+        Parameters
+        ----------
+        vertices : array
+            n-by-2 array of x,y coordinates of the points selected by user
+            for the profile line.
 
-        return np.array([x_regular, y_regular]).T
+        Returns
+        -------
+        array
+            nProfilePoints-by-2 array of x,y coordinates (rounded to pixels)
+            of equally distant subsamples on the profile line.
 
-        print("MapModel - subsample_profile -- finished")
+        """
+        points = sample_polyline(vertices, self.nProfilePoints)
+        return np.rint(points).astype(int)
 
     def show_ref(self):
         """
-        adds points (1px or rectangle) selected as ref to selection
+        adds points (1px, rectangle or polygon) selected as ref to selection
          """
         # # reset formerly highlighted point:
         # self.selection[self.selection == 2] = 0
         print("MapModel - show_ref")
 
-        for p in range(len(self.ref_pointers)):
-            self.selection[int(self.ref_pointers[p][1]),
-                           int(self.ref_pointers[p][0])] = -1.
+        # forget previous ref zone:
+        self.selection[self.selection == -1.] = 0.
+        self.selection[self.ref_pointers[:, 1], self.ref_pointers[:, 0]] = -1.
 
         self.update_selection()
 
+    @span('MapModel.update_selection')
     def update_selection(self):
         """
         update selection layer (to be called when map size is known).
         """
-
-
-
-
-        print("MapModel - update_selection")
         glEnable(GL_TEXTURE_2D)
         glActiveTexture(GL_TEXTURE0+SEL_UNIT)
         if self.sel_id == 0:
@@ -438,7 +893,6 @@ class MapModel(QObject):
         None.
 
         """
-        print("MapModel - zoom")
 
 
         dz = np.exp(ds*.01)
@@ -467,7 +921,6 @@ class MapModel(QObject):
         None.
 
         """
-        print("MapModel - pan")
         self.cx -= dx/self.z
         self.cy -= dy/self.z
         self.bounds_changed.emit()
@@ -489,7 +942,6 @@ class MapModel(QObject):
             texture coordinates
         """
 
-        print("MapModel - get_texture_coordinate")
         # screen coordinates:
         x, y = e.x(), self.map_height - e.y()  # y-axis inverted
 
@@ -517,8 +969,6 @@ class MapModel(QObject):
             screen coordinates
         """
 
-        print("MapModel - get_screen_coordinate")
-        print(i,j)
         # screen coordinates:
         # x, y = e.x(), self.map_height - e.y()  # y-axis inverted
 
@@ -527,7 +977,6 @@ class MapModel(QObject):
         x = (i * (self.z + self.cx)) + (self.map_width // 2)
         y = (j * (self.z + self.cy)) + (self.map_height // 2)
         y = self.map_height - y # y-axis inverted
-        print(x,y)
         return (x, y)
 
 
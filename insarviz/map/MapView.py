@@ -5,16 +5,14 @@
 
 from .AbstractMapView import *
 
-from PyQt5.QtCore import QSize, pyqtSlot, pyqtSignal, Qt
-from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QSize, pyqtSlot, pyqtSignal, Qt, QRect
+from PyQt5.QtWidgets import QApplication, QRubberBand
 from PyQt5.QtGui import QPainter, QBrush
 
 from ..Interaction import IDLE, DRAG, ZOOM, POINTS, LIVE, PROFILE, REF
+from ..instrument import span
 
-from insarviz.utils import get_rectangle
-
-from PyQt5.Qt import QRubberBand
-from PyQt5.Qt import QRect
+import numpy as np
 
 # map #######################################################################
 
@@ -48,12 +46,14 @@ class MapView(AbstractMapView):
 
         print("Mapview -- object creation")
         super().__init__(map_model)
+        map_model.gl_view = self  # to delete textures, see free_textures
         self.plot_model = plot_model
 
         self.resized.connect(self.update_size)
         self.update_size()
 
         self.all_pointer_xy = None
+        self.ref_name = None  # name of ref zone being selected
         self.lastPoint = None
         print("Mapview -- object creation -- finished")
         
@@ -136,6 +136,7 @@ class MapView(AbstractMapView):
 
 
 
+    @span('MapView.paintGL')
     def paintGL(self):
         """
         Generate and display OpenGL texture for Map.
@@ -145,8 +146,6 @@ class MapView(AbstractMapView):
         None.
 
         """
-        print("Mapview -- paintGL")
-
         # band using OpenGL texturing
         glClear(GL_COLOR_BUFFER_BIT)
         glEnable(GL_TEXTURE_2D)
@@ -156,6 +155,10 @@ class MapView(AbstractMapView):
         glActiveTexture(GL_TEXTURE0+SEL_UNIT)
         glBindTexture(GL_TEXTURE_2D, self.model.sel_id)
 
+        # band to subtract texture (derived view)
+        glActiveTexture(GL_TEXTURE0+DIFF_UNIT)
+        glBindTexture(GL_TEXTURE_2D, self.model.diff_id)
+
         # band texture
         glActiveTexture(GL_TEXTURE0+DATA_UNIT)
         glBindTexture(GL_TEXTURE_2D, self.model.tex_id)
@@ -308,7 +311,8 @@ class MapView(AbstractMapView):
                             self.plot_model.plot_istate = POINTS
                             self.plot_model.update_values()
                             # draw points trace on Map:
-                            self.model.show_points((i, j))
+                            self.model.show_points(
+                                (i, j), dropped=self.plot_model.dropped_ij)
                             self.lastPoint = e.pos()
 
                         elif self.model.ready_for_PROFILE:
@@ -316,38 +320,49 @@ class MapView(AbstractMapView):
                             self.model.map_istate = \
                                 self.plot_model.plot_istate = PROFILE
                             self.model.show_profile((i, j))
-                            if self.model.all_pointers_ij is not None:
-                                self.plot_model.all_pointer_ij = \
-                                    self.model.all_pointers_ij
                             # draw plots:
                             self.plot_model.update_values(
-                                profile_points=self.model.profile_points)
+                                profile_points=self.model.profile_points,
+                                profile_vertices=self.model.profile_vertices)
 
                         elif self.model.ready_for_REF:
                             self.model.map_istate = \
                                 self.plot_model.plot_istate = REF
+                            shift = (QApplication.keyboardModifiers() &
+                                     Qt.ShiftModifier)
+                            vertices = self.model.ref_vertices
+                            # shift-click: add vertex to polygon ref zone
+                            if vertices is not None and shift:
+                                if not (vertices == (i, j)).all(1).any():
+                                    vertices = np.concatenate(
+                                        (vertices, [(i, j)]))
                             # second point of ref zone clicked:
-                            if self.model.ref_pointers is not None:
+                            elif vertices is not None and len(vertices) == 1:
                                 # second click same as first, ref is 1px:
-                                if (i, j) in self.model.ref_pointers:
+                                if (vertices == (i, j)).all(1).any():
                                     pass
                                 # second different from first, ref is rectangle
                                 else:
-                                    self.model.ref_pointers = \
-                                        get_rectangle(
-                                            self.model.ref_pointers[-1],
-                                            (i, j))
-                                self.plot_model.ref_pointers = \
-                                    self.model.ref_pointers
-                            # first point:
+                                    vertices = np.array(
+                                        [vertices[-1], (i, j)])
+                            # first point (or click after a complete
+                            # rectangle/polygon), new ref zone:
                             else:
-                                self.model.ref_pointers = \
-                                    self.plot_model.ref_pointers = [(i, j)]
+                                vertices = np.array([(i, j)])
+                                self.ref_name = \
+                                    self.plot_model.new_ref_name()
+                            self.model.ref_vertices = vertices
+                            # compute ref, update plots:
+                            self.plot_model.set_ref_region(vertices,
+                                                           self.ref_name)
+                            self.model.ref_pointers = \
+                                self.plot_model.ref_pointers
                             # show ref on map:
                             self.model.show_ref()
-                            # update plots:
-                            self.plot_model.update_ref_values(
-                                self.plot_model.ref_pointers)
+                            # update Map if shown relative to reference:
+                            if self.model.ref_series is not None:
+                                self.model.set_ref_series(
+                                    self.plot_model.ref_data)
 
                         else:
                             # interactive navigation
@@ -360,6 +375,7 @@ class MapView(AbstractMapView):
 
         print("Mapview -- mousePressEvent -- finished")
 
+    @span('MapView.mouseMoveEvent')
     def mouseMoveEvent(self, e):
         """
         Overload method
@@ -387,7 +403,6 @@ class MapView(AbstractMapView):
         None.
 
         """
-        print("Mapview -- mouseMoveEvent")
         # change cursor to cross if Points or Profile tools selected:
         if (self.model.ready_for_POINTS or self.model.ready_for_PROFILE):
             QApplication.setOverrideCursor(Qt.CrossCursor)
@@ -416,11 +431,8 @@ class MapView(AbstractMapView):
                     # self.plot_model.plot_istate = POINTS
                     self.plot_model.update_values()
                     # draw profile trace on Map:
-                    self.model.show_points(self.plot_model.all_pointer_ij)
-                    if len(self.plot_model.all_pointer_ij) > (
-                            self.plot_model.nMaxPoints):
-                        self.plot_model.all_pointer_ij = \
-                                self.plot_model.all_pointer_ij[1:]
+                    self.model.show_points(
+                        (i, j), dropped=self.plot_model.dropped_ij)
                     self.lastPoint = e.pos()
 
 
@@ -463,8 +475,6 @@ class MapView(AbstractMapView):
                         self.model.zoom(dx-dy, *self.p)
                     self.p0 = x1, y1
 
-        print("Mapview -- mouseMoveEvent -- finished")
-
     def mouseReleaseEvent(self, e):
         """
         Overload method
@@ -5,12 +5,20 @@
 
 from .AbstractMapView import *
 
+from OpenGL.GL import (
+    GL_NEAREST, GL_VIEWPORT,
+    glCopyTexImage2D, glGetIntegerv,
+    )
+
 from PyQt5.QtCore import QSize, QPoint
 from PyQt5.QtGui import (
     QPolygon, QPainter, QPen,
     QColor
     )
 import math
+
+from ..instrument import span
+
 # mini map ##################################################################
 
 
@@ -26,6 +34,29 @@ class MinimapView(AbstractMapView):
     sigClosing = pyqtSignal(bool)
     __name__ = 'MINIMAP'
 
+    def __init__(self, map_model):
+        """
+        Generate Minimap.
+
+        The band is drawn from the model's decimated overview texture and the
+        result is kept in a cache texture, so that pan/zoom events on Map
+        (bounds_changed) only redraw the viewport rectangle over the cached
+        image.
+
+        Parameters
+        ----------
+        map_model : QObject
+            Model managing data for Map and Minimap views.
+
+        Returns
+        -------
+        None.
+
+        """
+        super().__init__(map_model)
+        self.cache_id = 0  # tex id of the rendered band image
+        self.cache_valid = False
+
     def closeEvent(self, a0):
         """
         Overload method
@@ -54,6 +85,32 @@ class MinimapView(AbstractMapView):
     def sizeHint(self):
         return QSize(100, 100)
 
+    def invalidate_cache(self):
+        """
+        Mark the cached band image as outdated, next paintGL renders the
+        overview texture again.
+        """
+        self.cache_valid = False
+
+    @pyqtSlot()
+    def update_texture(self):
+        self.invalidate_cache()
+        super().update_texture()
+
+    @pyqtSlot(int)
+    def update_black(self, v):
+        self.invalidate_cache()
+        super().update_black(v)
+
+    @pyqtSlot(int)
+    def update_white(self, v):
+        self.invalidate_cache()
+        super().update_white(v)
+
+    def set_colormap(self, *args, **kwargs):
+        self.invalidate_cache()
+        super().set_colormap(*args, **kwargs)
+
     def resizeGL(self, width, height):
         """
         Resize OpenGL view according to new settings
@@ -70,6 +127,7 @@ class MinimapView(AbstractMapView):
         None.
 
         """
+        self.invalidate_cache()
         glViewport(0, 0, width, height)
         wr = width/height
         tw, th = self.model.tex_width, self.model.tex_height
@@ -92,6 +150,7 @@ class MinimapView(AbstractMapView):
             glScale(tr, 1., 1.)
         glTranslate(-.5, -.5, 0.)
 
+    @span('MinimapView.paintGL')
     def paintGL(self):
         """
         Generate and display OpenGL texture for Map.
@@ -101,25 +160,10 @@ class MinimapView(AbstractMapView):
         None.
 
         """
-        print("Mini Mapview -- paintGL")
-
-        # band using OpenGL texturing
-        glClear(GL_COLOR_BUFFER_BIT)
-        glEnable(GL_TEXTURE_2D)
-        glEnable(GL_TEXTURE_1D)
-
-        glUseProgram(self.program)
-        glActiveTexture(GL_TEXTURE0+DATA_UNIT)
-        glBindTexture(GL_TEXTURE_2D, self.model.tex_id)
-
-        glBegin(GL_TRIANGLE_STRIP)
-        for x in [0, 1]:
-            for y in [0, 1]:
-                glTexCoord(x, y)
-                glVertex(x, y)
-        glEnd()
-        glDisable(GL_TEXTURE_2D)
-        glUseProgram(0)
+        if self.cache_valid:
+            self.paint_cache()
+        else:
+            self.paint_overview()
 
         x, y, z = self.model.cx, self.model.cy, self.model.z
         tw, th = self.model.tex_width, self.model.tex_height
@@ -202,6 +246,74 @@ class MinimapView(AbstractMapView):
             # no metadata or wrong format
             pass
 
+    def paint_overview(self):
+        """
+        Render the band overview with the palette program and copy the
+        result to the cache texture.
+        """
+        # band using OpenGL texturing
+        glClear(GL_COLOR_BUFFER_BIT)
+        glEnable(GL_TEXTURE_2D)
+        glEnable(GL_TEXTURE_1D)
+
+        glUseProgram(self.program)
+        glActiveTexture(GL_TEXTURE0+DIFF_UNIT)
+        glBindTexture(GL_TEXTURE_2D, self.model.diff_ov_id)
+        glActiveTexture(GL_TEXTURE0+DATA_UNIT)
+        glBindTexture(GL_TEXTURE_2D, self.model.ov_id)
+
+        glBegin(GL_TRIANGLE_STRIP)
+        for x in [0, 1]:
+            for y in [0, 1]:
+                glTexCoord(x, y)
+                glVertex(x, y)
+        glEnd()
+        glUseProgram(0)
+
+        # keep rendered image for subsequent viewport-only updates:
+        if self.cache_id == 0:
+            self.cache_id = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.cache_id)
+            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glBindTexture(GL_TEXTURE_2D, self.cache_id)
+        vx, vy, vw, vh = glGetIntegerv(GL_VIEWPORT)
+        glCopyTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, vx, vy, vw, vh, 0)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+        self.cache_valid = True
+
+    def paint_cache(self):
+        """
+        Draw the cached band image over the whole viewport (no shader, no
+        band texture sampling).
+        """
+        glUseProgram(0)
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, 1, 0, 1, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+
+        glEnable(GL_TEXTURE_2D)
+        glActiveTexture(GL_TEXTURE0+DATA_UNIT)
+        glBindTexture(GL_TEXTURE_2D, self.cache_id)
+        glBegin(GL_TRIANGLE_STRIP)
+        for x in [0, 1]:
+            for y in [0, 1]:
+                glTexCoord(x, y)
+                glVertex(x, y)
+        glEnd()
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+
     # interaction
     def draw_gps_station(self):
 
@@ -4,7 +4,7 @@
 
 # constants #################################################################
 
-DATA_UNIT, SEL_UNIT, PALETTE_UNIT = range(3)  # texture unit use
+DATA_UNIT, SEL_UNIT, PALETTE_UNIT, DIFF_UNIT = range(4)  # texture unit use
 
 
 # common shaders ############################################################
@@ -16,10 +16,25 @@ PALETTE_SHADER = r"""
     uniform float v_i; // min and
     uniform float v_a; // max data value to denormalize data
 
+    // handling derived values (band differencing, reference subtraction)
+    uniform sampler2D values2; // band to subtract
+
+    uniform float v2_i; // min and
+    uniform float v2_a; // max data value to denormalize band to subtract
+    uniform float diff; // > .5 if band to subtract is set
+    uniform float ref; // reference value to subtract
+
     vec2 v() {
         // compute original value, keep alpha for nans
         vec4 t = texture2D(values, gl_TexCoord[0].st);
-        return vec2(t.x*(v_a-v_i)+v_i, t.a);
+        float x = t.x*(v_a-v_i)+v_i;
+        float a = t.a;
+        if(diff > .5) {
+            vec4 t2 = texture2D(values2, gl_TexCoord[0].st);
+            x -= t2.x*(v2_a-v2_i)+v2_i;
+            a = min(a, t2.a);
+        }
+        return vec2(x-ref, a);
     }
 
     // handling palette
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""
+CPU (NumPy) rendering of bands, reproducing the color mapping done on the
+GPU by PALETTE_SHADER and MAP_SHADER, for headless export of Map frames.
+"""
+
+# imports ###################################################################
+
+import struct
+import zlib
+
+import numpy as np
+
+# palettes ##################################################################
+
+# palette colors (RGBA), in the same layout as the 1D palette texture
+# uploaded by AbstractMapView.set_colormap (colors of the gradient's ticks,
+# sorted by tick position)
+PALETTES = {
+    'grey': [(0, 0, 0, 255), (255, 255, 255, 255)],
+    'bipolar': [(0, 255, 255, 255), (0, 0, 255, 255), (0, 0, 0, 255),
+                (255, 0, 0, 255), (255, 255, 0, 255)],
+    'thermal': [(0, 0, 0, 255), (185, 0, 0, 255), (255, 220, 0, 255),
+                (255, 255, 255, 255)],
+    'viridis': [(68, 1, 84, 255), (58, 82, 139, 255), (32, 144, 140, 255),
+                (94, 201, 97, 255), (253, 231, 36, 255)],
+}
+
+STATION_COLOR = (255, 255, 0, 255)  # yellow, as on Map
+CURRENT_STATION_COLOR = (255, 0, 0, 255)  # red, as on Map
+
+
+def get_palette(palette):
+    """
+    Palette as a n-by-4 uint8 array.
+
+    Parameters
+    ----------
+    palette : str, bytes or array
+        name of a palette in PALETTES, path to a .npy file containing a
+        n-by-4 array, RGBA bytes (as given to AbstractMapView.set_colormap)
+        or n-by-4 array.
+
+    Returns
+    -------
+    array
+        n-by-4 uint8 array of RGBA colors.
+
+    """
+    if isinstance(palette, bytes):
+        palette = np.frombuffer(palette, dtype='uint8').reshape((-1, 4))
+    elif isinstance(palette, str):
+        if palette in PALETTES:
+            palette = PALETTES[palette]
+        else:
+            palette = np.load(palette)
+    palette = np.asarray(palette, dtype='uint8')
+    if palette.ndim != 2 or palette.shape[1] != 4:
+        raise ValueError("palette must be a n-by-4 array of RGBA colors")
+    return palette
+
+
+# rendering #################################################################
+
+def colormap(values, palette, v_0, v_1):
+    """
+    Color code values as texture1D(palette, (v-v_0)/(v_1-v_0)) does in
+    PALETTE_SHADER, ie with linear filtering between palette colors and
+    clamping to edge.
+
+    Parameters
+    ----------
+    values : array
+        data values (any shape).
+    palette : array
+        n-by-4 uint8 array of RGBA colors.
+    v_0, v_1 : float
+        data values mapped to the lower and upper bounds of the palette.
+
+    Returns
+    -------
+    array
+        uint8 array of shape values.shape + (4,).
+
+    """
+    palette = palette.astype('float32')
+    n = len(palette)
+    # texel centers are at (k+.5)/n, texture coordinate clamped to edge:
+    x = (np.asarray(values, dtype='float32') - v_0) / (v_1 - v_0) * n - .5
+    x = np.clip(np.nan_to_num(x), 0., n - 1)
+    k = np.minimum(x.astype('int64'), n - 1)
+    f = (x - k)[..., None]
+    rgba = palette[k] * (1. - f) + palette[np.minimum(k + 1, n - 1)] * f
+    return np.rint(rgba).astype('uint8')
+
+
+def render_band(band, palette, v_0, v_1, nodata=None, background=None):
+    """
+    Render a band as Map does: color coded values, nodata discarded.
+
+    Parameters
+    ----------
+    band : 2d array
+        band data as returned by Loader.load_band (first row is the bottom
+        of the Map).
+    palette : array
+        n-by-4 uint8 array of RGBA colors.
+    v_0, v_1 : float
+        data values mapped to the lower and upper bounds of the palette.
+    nodata : float or None, optional
+        nodata value, rendered transparent (or background). nans are
+        always considered as nodata. The default is None.
+    background : tuple or None, optional
+        RGBA color of nodata pixels. The default is None (transparent).
+
+    Returns
+    -------
+    array
+        h-by-w-by-4 uint8 RGBA image, first row is the top of the Map.
+
+    """
+    band = np.asarray(band)
+    bg = ~np.isfinite(band)
+    if nodata is not None:
+        bg |= (band == nodata)
+    rgba = colormap(band, palette, v_0, v_1)
+    rgba[bg] = background if background is not None else (0, 0, 0, 0)
+    # OpenGL draws first texture row at the bottom of the Map:
+    return np.ascontiguousarray(rgba[::-1])
+
+
+def draw_stations(rgba, stations, current=None, size=6):
+    """
+    Draw GPS stations as filled squares on a rendered image (in place).
+
+    Parameters
+    ----------
+    rgba : array
+        h-by-w-by-4 image as returned by render_band.
+    stations : dict
+        {station name: (i, j)} texture coordinates of stations (j from the
+        bottom of the Map, as in Loader_gps' ref_east_ras/ref_north_ras).
+    current : str or None, optional
+        name of the station to highlight. The default is None.
+    size : int, optional
+        side of the squares, in pixels. The default is 6.
+
+    Returns
+    -------
+    array
+        rgba.
+
+    """
+    h, w = rgba.shape[:2]
+    for name, (i, j) in stations.items():
+        row, col = h - 1 - int(j), int(i)
+        r0, c0 = max(row - size // 2, 0), max(col - size // 2, 0)
+        r1, c1 = min(row + size // 2, h), min(col + size // 2, w)
+        if r0 < r1 and c0 < c1:
+            rgba[r0:r1, c0:c1] = (CURRENT_STATION_COLOR if name == current
+                                  else STATION_COLOR)
+    return rgba
+
+
+# output ####################################################################
+
+def write_png(filename, rgba):
+    """
+    Write a h-by-w-by-4 uint8 RGBA image to a PNG file (no dependency other
+    than zlib).
+    """
+    h, w = rgba.shape[:2]
+    raw = np.empty((h, 1 + w * 4), dtype='uint8')
+    raw[:, 0] = 0  # no filter
+    raw[:, 1:] = rgba.reshape((h, w * 4))
+
+    def chunk(tag, data):
+        return (struct.pack('>I', len(data)) + tag + data +
+                struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    with open(filename, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 6, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b'IEND', b''))
+
+
+# exports ###################################################################
+
+__all__ = [
+    'PALETTES',
+    'get_palette',
+    'colormap',
+    'render_band',
+    'draw_stations',
+    'write_png',
+]
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""Least recently used cache of pixels' time series, filled by blocks."""
+
+from collections import OrderedDict
+
+
+class ProfileCache():
+    """
+    Time series (all bands/dates) of pixels, kept in least recently used
+    order up to max_bytes. A miss reads the block_size-by-block_size block
+    of pixels around the missing one at once (one windowed read), so that
+    hovering around a pixel, or over an area again, does not read the
+    dataset.
+    """
+
+    block_size = 16  # side of blocks read on misses, in pixels
+
+    def __init__(self, loader, max_bytes=2**26):
+        """
+        Parameters
+        ----------
+        loader : Loader or DerivedCube
+            cube to read time series from (see Loader.load_window).
+        max_bytes : int, optional
+            max size of cached time series. The default is 2**26 (64 MiB).
+
+        Returns
+        -------
+        None.
+
+        """
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.profiles = OrderedDict()  # (i, j): time series
+        self.nbytes = 0
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def clear(self):
+        self.profiles.clear()
+        self.nbytes = 0
+
+    def get(self, i, j):
+        """
+        Time series of pixel (i, j).
+
+        Parameters
+        ----------
+        i, j : int or float
+            texture/data coordinates (col, row) of the pixel.
+
+        Returns
+        -------
+        array
+            read-only array of dataset values at pixel (i, j) for all
+            bands/dates (nodata set to nan), see Loader.load_profile.
+
+        """
+        key = int(i), int(j)
+        try:
+            self.profiles.move_to_end(key)
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            return self.profiles[key]
+        self.misses += 1
+        h, w = self.loader.dataset.shape
+        if not (0 <= key[0] < w and 0 <= key[1] < h):
+            return self.loader.load_profile(*key)
+        self.fill(*key)
+        return self.profiles[key]
+
+    def fill(self, i, j):
+        """
+        Read and cache the block of pixels around pixel (i, j) (clipped to
+        dataset's bounds), pixel (i, j) being the most recently used.
+        """
+        h, w = self.loader.dataset.shape
+        size = self.block_size
+        i0 = min(max(i - size // 2, 0), max(w - size, 0))
+        j0 = min(max(j - size // 2, 0), max(h - size, 0))
+        width, height = min(size, w - i0), min(size, h - j0)
+        block = self.loader.load_window(i0, j0, width, height)
+        block = block.reshape((len(block), -1)).T  # pixels-by-bands/dates
+        for k in range(len(block)):
+            key = (i0 + k % width, j0 + k // width)
+            if key not in self.profiles:
+                # copy: each time series can be dropped independently
+                profile = block[k].copy()
+                profile.setflags(write=False)
+                self.profiles[key] = profile
+                self.nbytes += profile.nbytes
+        self.profiles.move_to_end((i, j))
+        while self.nbytes > self.max_bytes and len(self.profiles) > 1:
+            _, dropped = self.profiles.popitem(last=False)
+            self.nbytes -= dropped.nbytes
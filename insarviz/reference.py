@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+Reference regions (pixel, rectangle or polygon) rasterized to a mask over
+their bounding window, and reference series computed from them.
+"""
+
+import numpy as np
+
+from insarviz.bresenham import polyline
+
+STATISTICS = ('mean', 'median', 'weighted')
+
+
+def region_mask(vertices, shape=None):
+    """
+    Rasterize a reference region to a mask over its bounding window (clipped
+    to the dataset if shape is given).
+
+    1 vertex is a pixel, 2 vertices are opposite corners of a rectangle, 3
+    vertices or more are a polygon (pixels whose center is inside the
+    polygon, even-odd rule, plus pixels of the polygon's edges).
+
+    Example
+    -------
+    region_mask([(0, 0), (4, 0), (0, 4)])
+    >>> (0, 0, array([[ True,  True,  True,  True,  True],
+                      [ True,  True,  True,  True, False],
+                      [ True,  True,  True, False, False],
+                      [ True,  True, False, False, False],
+                      [ True, False, False, False, False]]))
+
+    Parameters
+    ----------
+    vertices : array-like
+        n-by-2 vertices (i, j) of the region (texture/data coordinates).
+    shape : tuple or None, optional
+        (height, width) of the dataset, pixels outside of it are dropped.
+        The default is None (no clipping).
+
+    Returns
+    -------
+    i0, j0 : int
+        texture/data coordinates (col, row) of the window's first pixel.
+    mask : array
+        height-by-width bool array, mask[j-j0, i-i0] is True if pixel (i, j)
+        is in region.
+
+    """
+    vertices = np.asarray(vertices, dtype=int).reshape((-1, 2))
+    i0, j0 = (int(x) for x in vertices.min(0))
+    width, height = (int(x) for x in vertices.max(0) - (i0, j0) + 1)
+    if len(vertices) <= 2:
+        mask = np.ones((height, width), dtype=bool)
+        return _clip(i0, j0, mask, shape)
+
+    # pixel centers inside polygon (crossing number, one pass per edge):
+    x = np.arange(i0, i0 + width)[None, :]
+    y = np.arange(j0, j0 + height)[:, None]
+    mask = np.zeros((height, width), dtype=bool)
+    for (xa, ya), (xb, yb) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        if ya == yb:
+            continue
+        crosses = (ya > y) != (yb > y)
+        x_cross = xa + (y - ya) * (xb - xa) / (yb - ya)
+        mask ^= crosses & (x < x_cross)
+    # pixels of edges:
+    edges = polyline(np.concatenate((vertices, vertices[:1])))
+    mask[edges[:, 1] - j0, edges[:, 0] - i0] = True
+    return _clip(i0, j0, mask, shape)
+
+
+def _clip(i0, j0, mask, shape):
+    """window (i0, j0, mask) of region_mask clipped to shape (h, w)"""
+    if shape is None:
+        return i0, j0, mask
+    height, width = shape
+    i1 = min(max(i0, 0), width)
+    j1 = min(max(j0, 0), height)
+    mask = mask[j1-j0:max(height-j0, 0), i1-i0:max(width-i0, 0)]
+    return i1, j1, mask
+
+
+def reference_series(data, statistic='mean', weights=None):
+    """
+    Reference series of a region: mean, median or weighted mean of the
+    region's pixels for each band/date (nodata pixels are ignored).
+
+    Parameters
+    ----------
+    data : array
+        number of bands/dates-by-n array of the region's pixels values.
+    statistic : str, optional
+        'mean', 'median' or 'weighted' (mean weighted by weights, e.g.
+        coherence). The default is 'mean'.
+    weights : array or None, optional
+        n weights of the region's pixels, used if statistic is 'weighted'.
+        The default is None.
+
+    Returns
+    -------
+    array
+        reference value for each band/date (nan if no valid pixel).
+
+    """
+    valid = np.isfinite(data)
+    if statistic == 'median':
+        data = np.sort(data, axis=1)  # nans last
+        count = valid.sum(1)[:, None]
+        lo = np.take_along_axis(data, np.maximum(count - 1, 0) // 2, 1)
+        hi = np.take_along_axis(data, np.maximum(count // 2, 0), 1)
+        with np.errstate(invalid='ignore'):
+            return np.where(count > 0, (lo + hi) / 2., np.nan)[:, 0]
+    if statistic == 'weighted':
+        if weights is None:
+            raise ValueError("weighted reference needs weights")
+        w = np.where(valid, weights[None, :], 0.)
+    elif statistic == 'mean':
+        w = valid.astype('float32')
+    else:
+        raise ValueError(f"unknown statistic {statistic}, must be one of "
+                         f"{STATISTICS}")
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.where(valid, data, 0.) * w).sum(1) / w.sum(1)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""Fixed-capacity ring buffer of rows, with views in insertion order."""
+
+import numpy as np
+
+
+class RingBuffer():
+    """
+    First in, first out buffer of at most capacity rows (arrays of a given
+    shape), with O(1) insertion.
+
+    Each row is stored twice, at slots k and k+capacity of a buffer of
+    2*capacity rows, so that the last capacity rows, oldest first, are always
+    the contiguous slice buffer[start:start+capacity]: view returns them in
+    insertion order without any copy or shift.
+
+    Examples
+    --------
+    >>> from insarviz.ringbuffer import RingBuffer
+    >>> ring = RingBuffer(3, dtype=int)
+    >>> for x in range(4):
+    ...     dropped = ring.append(x)
+    >>> ring.view().tolist(), int(dropped), len(ring), ring.count
+    ([1, 2, 3], 0, 3, 4)
+    """
+
+    def __init__(self, capacity, shape=(), dtype=float, fill=0):
+        """
+        Parameters
+        ----------
+        capacity : int
+            max number of rows.
+        shape : tuple, optional
+            shape of a row. The default is () (scalar rows).
+        dtype : dtype, optional
+            type of data. The default is float.
+        fill : scalar, optional
+            value of rows not filled yet. The default is 0.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.capacity = capacity
+        self.buffer = np.full((2 * capacity,) + tuple(shape), fill,
+                              dtype=dtype)
+        self.count = 0  # number of rows appended since creation
+
+    def __len__(self):
+        """number of rows in buffer"""
+        return min(self.count, self.capacity)
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def append(self, row):
+        """
+        Append row, dropping the oldest row if buffer is full.
+
+        Parameters
+        ----------
+        row : array-like
+            row to be appended.
+
+        Returns
+        -------
+        array or None
+            dropped row (copy), None if buffer was not full.
+
+        """
+        k = self.count % self.capacity
+        dropped = self.buffer[k].copy() if self.is_full() else None
+        self.buffer[k] = self.buffer[k + self.capacity] = row
+        self.count += 1
+        return dropped
+
+    def last(self):
+        """last appended row (view)"""
+        return self.buffer[(self.count - 1) % self.capacity]
+
+    def view(self):
+        """
+        capacity rows, oldest first, as a view on the buffer (rows not filled
+        yet are at the end, with fill value). The view is only valid until
+        next append.
+        """
+        start = self.count % self.capacity if self.is_full() else 0
+        return self.buffer[start:start + self.capacity]
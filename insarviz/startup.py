@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""
+Startup timing of ts_viz: marks recorded during imports and initialization
+(a few perf_counter calls, always on), printed by ts_viz --profile-startup.
+"""
+
+import time
+
+T0 = time.perf_counter()  # import of this module, first one of ts_viz
+marks = []  # (label, time) in order
+enabled = False  # print report when startup is finished (see finish)
+
+
+def mark(label):
+    """record the end of a startup step"""
+    marks.append((label, time.perf_counter()))
+
+
+def report():
+    """
+    Returns
+    -------
+    str
+        one line per step: duration and time since T0 (ms).
+
+    """
+    lines = [f"{'startup step':<40} {'ms':>8} {'total ms':>9}"]
+    last = T0
+    for label, t in marks:
+        lines.append(f"{label:<40} {1000. * (t - last):8.1f} "
+                     f"{1000. * (t - T0):9.1f}")
+        last = t
+    return '\n'.join(lines)
+
+
+def finish(label=None):
+    """
+    Record the last startup step (if label is not None) and print the
+    report once, if enabled.
+    """
+    global enabled
+    if label is not None:
+        mark(label)
+    if enabled:
+        enabled = False
+        print(report())
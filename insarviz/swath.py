@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+Swath profiles: pixels within a given distance of a profile line, binned by
+distance along the line, and per-bin statistics for all bands/dates.
+"""
+
+import numpy as np
+
+
+def swath_index(vertices, half_width, shape, bin_size=1.):
+    """
+    Pixels of the swath of half width half_width around the polyline going
+    through vertices, with their bin along the polyline. Each pixel belongs
+    to the nearest segment of the polyline (the one it is projected on).
+
+    Computed once per swath, then used to bin values of all bands/dates
+    (see swath_stats).
+
+    Parameters
+    ----------
+    vertices : array-like
+        n-by-2 vertices (i, j) of the polyline (texture/data coordinates).
+    half_width : float
+        max distance of pixels to the polyline, in pixels.
+    shape : tuple
+        (width, height) of the data, pixels outside are dropped.
+    bin_size : float, optional
+        length of bins along the polyline, in pixels. The default is 1.
+
+    Returns
+    -------
+    pixels : array
+        m-by-2 int array of (i, j) coordinates of the swath's pixels.
+    bins : array
+        m int array of bin index of each pixel.
+    centers : array
+        nbins array of distance along polyline (pixels) of bins' centers.
+
+    """
+    vertices = np.asarray(vertices, dtype=float).reshape((-1, 2))
+    w, h = shape
+    starts, steps = vertices[:-1], np.diff(vertices, axis=0)
+    lengths = np.hypot(*steps.T)
+    offsets = np.concatenate(([0.], np.cumsum(lengths)))
+
+    flat, along, dist = [], [], []
+    for start, step, length, offset in zip(starts, steps, lengths, offsets):
+        if length == 0.:
+            continue
+        # candidate pixels: points of a half pixel grid in the segment's
+        # frame (along x across), rounded to pixels (a pixel's center is
+        # less than half a pixel away from a grid point on both axes)
+        u = step / length
+        along_grid = np.linspace(0., length, int(np.ceil(2 * length)) + 1)
+        across_grid = np.linspace(-half_width, half_width,
+                                  int(np.ceil(4 * half_width)) + 1)
+        grid = (start + along_grid[:, None, None] * u
+                + across_grid[None, :, None] * (-u[1], u[0]))
+        ii, jj = np.rint(grid.reshape((-1, 2))).astype(int).T
+        inside = (ii >= 0) & (ii < w) & (jj >= 0) & (jj < h)
+        candidates = np.unique(jj[inside] * w + ii[inside])
+        if not len(candidates):
+            continue
+        ii, jj = candidates % w, candidates // w
+        di, dj = ii - start[0], jj - start[1]
+        # projection on segment, distance to segment:
+        t = (di * step[0] + dj * step[1]) / length
+        d = np.abs(di * step[1] - dj * step[0]) / length
+        inside = (t >= 0.) & (t <= length) & (d <= half_width)
+        flat.append(candidates[inside])
+        along.append(offset + t[inside])
+        dist.append(d[inside])
+
+    if not flat or not sum(map(len, flat)):
+        return (np.empty((0, 2), dtype=int), np.empty(0, dtype=int),
+                np.empty(0))
+    flat, along, dist = (np.concatenate(flat), np.concatenate(along),
+                         np.concatenate(dist))
+    # pixels close to several segments (around joints): keep nearest
+    order = np.lexsort((dist, flat))
+    keep = order[np.concatenate(([True], np.diff(flat[order]) > 0))]
+    flat, along = flat[keep], along[keep]
+
+    nbins = max(int(np.ceil(offsets[-1] / bin_size)), 1)
+    bins = np.minimum((along / bin_size).astype(int), nbins - 1)
+    centers = np.minimum((np.arange(nbins) + .5) * bin_size, offsets[-1])
+    pixels = np.stack((flat % w, flat // w), axis=1)
+    return pixels, bins, centers
+
+
+def swath_stats(values, bins, nbins, median=False):
+    """
+    Per-bin statistics of values, for all bands/dates at once (nan values
+    are ignored).
+
+    Parameters
+    ----------
+    values : array
+        m-by-number of bands/dates array of values of the swath's pixels.
+    bins : array
+        m int array of bin index of each pixel (see swath_index).
+    nbins : int
+        number of bins.
+    median : bool, optional
+        if True, also compute medians. The default is False.
+
+    Returns
+    -------
+    mean : array
+        nbins-by-number of bands/dates array of means (nan if bin is empty).
+    std : array
+        nbins-by-number of bands/dates array of standard deviations.
+    median : array or None
+        nbins-by-number of bands/dates array of medians, None if not
+        computed.
+
+    """
+    nb = values.shape[1]
+    valid = np.isfinite(values)
+    # index of (bin, band) in flattened nbins-by-nb result:
+    flat = (bins[:, None] * nb + np.arange(nb))[valid]
+    v = values[valid]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        count = np.bincount(flat, minlength=nbins * nb)
+        mean = np.bincount(flat, weights=v, minlength=nbins * nb) / count
+        dev = v - mean[flat]
+        std = np.sqrt(np.bincount(flat, weights=dev * dev,
+                                  minlength=nbins * nb) / count)
+    mean, std = mean.reshape((nbins, nb)), std.reshape((nbins, nb))
+
+    med = None
+    if median:
+        # values sorted by (bin, band) then value, median of each segment
+        # (trailing nan: index of empty segments after the last value):
+        order = np.lexsort((v, flat))
+        sorted_v = np.append(v[order], np.nan)
+        first = np.cumsum(count) - count
+        lo = first + np.maximum(count - 1, 0) // 2
+        hi = first + count // 2
+        med = np.where(count > 0, (sorted_v[lo] + sorted_v[hi]) / 2., np.nan)
+        med = med.reshape((nbins, nb))
+    return mean, std, med
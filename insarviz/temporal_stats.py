@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per-pixel temporal statistics maps for quality control: standard
+deviation, range, coverage (number of valid dates), max absolute step
+between consecutive valid dates and date of that step. Computed in a single
+pass over bands/dates (Welford accumulators), by blocks of rows in worker
+processes, and cached in a sidecar file next to the dataset, along with the
+maps needed to resume the accumulators (see RESUME), so that bands/dates
+appended to a stack only are processed (see extend_sidecar). Results are
+shown as Map layers, see MapModel.add_layer.
+"""
+
+# imports ###################################################################
+
+import os
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from insarviz.core import cube_pool, worker_cube
+from insarviz.velocity import BLOCK_SIZE
+
+STATISTICS = ('std', 'range', 'coverage', 'max step', 'max step date')
+# cached with STATISTICS to resume accumulators (see TemporalStats.resume):
+RESUME = ('mean', 'min', 'last')
+
+# accumulators ##############################################################
+
+
+class TemporalStats():
+    """
+    Running statistics of n pixels, updated one band/date at a time in
+    constant memory.
+    """
+
+    def __init__(self, n):
+        """
+        Parameters
+        ----------
+        n : int
+            number of pixels.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.k = 0  # number of bands/dates seen
+        self.count = np.zeros(n, dtype=int)
+        self.mean = np.zeros(n)
+        self.m2 = np.zeros(n)  # sum of squared deviations to mean
+        self.vmin = np.full(n, np.inf)
+        self.vmax = np.full(n, -np.inf)
+        self.last = np.full(n, np.nan)  # last valid value
+        self.max_step = np.zeros(n)
+        self.step_date = np.full(n, -1)
+
+    @classmethod
+    def resume(cls, maps, k):
+        """
+        Accumulators of n pixels after k bands/dates, rebuilt from their maps.
+
+        Parameters
+        ----------
+        maps : dict
+            {name: n values} for each of STATISTICS and RESUME (see maps and
+            state).
+        k : int
+            number of bands/dates of maps.
+
+        Returns
+        -------
+        TemporalStats
+            accumulators to be updated with the following bands/dates.
+
+        """
+        stats = cls(maps['coverage'].size)
+        stats.k = k
+        stats.count = maps['coverage'].astype(int)
+        defined = stats.count > 0
+        stats.mean = np.where(defined, maps['mean'], 0.)
+        stats.m2 = np.where(defined,
+                            maps['std'].astype(float)**2 * stats.count, 0.)
+        stats.vmin = np.where(defined, maps['min'], np.inf)
+        stats.vmax = np.where(defined, maps['min'] + maps['range'], -np.inf)
+        stats.last = maps['last'].astype(float)
+        stepped = np.isfinite(maps['max step'])
+        stats.max_step = np.where(stepped, maps['max step'], 0.)
+        stats.step_date = np.where(stepped, maps['max step date'],
+                                   -1).astype(int)
+        return stats
+
+    def update(self, values):
+        """
+        Add next band/date.
+
+        Parameters
+        ----------
+        values : array
+            n values (nan: nodata).
+
+        Returns
+        -------
+        None.
+
+        """
+        valid = np.isfinite(values)
+        v = values[valid]
+        self.count[valid] += 1
+        delta = v - self.mean[valid]
+        self.mean[valid] += delta / self.count[valid]
+        self.m2[valid] += delta * (v - self.mean[valid])
+        np.fmin(self.vmin, values, out=self.vmin)
+        np.fmax(self.vmax, values, out=self.vmax)
+        with np.errstate(invalid='ignore'):
+            step = np.abs(values - self.last)
+            larger = step > self.max_step  # False if nan
+        self.max_step[larger] = step[larger]
+        self.step_date[larger] = self.k
+        self.last[valid] = v
+        self.k += 1
+
+    def maps(self):
+        """
+        Returns
+        -------
+        array
+            len(STATISTICS)-by-n array of statistics (nan if undefined, e.g.
+            std of pixels without valid values).
+
+        """
+        defined = self.count > 0
+        stepped = self.step_date >= 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.stack((
+                np.where(defined, np.sqrt(self.m2 / self.count), np.nan),
+                np.where(defined, self.vmax - self.vmin, np.nan),
+                self.count,
+                np.where(stepped, self.max_step, np.nan),
+                np.where(stepped, self.step_date, np.nan),
+                ))
+
+    def state(self):
+        """
+        Returns
+        -------
+        array
+            len(RESUME)-by-n array of the values needed, with maps, to
+            resume the accumulators (nan if undefined), see resume.
+
+        """
+        defined = self.count > 0
+        return np.stack((np.where(defined, self.mean, np.nan),
+                         np.where(defined, self.vmin, np.nan),
+                         self.last))
+
+
+# statistics maps ###########################################################
+
+
+def _stats_rows(rows, cube=None):
+    """
+    job: statistics of rows (texture/data orientation) of cube, cube being
+    the worker process' cube by default (see core.cube_pool)
+    """
+    if cube is None:
+        cube = worker_cube()
+    data = cube.load_window(0, rows[0], cube.dataset.width, rows[1] - rows[0])
+    stats = TemporalStats(data[0].size)
+    for band in data:
+        stats.update(band.ravel().astype(float))
+    return rows, np.concatenate((stats.maps(), stats.state()))
+
+
+def sidecar_name(filename):
+    """name of the file caching statistics maps of dataset filename"""
+    return filename + '.stats.npz'
+
+
+def _signature(filename):
+    """size and modification time of filename, to check cache validity"""
+    st = os.stat(filename)
+    return np.array([st.st_size, st.st_mtime_ns])
+
+
+def read_sidecar(filename):
+    """
+    Statistics maps cached for dataset filename.
+
+    Returns
+    -------
+    dict or None
+        {name: map} for each of STATISTICS (and RESUME, 'bands': number of
+        bands/dates, if cached), None if the sidecar file is missing or out
+        of date.
+
+    """
+    try:
+        with np.load(sidecar_name(filename)) as cached:
+            if (cached['signature'] == _signature(filename)).all():
+                return {name: cached[name] for name in cached.files
+                        if name != 'signature'}
+    except (OSError, KeyError, ValueError):
+        pass
+    return None
+
+
+def _write_sidecar(filename, maps, bands):
+    """cache maps (STATISTICS and RESUME) of bands bands/dates"""
+    try:
+        np.savez(sidecar_name(filename), signature=_signature(filename),
+                 bands=bands, **dict(zip(STATISTICS + RESUME, maps)))
+    except OSError as e:
+        print('cannot cache temporal statistics:', e)
+
+
+def temporal_stats_maps(loader, workers=None, progress=None, cache=True):
+    """
+    Temporal statistics maps of all pixels of loader's dataset, by blocks of
+    rows read band by band and processed in worker processes.
+
+    Parameters
+    ----------
+    loader : Loader, Cube or DerivedCube
+        Loader or cube with an opened dataset, or derived cube (processed in
+        this process, not cached).
+    workers : int or None, optional
+        number of worker processes (1: compute in this process). The
+        default is None (number of CPUs).
+    progress : callable or None, optional
+        called as progress(done, total) after each block, computation is
+        cancelled if it returns True. The default is None.
+    cache : bool, optional
+        read maps from the sidecar file (see sidecar_name) if it is up to
+        date, write them otherwise (if possible). The default is True.
+
+    Returns
+    -------
+    dict or None
+        {name: height-by-width float32 map} for each of STATISTICS, in
+        texture/data orientation ('max step date' is the band/date number
+        of the max step). None if cancelled.
+
+    """
+    dataset = loader.dataset
+    derived = getattr(loader, 'source', None) is not None
+    cache = cache and not derived
+    if cache:
+        cached = read_sidecar(dataset.name)
+        if cached is not None and all(name in cached for name in STATISTICS):
+            return {name: cached[name] for name in STATISTICS}
+
+    nt, (h, w) = len(loader), dataset.shape
+    step = max(1, BLOCK_SIZE // (nt * w))
+    blocks = [(r, min(r + step, h)) for r in range(0, h, step)]
+    maps = np.full((len(STATISTICS) + len(RESUME), h, w), np.nan,
+                   dtype='float32')
+
+    def store(rows, result):
+        maps[:, rows[0]:rows[1]] = result.reshape((-1, rows[1]-rows[0], w))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or derived:
+        # derived cubes (see insarviz.derived) are computed in this process
+        for done, rows in enumerate(blocks, 1):
+            store(*_stats_rows(rows, loader))
+            if progress is not None and progress(done, len(blocks)):
+                return None
+    else:
+        with cube_pool(getattr(loader, 'cube', loader), workers) as pool:
+            futures = [pool.submit(_stats_rows, rows) for rows in blocks]
+            for done, future in enumerate(as_completed(futures), 1):
+                store(*future.result())
+                if progress is not None and progress(done, len(blocks)):
+                    for f in futures:
+                        f.cancel()
+                    return None
+
+    if cache:
+        _write_sidecar(dataset.name, maps, nt)
+    return dict(zip(STATISTICS, maps))
+
+
+def extend_sidecar(loader, cached):
+    """
+    Update statistics maps cached for the first bands/dates of loader's
+    dataset (e.g. before bands were appended to a stack, see Cube.open) with
+    its following bands/dates, band by band in this process, and cache them.
+
+    Parameters
+    ----------
+    loader : Loader or Cube
+        Loader or cube with an opened dataset.
+    cached : dict or None
+        maps read (see read_sidecar) when the dataset held its first
+        bands/dates only.
+
+    Returns
+    -------
+    dict or None
+        {name: height-by-width float32 map} for each of STATISTICS, see
+        temporal_stats_maps. None if cached is None or cannot be resumed
+        (cached without RESUME maps).
+
+    """
+    if cached is None or not all(name in cached
+                                 for name in STATISTICS + RESUME + ('bands',)):
+        return None
+    dataset = loader.dataset
+    h, w = dataset.shape
+    stats = TemporalStats.resume(
+        {name: cached[name].ravel() for name in STATISTICS + RESUME},
+        int(cached['bands']))
+    for i in range(stats.k, len(loader)):
+        band, nodata, _ = loader.load_band(i)
+        band = band.astype(float).ravel()
+        if nodata is not None:
+            band[band == nodata] = np.nan
+        stats.update(band)
+    maps = np.concatenate((stats.maps(), stats.state())).reshape(
+        (-1, h, w)).astype('float32')
+    _write_sidecar(dataset.name, maps, len(loader))
+    return dict(zip(STATISTICS, maps))
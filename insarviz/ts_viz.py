@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+from insarviz import startup
+
 import logging
 import os, re
 
@@ -8,6 +10,7 @@ from PyQt5.QtWidgets import (
     QSlider, QMainWindow, QFileDialog, QToolBar,
     QDockWidget, QSpinBox, QAction, QActionGroup,
     QHeaderView, QVBoxLayout, QHBoxLayout,
+    QPushButton, QCheckBox, QComboBox, QProgressDialog, QMessageBox,
     )
 
 from PyQt5.QtGui import (
@@ -15,33 +18,46 @@ from PyQt5.QtGui import (
     )
 
 from PyQt5.QtCore import (
-    Qt, QCoreApplication,
+    Qt, QCoreApplication, QTimer,
     pyqtSlot,
     )
 
 from PyQt5.QtWidgets import QGraphicsScene, QGraphicsView
 from PyQt5.QtGui import QPainter
+startup.mark("import PyQt5")
 
 
 from insarviz.Loader import Loader
 from insarviz.Loader import Loader_gps
+startup.mark("import Loader (numpy)")
 from insarviz.PaletteView import Palette
+startup.mark("import PaletteView (pyqtgraph)")
 from insarviz.map.MapModel import MapModel
 from insarviz.map.MapView import MapView
 from insarviz.map.MinimapView import MinimapView
+startup.mark("import Map views (PyOpenGL)")
 from insarviz.PlotModel import PlotModel, PlotModel_gps
 from insarviz.PlotView import myPlotWindow, myPlotWindow_gps
+startup.mark("import plots")
+from insarviz.Playback import Playback
+from insarviz.RefreshScheduler import RefreshScheduler
+from insarviz.velocity import velocity_maps
+from insarviz.temporal_stats import temporal_stats_maps
+from insarviz.derived import (
+    DerivedCube, moving_average, moving_median, detrend, increments,
+    reference,
+    )
 import insarviz.version as version
+from insarviz import instrument
 
 import numpy as np
 
 from insarviz.Interaction import IDLE, DRAG, ZOOM, PROFILE, LIVE
 from insarviz.utils import openUrl
 from insarviz.custom_widgets import FileInfoWidget
+startup.mark("import other modules")
 
 # from insarviz.GraphicScene_example_rectangle_resize import GraphicsRectItem
-from PyQt5.Qt import QRubberBand
-from PyQt5.Qt import QRect
 
 logging.getLogger("rasterio").setLevel(logging.WARNING) # original WARNING
 logger = logging.getLogger(__name__)
@@ -50,10 +66,12 @@ logger = logging.getLogger(__name__)
 class MainWindow(QMainWindow):
     """Docstring for MainWindow. """
 
-    def __init__(self, filename=None, config_dict=None, stack_file=None):
+    def __init__(self, filename=None, config_dict=None, stack_file=None,
+                 chunk_cache=None):
         """
         :filename: the file to load
         :config_dict: the configuration dictionary
+        :chunk_cache: chunk cache size (bytes) of HDF5/NetCDF files
         """
 
         print("MainWindow -- object creation")
@@ -66,6 +84,7 @@ class MainWindow(QMainWindow):
         else:
             self.keep_stack = False
             self.stack_file = "stack.tif"
+        self.chunk_cache = chunk_cache
         self.initUI(filename)
         self.filename = filename
 
@@ -84,16 +103,22 @@ class MainWindow(QMainWindow):
         self.setMouseTracking(True)
         self.setDockNestingEnabled(True)
         self.plotw_t = None
+        self.plotw_s = None
         self.plotw_t_gps = None
 
         # Loader:
-        loader = Loader(self.stack_file)
+        loader = Loader(self.stack_file, self.chunk_cache)
+        self.loader = loader  # dataset's loader (Map may show a derived cube)
 
         # Models:
         nMaxPoints = 30
-        self.map_model = MapModel(loader, nMaxPoints)
-        self.plot_model = PlotModel(loader, nMaxPoints)
+        nProfilePoints = 2000
+        self.map_model = MapModel(loader, nMaxPoints, nProfilePoints)
+        self.plot_model = PlotModel(loader, nMaxPoints, nProfilePoints)
         self.plot_model.map_model = self.map_model
+
+        # plots are refreshed (at most once per frame) by:
+        self.refresh = RefreshScheduler()
         self.map_model.plot_model = self.plot_model
 
         # Map:
@@ -138,6 +163,62 @@ class MainWindow(QMainWindow):
         self.band_setter = QSpinBox()
         self.band_setter.valueChanged.connect(self.slider.setValue)
 
+        # band to subtract from current band on Map (differencing):
+        self.diff_label = QLabel('minus band #')
+        self.diff_setter = QSpinBox()
+        self.diff_setter.setMinimum(-1)
+        self.diff_setter.setSpecialValueText('none')
+        self.diff_setter.setValue(-1)
+        self.diff_setter.setToolTip("Show current band minus this band on Map")
+        self.diff_setter.valueChanged.connect(self.set_diff_band)
+
+        # layer shown on Map instead of bands (e.g. velocity map):
+        self.layer_box = QComboBox()
+        self.layer_box.addItem('bands')
+        self.layer_box.setToolTip("Show bands or a computed map on Map")
+        self.layer_box.activated[str].connect(self.show_layer)
+        self.map_model.layers_changed.connect(self.update_layers)
+
+        # cube shown on Map and plots: dataset or derived (filtered) cube
+        self.cube_box = QComboBox()
+        self.cube_box.addItems(['original', 'moving average',
+                                'moving median', 'detrended', 'increments',
+                                'reference corrected'])
+        self.cube_box.setToolTip("Show dataset or a cube derived from it")
+        self.cube_box.activated.connect(self.set_cube)
+        self.filter_window_setter = QSpinBox()
+        self.filter_window_setter.setRange(2, 99)
+        self.filter_window_setter.setValue(5)
+        self.filter_window_setter.setSuffix(' dates')
+        self.filter_window_setter.setToolTip(
+            "Window of moving average/median")
+        self.filter_window_setter.valueChanged.connect(self.set_cube)
+
+        # time-lapse playback:
+        self.playback = Playback(self.map_model)
+        self.playback.frame_requested.connect(self.slider.setValue)
+        self.play_button = QPushButton('Play')
+        self.play_button.setCheckable(True)
+        self.play_button.setEnabled(False)
+        self.play_button.toggled.connect(
+            lambda checked: self.playback.set_playing(
+                checked, position=self.slider.value()))
+        self.playback.state_changed.connect(self.on_playback_state_changed)
+        self.fps_setter = QSpinBox()
+        self.fps_setter.setRange(1, 60)
+        self.fps_setter.setValue(int(self.playback.fps))
+        self.fps_setter.setSuffix(' fps')
+        self.fps_setter.valueChanged.connect(self.playback.set_fps)
+        self.loop_check = QCheckBox('Loop')
+        self.loop_check.setChecked(self.playback.loop)
+        self.loop_check.toggled.connect(self.playback.set_loop)
+        self.play_start_setter = QSpinBox()
+        self.play_start_setter.valueChanged.connect(self.playback.set_start)
+        self.play_end_setter = QSpinBox()
+        self.play_end_setter.valueChanged.connect(self.playback.set_end)
+        self.fps_label = QLabel('')
+        self.playback.stats_changed.connect(self.update_playback_stats)
+
         # Logo & version
         self.logo_widget = QLabel(self)
         scriptDir = os.path.dirname(
@@ -184,7 +265,23 @@ class MainWindow(QMainWindow):
         time_layout.addWidget(self.date_label)
         time_layout.addWidget(self.band_setter)
         time_layout.addWidget(self.slider)
+        time_layout.addWidget(self.diff_label)
+        time_layout.addWidget(self.diff_setter)
+        time_layout.addWidget(self.layer_box)
+        time_layout.addWidget(self.cube_box)
+        time_layout.addWidget(self.filter_window_setter)
         main_layout.addLayout(time_layout)
+        playback_layout = QHBoxLayout()
+        playback_layout.addWidget(self.play_button)
+        playback_layout.addWidget(self.fps_setter)
+        playback_layout.addWidget(self.loop_check)
+        playback_layout.addWidget(QLabel('from band #'))
+        playback_layout.addWidget(self.play_start_setter)
+        playback_layout.addWidget(QLabel('to band #'))
+        playback_layout.addWidget(self.play_end_setter)
+        playback_layout.addWidget(self.fps_label)
+        playback_layout.addStretch()
+        main_layout.addLayout(playback_layout)
         main_layout.addWidget(self.map_widget)
         main_widget = QWidget()
         main_widget.setLayout(main_layout)
@@ -240,6 +337,31 @@ class MainWindow(QMainWindow):
         self.ref_action.toggled.connect(
             lambda checked: self.plotw_t.ref_tick.setCheckable(False))
 
+        # swath profiles:
+        self.swath_setter = QSpinBox()
+        self.swath_setter.setRange(0, 10000)
+        self.swath_setter.setSuffix(' px')
+        self.swath_setter.setSpecialValueText('line')
+        self.swath_setter.setToolTip("Half width of swath profiles (pixels "
+                                     "binned along profile line)")
+        self.swath_setter.valueChanged.connect(self.set_swath_half_width)
+        self.swath_stat = QComboBox()
+        self.swath_stat.addItems(['mean', 'median'])
+        self.swath_stat.setToolTip("Statistic of swath profiles' bins")
+        self.swath_stat.currentTextChanged.connect(self.set_swath_statistic)
+
+        # reference regions (saved, shift-click on Map adds polygon vertices):
+        self.ref_region_box = QComboBox()
+        self.ref_region_box.setToolTip(
+            "Reference zones (click: pixel, 2nd click: rectangle, "
+            "shift-click: polygon vertex)")
+        self.ref_region_box.activated[str].connect(self.use_ref_region)
+        self.plot_model.ref_regions_changed.connect(self.update_ref_regions)
+        self.ref_stat = QComboBox()
+        self.ref_stat.addItems(['mean', 'median'])
+        self.ref_stat.setToolTip("Statistic of reference zones")
+        self.ref_stat.currentTextChanged.connect(self.set_ref_statistic)
+
         clear_action = QAction("Clear all", self)
         clear_action.triggered.connect(self.on_button_clicked_clear_plot)
         action_group.addAction(self.inter_action)
@@ -255,7 +377,12 @@ class MainWindow(QMainWindow):
         self.plotting_toolbar.addAction(self.inter_action)
         self.plotting_toolbar.addAction(self.points_action)
         self.plotting_toolbar.addAction(self.prof_action)
+        self.plotting_toolbar.addWidget(QLabel('Swath:'))
+        self.plotting_toolbar.addWidget(self.swath_setter)
+        self.plotting_toolbar.addWidget(self.swath_stat)
         self.plotting_toolbar.addAction(self.ref_action)
+        self.plotting_toolbar.addWidget(self.ref_region_box)
+        self.plotting_toolbar.addWidget(self.ref_stat)
         self.plotting_toolbar.addAction(clear_action)
         self.plotting_toolbar.addWidget(spacer2)
 
@@ -290,6 +417,12 @@ class MainWindow(QMainWindow):
         openGpsFolder_action.triggered.connect(self.on_button_clicked_openGpsFolder)
         filemenu.addAction(openGpsFolder_action)
 
+        self.openWeights_action = QAction("Open Coherence (weights)", self)
+        self.openWeights_action.setEnabled(False)
+        self.openWeights_action.triggered.connect(
+            self.on_button_clicked_openWeights)
+        filemenu.addAction(self.openWeights_action)
+
         viewmenu = menubar.addMenu('View')
         self.plot_act = QAction("Plotting", self)
         self.plot_act.setCheckable(True)
@@ -326,22 +459,65 @@ class MainWindow(QMainWindow):
 
         viewmenu.addAction(self.colormap_action)
 
+        self.map_ref_action = QAction("Map relative to reference", self)
+        self.map_ref_action.setCheckable(True)
+        self.map_ref_action.setChecked(False)
+        self.map_ref_action.setEnabled(False)
+        self.map_ref_action.toggled.connect(self.set_map_ref)
+        viewmenu.addAction(self.map_ref_action)
+
+        self.bilinear_action = QAction("Bilinear profile sampling", self)
+        self.bilinear_action.setCheckable(True)
+        self.bilinear_action.setChecked(False)
+        self.bilinear_action.toggled.connect(
+            self.plot_model.set_bilinear_profile)
+        viewmenu.addAction(self.bilinear_action)
+
+        refresh_stats_action = QAction("Plot refresh statistics", self)
+        refresh_stats_action.triggered.connect(self.show_refresh_stats)
+        viewmenu.addAction(refresh_stats_action)
+
+        spans_action = QAction("Timing spans", self)
+        spans_action.triggered.connect(self.show_spans)
+        viewmenu.addAction(spans_action)
+
+        amenu = menubar.addMenu('Analysis')
+        self.fit_acceleration_action = QAction("Fit acceleration", self)
+        self.fit_acceleration_action.setCheckable(True)
+        amenu.addAction(self.fit_acceleration_action)
+        self.fit_seasonal_action = QAction("Fit seasonal terms", self)
+        self.fit_seasonal_action.setCheckable(True)
+        amenu.addAction(self.fit_seasonal_action)
+        self.velocity_action = QAction("Compute velocity maps", self)
+        self.velocity_action.setEnabled(False)
+        self.velocity_action.triggered.connect(self.compute_velocity)
+        amenu.addAction(self.velocity_action)
+        self.temporal_stats_action = QAction("Compute temporal statistics",
+                                             self)
+        self.temporal_stats_action.setEnabled(False)
+        self.temporal_stats_action.triggered.connect(
+            self.compute_temporal_stats)
+        amenu.addAction(self.temporal_stats_action)
+
         hmenu = menubar.addMenu('Help')
         help_action = QAction("Documentation", self)
         help_action.triggered.connect(openUrl)
         help_action.setShortcut('Ctrl+Shift+H')
         hmenu.addAction(help_action)
 
-        # loading directly if file specified upon app launch:
-        self.current_filename = filename
-        logger.debug(f"current_filename = {self.current_filename}")
-        if self.current_filename is not None:
-            self.load_data(self.current_filename)
-
         # show main window and minimap, focus on mainwindow
         self.show()
         self.resize(900, 700)
         self.activateWindow()
+        startup.mark("main window")
+
+        # loading directly if file specified upon app launch, once the
+        # window is shown:
+        self.current_filename = filename
+        logger.debug(f"current_filename = {self.current_filename}")
+        if self.current_filename is not None:
+            QTimer.singleShot(0, lambda: self.load_data(
+                self.current_filename))
 
     def load_data(self, filename):
         """
@@ -360,7 +536,19 @@ class MainWindow(QMainWindow):
         print("MainWindow --> load data")
         logger.info(f"GUI: loading {self.current_filename}")
         # launch loader and update models
-        self.map_model.loader.open(filename=filename)
+        if self.map_model.loader is not self.loader:
+            self.cube_box.setCurrentText('original')
+            self.map_model.loader = self.plot_model.loader = self.loader
+        if os.path.isdir(filename):
+            # stacking a folder of bands may take a while:
+            profile = self.run_with_progress(
+                f"Stacking bands of {filename}...",
+                self.map_model.loader.open, filename)
+        else:
+            profile = self.map_model.loader.open(filename=filename)
+        if profile is None:
+            print("MainWindow --> load data - cancelled")
+            return
         self.map_model.loader.get_metadata(filename=filename)
         self.plot_model.on_data_loaded()
         # set date slider's range to data's and current date to middle of data
@@ -374,9 +562,19 @@ class MainWindow(QMainWindow):
         # should launch display_date here under that will launch map_model.show_band --> which load band in loader.py
         # But it is not with envi because no change detected slider...
         self.band_setter.setRange(0, len(self.map_model.loader)-1)
+        self.diff_setter.setRange(-1, len(self.map_model.loader)-1)
+        self.play_start_setter.setRange(0, len(self.map_model.loader)-1)
+        self.play_start_setter.setValue(0)
+        self.play_end_setter.setRange(0, len(self.map_model.loader)-1)
+        self.play_end_setter.setValue(len(self.map_model.loader)-1)
+        self.play_button.setEnabled(True)
         # enable plot button in menu:
         self.plot_act.setEnabled(True)
-        
+        self.map_ref_action.setEnabled(True)
+        self.openWeights_action.setEnabled(True)
+        self.velocity_action.setEnabled(True)
+        self.temporal_stats_action.setEnabled(True)
+        startup.finish("open cube, show first band")
 
         print("MainWindow --> load data - finished")
 
@@ -446,6 +644,7 @@ class MainWindow(QMainWindow):
         self.plot_model.current_date = self.plot_model.timestamps[date_number]
 
         self.map_model.show_band(i=date_number)
+        self.layer_box.setCurrentText('bands')
 
         if isinstance(self.plot_model.dates[date_number], int):
             self.date_label.setText(
@@ -457,14 +656,287 @@ class MainWindow(QMainWindow):
                 f"{self.plot_model.dates[date_number].date()} - Band #")
         self.band_setter.setValue(date_number)
 
-        try:
-            self.plotw_s.plot_widget.setStyle(self.plotw_s.plot_widget.style)
-        except AttributeError:
-            pass
+        if self.plotw_s is not None:
+            self.refresh.schedule(self.plotw_s.plot_widget.update_date_curve,
+                                  'spatial plot date')
 
 
         print("MainWindow --> display_date --> finished")
 
+    @pyqtSlot(int)
+    def set_diff_band(self, j):
+        """
+        Set the band subtracted from current band on Map (-1: none).
+        """
+        print("MainWindow --> set_diff_band")
+        self.map_model.set_diff_band(None if j < 0 else j)
+
+    @pyqtSlot()
+    def show_refresh_stats(self):
+        """
+        Show number of requests and refreshes of plots, and time spent
+        refreshing them.
+        """
+        report = self.refresh.report()
+        print(report)
+        box = QMessageBox(QMessageBox.Information, "Plot refresh statistics",
+                          report, parent=self)
+        box.setFont(QFont("Monospace"))
+        box.exec_()
+
+    @pyqtSlot()
+    def show_spans(self):
+        """
+        Show timing statistics of hot paths (band and time series loading,
+        Map painting, plots), recorded if started with -v 4.
+        """
+        if not instrument.enabled:
+            report = "Timing spans are recorded when started with -v 4."
+        else:
+            report = instrument.report()
+            print(report)
+        box = QMessageBox(QMessageBox.Information, "Timing spans",
+                          report, parent=self)
+        box.setFont(QFont("Monospace"))
+        box.exec_()
+
+    @pyqtSlot()
+    def set_cube(self):
+        """
+        Show dataset or a cube derived from it (temporal filter, detrended
+        residuals, increments, reference correction) on Map and plots.
+        """
+        print("MainWindow --> set_cube")
+        if not hasattr(self.loader, 'dataset'):
+            return
+        kind = self.cube_box.currentText()
+        window = self.filter_window_setter.value()
+        if (self.sender() is self.filter_window_setter
+                and not kind.startswith('moving')):
+            return
+        if kind == 'moving average':
+            transform = moving_average(window)
+        elif kind == 'moving median':
+            transform = moving_median(window)
+        elif kind == 'detrended':
+            transform = detrend(self.plot_model.timestamps)
+        elif kind == 'increments':
+            transform = increments
+        elif kind == 'reference corrected':
+            ref_data = getattr(self.plot_model, 'ref_data', None)
+            if ref_data is None:
+                print('no reference selected')
+                self.cube_box.setCurrentText('original')
+                kind = 'original'
+            else:
+                transform = reference(ref_data)
+        if kind == 'original':
+            cube = self.loader
+        else:
+            cube = DerivedCube(self.loader, transform, name=kind)
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            self.plot_model.set_loader(cube)
+            self.map_model.set_loader(cube)
+        finally:
+            QApplication.restoreOverrideCursor()
+        print("MainWindow --> set_cube --> finished")
+
+    @pyqtSlot(str)
+    def show_layer(self, name):
+        """
+        Show a computed map (layer) on Map, or bands ('bands').
+        """
+        print("MainWindow --> show_layer")
+        self.map_model.show_layer(None if name == 'bands' else name)
+
+    @pyqtSlot()
+    def update_layers(self):
+        """
+        Update the layer selector with layers of Map.
+        """
+        current = self.layer_box.currentText()
+        self.layer_box.clear()
+        self.layer_box.addItems(['bands'] + list(self.map_model.layers))
+        self.layer_box.setCurrentText(current)
+
+    @pyqtSlot()
+    def compute_velocity(self):
+        """
+        Fit a linear trend (and optional acceleration and seasonal terms) to
+        each pixel's time series, add velocity, intercept, residual RMS (and
+        other fitted terms) maps as Map layers, show velocity.
+        """
+        print("MainWindow --> compute_velocity")
+        timestamps = self.plot_model.timestamps
+        maps = self.run_with_progress(
+            "Fitting trends...", velocity_maps,
+            self.map_model.loader, timestamps,
+            acceleration=self.fit_acceleration_action.isChecked(),
+            seasonal=(self.fit_seasonal_action.isChecked()
+                      and not isinstance(timestamps, range)))
+        if maps is None:
+            print('velocity computation cancelled')
+            return
+        unit = self.map_model.loader.metadata.get('Value_unit')
+        per = '/band' if isinstance(timestamps, range) else '/yr'
+        units = {'velocity': per, 'acceleration': per + '²'}
+        for name, data in maps.items():
+            self.map_model.add_layer(
+                name, data,
+                unit=unit and unit + units.get(name, ''))
+        self.layer_box.setCurrentText('velocity')
+        self.show_layer('velocity')
+        print("MainWindow --> compute_velocity --> finished")
+
+    @pyqtSlot()
+    def compute_temporal_stats(self):
+        """
+        Compute temporal statistics maps (std, range, coverage, max step
+        between consecutive dates and its date) and add them as Map layers,
+        show std.
+        """
+        print("MainWindow --> compute_temporal_stats")
+        maps = self.run_with_progress(
+            "Computing temporal statistics...", temporal_stats_maps,
+            self.map_model.loader)
+        if maps is None:
+            print('temporal statistics computation cancelled')
+            return
+        unit = self.map_model.loader.metadata.get('Value_unit')
+        units = {'coverage': 'dates', 'max step date': 'band #'}
+        for name, data in maps.items():
+            self.map_model.add_layer(name, data,
+                                     unit=units.get(name, unit))
+        self.layer_box.setCurrentText('std')
+        self.show_layer('std')
+        print("MainWindow --> compute_temporal_stats --> finished")
+
+    def run_with_progress(self, label, function, *args, **kwargs):
+        """
+        Run a long computation taking a progress callback (see
+        velocity.velocity_maps) with a progress dialog allowing to cancel
+        it.
+
+        Returns
+        -------
+        result of function (None if cancelled).
+
+        """
+        dialog = QProgressDialog(label, "Cancel", 0, 100, self)
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(0)
+
+        def progress(done, total):
+            dialog.setMaximum(total)
+            dialog.setValue(done)
+            QApplication.processEvents()
+            return dialog.wasCanceled()
+
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            return function(*args, progress=progress, **kwargs)
+        finally:
+            QApplication.restoreOverrideCursor()
+            dialog.close()
+
+    @pyqtSlot(bool)
+    def set_map_ref(self, checked):
+        """
+        Show Map relative to the reference zone selected with the Reference
+        tool (mean of reference zone subtracted from each band).
+        """
+        print("MainWindow --> set_map_ref")
+        ref_data = getattr(self.plot_model, 'ref_data', None)
+        if checked and ref_data is None:
+            print('no reference selected')
+            self.map_ref_action.setChecked(False)
+            return
+        self.map_model.set_ref_series(ref_data if checked else None)
+
+    @pyqtSlot()
+    def update_ref_regions(self):
+        """
+        list reference zones (saved by PlotModel), select current one
+        """
+        self.ref_region_box.blockSignals(True)
+        self.ref_region_box.clear()
+        self.ref_region_box.addItems(list(self.plot_model.ref_regions))
+        self.ref_region_box.setCurrentText(self.plot_model.ref_name or '')
+        self.ref_region_box.blockSignals(False)
+
+    @pyqtSlot(str)
+    def use_ref_region(self, name):
+        """
+        use saved reference zone name (no data read)
+        """
+        print("MainWindow --> use_ref_region")
+        self.plot_model.use_ref_region(name)
+        self.map_model.ref_vertices = self.plot_model.ref_regions[name][0]
+        self.update_ref()
+
+    @pyqtSlot(str)
+    def set_ref_statistic(self, statistic):
+        print("MainWindow --> set_ref_statistic")
+        self.plot_model.set_ref_statistic(statistic)
+        if self.plot_model.ref_name is not None:
+            self.update_ref()
+
+    def update_ref(self):
+        """
+        show current reference zone on Map, update plots and Map (if shown
+        relative to reference)
+        """
+        self.map_model.ref_pointers = self.plot_model.ref_pointers
+        self.map_model.show_ref()
+        if self.map_model.ref_series is not None:
+            self.map_model.set_ref_series(self.plot_model.ref_data)
+        if self.plotw_t is not None:
+            self.refresh.schedule(self.plotw_t.plot_widget.plotLoadedData)
+            self.refresh.schedule(self.plotw_s.plot_widget.plotLoadedData)
+        self.map_widget.update()
+
+    @pyqtSlot(int)
+    def set_swath_half_width(self, half_width):
+        """
+        set half width of swath profiles (0: line profiles), update profile
+        on Map and plots
+        """
+        print("MainWindow --> set_swath_half_width")
+        self.map_model.set_swath_half_width(half_width)
+        self.plot_model.set_swath_half_width(half_width)
+        self.update_profile_plots()
+
+    @pyqtSlot(str)
+    def set_swath_statistic(self, statistic):
+        print("MainWindow --> set_swath_statistic")
+        self.plot_model.set_swath_statistic(statistic)
+        self.update_profile_plots()
+
+    def update_profile_plots(self):
+        if self.plotw_t is not None and self.plot_model.plot_istate == PROFILE:
+            self.refresh.schedule(self.plotw_t.plot_widget.plotLoadedData)
+            self.refresh.schedule(self.plotw_s.plot_widget.plotLoadedData)
+
+    @pyqtSlot(bool)
+    def on_playback_state_changed(self, playing):
+        """
+        keep Play button in sync with playback (e.g. end of range reached)
+        """
+        self.play_button.blockSignals(True)
+        self.play_button.setChecked(playing)
+        self.play_button.blockSignals(False)
+        self.play_button.setText('Pause' if playing else 'Play')
+        if not playing:
+            self.fps_label.setText('')
+
+    @pyqtSlot(float, int)
+    def update_playback_stats(self, fps, skipped):
+        """
+        display achieved frame rate and number of skipped frames
+        """
+        self.fps_label.setText(f"{fps:.1f} fps ({skipped} skipped)")
+
     @pyqtSlot(tuple)
     def update_cursor_info(self, coord):
         print("MainWindow -- update_cursor_info")
@@ -534,12 +1006,14 @@ class MainWindow(QMainWindow):
                 self.dockplotw_s.setAllowedAreas(Qt.RightDockWidgetArea)
                 self.plotw_t = myPlotWindow(plottype='temporal',
                                             plot_model=self.plot_model)
-                self.map_widget.sig_map2plotw.connect(
-                    self.plotw_t.plot_widget.plotLoadedData)
+                self.map_widget.sig_map2plotw.connect(self.refresh.slot(
+                    self.plotw_t.plot_widget.plotLoadedData,
+                    'temporal plot'))
                 self.plotw_s = myPlotWindow(plottype='spatial',
                                             plot_model=self.plot_model)
-                self.map_widget.sig_map2plotw.connect(
-                    self.plotw_s.plot_widget.plotLoadedData)
+                self.map_widget.sig_map2plotw.connect(self.refresh.slot(
+                    self.plotw_s.plot_widget.plotLoadedData,
+                    'spatial plot'))
 
                 self.dockplotw_t.setWidget(self.plotw_t)
                 self.dockplotw_s.setWidget(self.plotw_s)
@@ -562,8 +1036,9 @@ class MainWindow(QMainWindow):
             self.plotting_toolbar.show()
 
             # connect to slider:
-            self.slider.valueChanged.connect(
-                self.plotw_t.plot_widget.date_marker.on_slider_changed)
+            self.slider.valueChanged.connect(self.refresh.slot(
+                self.plotw_t.plot_widget.date_marker.on_slider_changed,
+                'temporal plot date'))
             self.plotw_t.plot_widget.date_marker.sigposChanged.connect(
                 self.slider.setValue)
         else:
@@ -608,8 +1083,9 @@ class MainWindow(QMainWindow):
 
                 self.plotw_t_gps.plot_widget.plotLoadedData()
 
-                self.map_widget.sig_map2plotw.connect(
-                    self.plotw_t_gps.plot_widget.plotLoadedData)
+                self.map_widget.sig_map2plotw.connect(self.refresh.slot(
+                    self.plotw_t_gps.plot_widget.plotLoadedData,
+                    'GPS plot'))
 
 
 
@@ -633,8 +1109,9 @@ class MainWindow(QMainWindow):
             # self.plotting_toolbar.show()
 
             # connect to slider:
-            self.slider.valueChanged.connect(
-                self.plotw_t_gps.plot_widget.date_marker.on_slider_changed)
+            self.slider.valueChanged.connect(self.refresh.slot(
+                self.plotw_t_gps.plot_widget.date_marker.on_slider_changed,
+                'GPS plot date'))
             self.plotw_t_gps.plot_widget.date_marker.sigposChanged.connect(
                 self.slider.setValue)
         else:
@@ -713,6 +1190,35 @@ class MainWindow(QMainWindow):
 
         print("MainWindow  -- on_button_clicked_openGpsFolder --finished")
 
+    def on_button_clicked_openWeights(self):
+
+        """
+        Open dialog window to select a coherence (or any weights) file, used
+        for weighted reference zones
+
+        Returns
+        -------
+        None.
+
+        """
+        print("MainWindow -- on_button_clicked_openWeights")
+        filename, _ = QFileDialog.getOpenFileName(self, "Select file")
+        if not filename:
+            print('no file selected')
+            return
+        try:
+            self.map_model.loader.open_weights(filename)
+        except (ValueError, OSError) as e:
+            print('cannot use weights:', e)
+            return
+        if self.ref_stat.findText('weighted') < 0:
+            self.ref_stat.addItem('weighted')
+        # cached reference zones were computed without (or other) weights
+        self.plot_model.recompute_ref_regions()
+        if self.plot_model.ref_name is not None:
+            self.update_ref()
+        print("MainWindow -- on_button_clicked_openWeights -- finished")
+
     def on_button_clicked_open(self):
 
         """
@@ -759,8 +1265,11 @@ class MainWindow(QMainWindow):
         self.map_model.update_selection()
         self.map_model.show_band(self.map_model.i)
 
-        self.map_model.profile_points = []
+        self.map_model.profile_points = np.empty((0, 2), dtype=int)
+        self.map_model.profile_vertices = np.empty((0, 2), dtype=int)
+        self.map_model.all_pointers_ij = None
         self.map_model.ref_pointers = None
+        self.map_model.ref_vertices = None
 
         # clear plots
         self.plotw_t.on_button_clicked_clearplot()
@@ -784,8 +1293,44 @@ class MainWindow(QMainWindow):
         print("MainWindow -- closeEvent-- finished")
 
 
+def export_main(args):
+    """
+    headless export of Map frames (no window, no OpenGL), see
+    insarviz.export
+    """
+    from insarviz.core import Cube, GpsNetwork
+    from insarviz.export import export_frames
+
+    if args.i is None:
+        raise SystemExit("--export-frames needs an input file (-i)")
+    cube = Cube(args.keep or "stack.tif", args.i,
+                chunk_cache=args.chunk_cache)
+    stations = None
+    if args.gps:
+        gps = GpsNetwork(args.gps, cube.dataset.profile)
+        stations = {name: (data['ref_east_ras'], data['ref_north_ras'])
+                    for name, data in gps.gps_data.items()}
+    export_frames(cube, args.export_frames,
+                  palette=args.colormap,
+                  levels=args.levels,
+                  fps=args.fps,
+                  workers=args.workers,
+                  stations=stations)
+
+
 def main():
     print("ts_viz -- Main")
+    import sys
+    if sys.argv[1:2] == ['extract']:
+        # headless subcommand: ts_viz extract FEATURES -i CUBE -o OUTPUT
+        from insarviz.extract import main as extract_main
+        extract_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['convert']:
+        # headless subcommand: ts_viz convert -i CUBE [-o OUTPUT]
+        from insarviz.convert import main as convert_main
+        convert_main(sys.argv[2:])
+        return
     QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
     import argparse
     parser = argparse.ArgumentParser(
@@ -793,21 +1338,72 @@ def main():
     parser.add_argument("-v", type=int, default=3,
                         help=("set logging level:"
                               "0 critical, 1 error, 2 warning,"
-                              "3 info, 4 debug, default=info"))
+                              "3 info, 4 debug (and timing spans written to "
+                              "insarviz_trace.json), default=info"))
     parser.add_argument("-i",
                         type=str,
                         default=None,
-                        help="input filename")
+                        help=("input filename (or folder of bands, or Zarr "
+                              "store), HDF5/NetCDF4 files need h5py, Zarr "
+                              "stores zarr"))
     parser.add_argument("-p",
                         type=str,
                         default=None,
                         help="directory that contains user defined plugins")
     parser.add_argument("-k", "--keep",
                         type=str,
-                        help="Keep tiff file")
+                        help=("Keep tiff file (stack of a folder of bands), "
+                              "reused and appended new dates to afterwards"))
+    parser.add_argument("--export-frames",
+                        type=str,
+                        default=None,
+                        metavar="OUTPUT",
+                        help=("headless export of Map frames of input file: "
+                              "OUTPUT is a directory (PNG frames) or a "
+                              ".gif/.mp4 file (needs ffmpeg)"))
+    parser.add_argument("--colormap",
+                        type=str,
+                        default='grey',
+                        help=("export palette: grey, bipolar, thermal, "
+                              "viridis or .npy file of n-by-4 RGBA colors"))
+    parser.add_argument("--levels",
+                        type=float,
+                        nargs=2,
+                        default=None,
+                        metavar=("V0", "V1"),
+                        help=("export data values mapped to palette bounds, "
+                              "default: 5th/95th percentiles of middle band"))
+    parser.add_argument("--fps",
+                        type=int,
+                        default=5,
+                        help="export animation frame rate")
+    parser.add_argument("--workers",
+                        type=int,
+                        default=None,
+                        help="export worker processes, default: all cores")
+    parser.add_argument("--gps",
+                        type=str,
+                        default=None,
+                        help="export: directory of GPS files, draw stations")
+    parser.add_argument("--chunk-cache",
+                        type=float,
+                        default=None,
+                        metavar="MB",
+                        help=("chunk cache size of HDF5/NetCDF files (MB), "
+                              "default: 64 MB or the chunks of 4 time "
+                              "series"))
+    parser.add_argument("--profile-startup",
+                        action="store_true",
+                        help=("print a timing breakdown of imports and "
+                              "initialization once the window (and input "
+                              "file) is shown"))
 #     parser.add_argument("-c", type=str, default=None,
 #                     help="config directory. default $HOME/.config/insarviz")
     args = parser.parse_args()
+    if args.chunk_cache is not None:
+        args.chunk_cache = int(args.chunk_cache * 2**20)
+    startup.enabled = args.profile_startup
+    startup.mark("arguments")
 
     logging_translate = [logging.CRITICAL,
                          logging.ERROR,
@@ -818,7 +1414,15 @@ def main():
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         level=logging_translate[args.v])
     logger = logging.getLogger(__name__)
+    if args.v >= 4:
+        instrument.enable(trace="insarviz_trace.json")
+
+    if args.export_frames:
+        export_main(args)
+        return
+
     app = QApplication([])
+    startup.mark("QApplication")
 
     logger.info(f"loading {args.i}")
     # config = read_config(args.c)
@@ -837,7 +1441,10 @@ def main():
 
     ex = MainWindow(filename=args.i,
                     config_dict=config,
-                    stack_file=stack_file)
+                    stack_file=stack_file,
+                    chunk_cache=args.chunk_cache)
+    if args.i is None:
+        startup.finish()
     app.exec_()
 
 
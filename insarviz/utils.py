@@ -6,12 +6,13 @@
 # imports ###################################################################
 
 import numpy as np
-from itertools import product
 
 from PyQt5.QtWidgets import QMessageBox
 from PyQt5.QtCore import QUrl
 from PyQt5.QtGui import QDesktopServices
 
+from insarviz.core.stats import band_histogram  # noqa: F401 (moved to core)
+
 # utils #####################################################################
 
 def get_nearest(array, value):
@@ -49,7 +50,7 @@ def get_neighbors_idxs(array, target, radius):
     """
     Get the indices (col, line) of the values neighboring a target index in an
     array, with a given radius
-    Returns a tuple containing ((list of cols), (list of lines)) of the
+    Returns a tuple containing (array of cols, array of lines) of the
     indexes to facilitate indexing in the array.
     NB: The target's index is excluded.
 
@@ -69,8 +70,8 @@ def get_neighbors_idxs(array, target, radius):
     mat[neighbors] = -999
 
     >> neighbors
-    ((0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3),
-     (0, 1, 2, 3, 4, 0, 1, 3, 4, 0, 1, 2, 3, 4, 0, 1, 2, 3, 4))
+    (array([0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3]),
+     array([0, 1, 2, 3, 4, 0, 1, 3, 4, 0, 1, 2, 3, 4, 0, 1, 2, 3, 4]))
 
     >> mat
     array([[-999, -999, -999, -999, -999,    5],
@@ -93,45 +94,46 @@ def get_neighbors_idxs(array, target, radius):
     Returns
     -------
     tuple
-        tuple of (list of cols, list of lines) of the neighbors' indexes.
+        tuple of (array of cols, array of lines) of the neighbors' indexes.
 
     """
-    a, b = target[0], target[1]
-    neighbors = [(i, j) for i in range(a-radius, a+radius+1) for j in range(
-        b-radius, b+radius+1) if i > -1 and j > -1 and j < len(
-            array[0]) and i < len(array)]
-    neighbors.remove((a, b))
-    return tuple(zip(*neighbors))
+    a, b = int(target[0]), int(target[1])
+    h, w = np.shape(array)[:2]
+    rows = np.arange(max(a-radius, 0), min(a+radius+1, h))
+    cols = np.arange(max(b-radius, 0), min(b+radius+1, w))
+    ii, jj = np.meshgrid(rows, cols, indexing='ij')
+    keep = (ii != a) | (jj != b)
+    return ii[keep], jj[keep]
 
 
 def get_rectangle(point_1, point_2):
     """
-    Given the indices of two input points point_1 and point_2, returns a list
-    of the indices (col, line) of the pixels forming the rectangle between
-    those corner points (the sides of the rectangle are parallel to col and
-    line axes).
+    Given the indices of two input points point_1 and point_2, returns an
+    array of the indices (col, line) of the pixels forming the rectangle
+    between those corner points (the sides of the rectangle are parallel to
+    col and line axes).
 
     Example
     -------
     get_rectangle([0,0],[2,3])
-    >>> [(0, 0),
-         (0, 1),
-         (0, 2),
-         (0, 3),
-         (1, 0),
-         (1, 1),
-         (1, 2),
-         (1, 3),
-         (2, 0),
-         (2, 1),
-         (2, 2),
-         (2, 3)]
-
-    get_rectangle([0,0],[2,3]) == get_rectangle([2,3], [0,0])
+    >>> array([[0, 0],
+               [0, 1],
+               [0, 2],
+               [0, 3],
+               [1, 0],
+               [1, 1],
+               [1, 2],
+               [1, 3],
+               [2, 0],
+               [2, 1],
+               [2, 2],
+               [2, 3]])
+
+    (get_rectangle([0,0],[2,3]) == get_rectangle([2,3], [0,0])).all()
     >>> True
 
     get_rectangle([2,3],[2,3])
-    [(2, 3)]
+    array([[2, 3]])
 
     Parameters
     ----------
@@ -142,20 +144,78 @@ def get_rectangle(point_1, point_2):
 
     Returns
     -------
-    tuple
-        tuple of lists (col, line) of indices of all points forming the
+    array
+        n-by-2 array of indices (col, line) of all points forming the
         rectangle.
 
     """
-    min_x = min(point_1[0], point_2[0])
-    max_x = max(point_1[0], point_2[0])
-    min_y = min(point_1[1], point_2[1])
-    max_y = max(point_1[1], point_2[1])
+    cols, lines = get_rectangle_slices(point_1, point_2)
+    x, y = np.mgrid[cols, lines]
+    return np.stack((x.ravel(), y.ravel()), axis=1)
+
+
+def get_rectangle_slices(point_1, point_2):
+    """
+    Given the indices of two input points point_1 and point_2, returns the
+    slices (cols, lines) of the rectangle between those corner points, to
+    index arrays (or read windows) without listing the rectangle's pixels.
+
+    Example
+    -------
+    get_rectangle_slices([2,3],[0,0])
+    >>> (slice(0, 3, None), slice(0, 4, None))
+
+    Parameters
+    ----------
+    point_1 : tuple or list
+        indices (col, line) of the first point.
+    point_2 : tuple or list
+        indices (col, line) of the second point.
+
+    Returns
+    -------
+    tuple
+        (slice of cols, slice of lines), both ends included.
+
+    """
+    min_x = int(min(point_1[0], point_2[0]))
+    max_x = int(max(point_1[0], point_2[0]))
+    min_y = int(min(point_1[1], point_2[1]))
+    max_y = int(max(point_1[1], point_2[1]))
+    return slice(min_x, max_x + 1), slice(min_y, max_y + 1)
+
+def sample_polyline(vertices, n):
+    """
+    Sample n points evenly spaced along a polyline (both ends included).
+
+    Example
+    -------
+    sample_polyline([(0, 0), (4, 0), (4, 2)], 4)
+    >>> array([[0., 0.],
+               [2., 0.],
+               [4., 0.],
+               [4., 2.]])
+
+    Parameters
+    ----------
+    vertices : array-like
+        n-by-2 vertices (i, j) of the polyline.
+    n : int
+        number of points.
 
-    x_coords = [x for x in range(min_x, max_x + 1)]
-    y_coords = [y for y in range(min_y, max_y + 1)]
+    Returns
+    -------
+    array
+        n-by-2 float array of coordinates (i, j) of the points.
+
+    """
+    vertices = np.asarray(vertices, dtype=float).reshape((-1, 2))
+    length = np.concatenate(([0.], np.cumsum(
+        np.hypot(*np.diff(vertices, axis=0).T))))
+    position = np.linspace(0., length[-1], n)
+    return np.stack((np.interp(position, length, vertices[:, 0]),
+                     np.interp(position, length, vertices[:, 1])), axis=1)
 
-    return list(product(x_coords, y_coords))
 
 def openUrl(self):
     """
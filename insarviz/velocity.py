@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per-pixel least-squares trend fits over all bands/dates of a dataset:
+intercept, velocity, optionally acceleration and annual/semiannual terms,
+and residual RMS, computed block by block (rows of the dataset) in worker
+processes. Results are maps (e.g. mean velocity) shown as Map layers, see
+MapModel.add_layer.
+"""
+
+# imports ###################################################################
+
+import os
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from insarviz.core import cube_pool, worker_cube
+
+SECONDS_PER_YEAR = 365.25 * 86400
+
+# max number of values (bands/dates x pixels) read and fitted at once
+BLOCK_SIZE = 2**24
+
+# fits ######################################################################
+
+
+def years(timestamps):
+    """
+    Time axis of fits: years since first date if timestamps are POSIX
+    timestamps (PlotModel.timestamps of a dataset with dates), band numbers
+    otherwise.
+
+    Parameters
+    ----------
+    timestamps : range or list
+        band numbers (range) or POSIX timestamps of bands/dates.
+
+    Returns
+    -------
+    array
+        time of each band/date.
+
+    """
+    if isinstance(timestamps, range):
+        return np.asarray(timestamps, dtype=float)
+    t = np.asarray(timestamps, dtype=float)
+    return (t - t[0]) / SECONDS_PER_YEAR
+
+
+def design_matrix(t, acceleration=False, seasonal=False):
+    """
+    Design matrix of the fitted model
+    v(t) = intercept + velocity*t [+ acceleration*t²/2]
+           [+ annual_sin*sin(2πt) + annual_cos*cos(2πt)
+            + semiannual_sin*sin(4πt) + semiannual_cos*cos(4πt)]
+
+    Parameters
+    ----------
+    t : array
+        time of each band/date (years, see years).
+    acceleration : bool, optional
+        fit a quadratic term. The default is False.
+    seasonal : bool, optional
+        fit annual and semiannual sine/cosine terms. The default is False.
+
+    Returns
+    -------
+    X : array
+        number of bands/dates-by-number of terms design matrix.
+    names : list
+        name of each term (column of X).
+
+    """
+    t = np.asarray(t, dtype=float)
+    columns, names = [np.ones_like(t), t], ['intercept', 'velocity']
+    if acceleration:
+        columns.append(t * t / 2.)
+        names.append('acceleration')
+    if seasonal:
+        for period, name in ((1., 'annual'), (.5, 'semiannual')):
+            columns += [np.sin(2. * np.pi * t / period),
+                        np.cos(2. * np.pi * t / period)]
+            names += [name + '_sin', name + '_cos']
+    return np.stack(columns, axis=1), names
+
+
+def fit_block(data, X, min_valid=None):
+    """
+    Least-squares fit of all pixels of a block, ignoring nan values.
+
+    Pixels valid at all dates share a single pseudo-inverse of X. The normal
+    equations of other pixels are sums over their valid dates of the outer
+    products x_t x_t^T of rows of X, computed once per block, and are solved
+    all at once.
+
+    Parameters
+    ----------
+    data : array
+        number of bands/dates-by-n array of values.
+    X : array
+        number of bands/dates-by-number of terms design matrix.
+    min_valid : int or None, optional
+        min number of valid dates for a pixel to be fitted. The default is
+        None (number of terms + 1).
+
+    Returns
+    -------
+    params : array
+        number of terms-by-n array of fitted parameters (nan if not fitted).
+    rms : array
+        n array of root mean square of residuals (nan if not fitted).
+
+    """
+    nt, k = X.shape
+    min_valid = k + 1 if min_valid is None else max(min_valid, k)
+    valid = np.isfinite(data)
+    y = np.where(valid, data, 0.)
+    count = valid.sum(0)
+    params = np.full((k, data.shape[1]), np.nan)
+    rms = np.full(data.shape[1], np.nan)
+
+    full = count == nt
+    if full.any():
+        p = np.linalg.pinv(X) @ y[:, full]
+        params[:, full] = p
+        res = y[:, full] - X @ p
+        rms[full] = np.sqrt((res * res).mean(0))
+
+    partial = ~full & (count >= min_valid)
+    if partial.any():
+        w = valid[:, partial].astype(float)
+        outer = X[:, :, None] * X[:, None, :]  # nt-by-k-by-k
+        normal = np.einsum('tp,tkl->pkl', w, outer)
+        rhs = y[:, partial].T @ X
+        p = (np.linalg.pinv(normal, hermitian=True) @ rhs[:, :, None])[..., 0]
+        params[:, partial] = p.T
+        res = (y[:, partial] - X @ p.T) * w
+        rms[partial] = np.sqrt((res * res).sum(0) / count[partial])
+    return params, rms
+
+
+def _fit_rows(rows, X, min_valid, cube=None):
+    """
+    job: read rows (texture/data orientation) of cube and fit them, cube
+    being the worker process' cube by default (see core.cube_pool)
+    """
+    if cube is None:
+        cube = worker_cube()
+    data = cube.load_window(0, rows[0], cube.dataset.width, rows[1] - rows[0])
+    return rows, fit_block(data.reshape((len(data), -1)).astype(float), X,
+                           min_valid)
+
+
+def velocity_maps(loader, timestamps, acceleration=False, seasonal=False,
+                  min_valid=None, workers=None, progress=None):
+    """
+    Fit all pixels of loader's dataset, by blocks of rows read and fitted in
+    worker processes.
+
+    Parameters
+    ----------
+    loader : Loader, Cube or DerivedCube
+        Loader or cube with an opened dataset, or derived cube (fitted in
+        this process).
+    timestamps : range or list
+        band numbers or POSIX timestamps of bands/dates (see years).
+    acceleration, seasonal : bool, optional
+        terms to fit, see design_matrix. The default is False.
+    min_valid : int or None, optional
+        min number of valid dates for a pixel to be fitted, see fit_block.
+        The default is None.
+    workers : int or None, optional
+        number of worker processes (1: fit in this process). The default is
+        None (number of CPUs).
+    progress : callable or None, optional
+        called as progress(done, total) after each block, fit is cancelled
+        if it returns True. The default is None.
+
+    Returns
+    -------
+    dict or None
+        {name: height-by-width float32 map} of each fitted term and of
+        'rms' (residual RMS), in texture/data orientation, nan where not
+        fitted. None if cancelled.
+
+    """
+    X, names = design_matrix(years(timestamps), acceleration, seasonal)
+    nt, (h, w) = len(loader), loader.dataset.shape
+    step = max(1, BLOCK_SIZE // (nt * w))
+    blocks = [(r, min(r + step, h)) for r in range(0, h, step)]
+    maps = np.full((len(names) + 1, h, w), np.nan, dtype='float32')
+
+    def store(rows, result):
+        params, rms = result
+        maps[:-1, rows[0]:rows[1]] = params.reshape((-1, rows[1]-rows[0], w))
+        maps[-1, rows[0]:rows[1]] = rms.reshape((rows[1]-rows[0], w))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or getattr(loader, 'source', None) is not None:
+        # derived cubes (see insarviz.derived) are computed in this process
+        for done, rows in enumerate(blocks, 1):
+            store(*_fit_rows(rows, X, min_valid, loader))
+            if progress is not None and progress(done, len(blocks)):
+                return None
+    else:
+        with cube_pool(getattr(loader, 'cube', loader), workers) as pool:
+            futures = [pool.submit(_fit_rows, rows, X, min_valid)
+                       for rows in blocks]
+            for done, future in enumerate(as_completed(futures), 1):
+                store(*future.result())
+                if progress is not None and progress(done, len(blocks)):
+                    for f in futures:
+                        f.cancel()
+                    return None
+    return {name: m for name, m in zip(names + ['rms'], maps)}
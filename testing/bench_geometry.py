@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the geometry helpers (insarviz.bresenham, insarviz.utils):
+list-of-tuples implementations against the NumPy ones now used by MapModel
+and PlotModel.
+
+Usage: python -m testing.bench_geometry
+"""
+
+# imports ###################################################################
+
+import timeit
+from itertools import product
+
+import numpy as np
+
+from insarviz.bresenham import line, polyline
+from insarviz.utils import get_neighbors_idxs, get_rectangle
+
+# list-of-tuples implementations ############################################
+
+
+def polyline_tuples(points):
+    """profile line as built by MapModel.show_profile before polyline"""
+    idxs = [tuple(points[0])]
+    for p0, p1 in zip(points[:-1], points[1:]):
+        idxs += line(*p0, *p1)[1:]
+    return idxs
+
+
+def rectangle_tuples(point_1, point_2):
+    min_x, max_x = sorted((point_1[0], point_2[0]))
+    min_y, max_y = sorted((point_1[1], point_2[1]))
+    return list(product(range(min_x, max_x+1), range(min_y, max_y+1)))
+
+
+def neighbors_tuples(array, target, radius):
+    a, b = target[0], target[1]
+    neighbors = [(i, j) for i in range(a-radius, a+radius+1) for j in range(
+        b-radius, b+radius+1) if i > -1 and j > -1 and j < len(
+            array[0]) and i < len(array)]
+    neighbors.remove((a, b))
+    return tuple(zip(*neighbors))
+
+
+def select_tuples(selection, points):
+    """selection update loop of MapModel.show_ref before vectorization"""
+    for p in range(len(points)):
+        selection[int(points[p][1]), int(points[p][0])] = -1.
+
+
+def select_array(selection, points):
+    selection[points[:, 1], points[:, 0]] = -1.
+
+# benchmark #################################################################
+
+
+def bench(label, stmt, number):
+    t = min(timeit.repeat(stmt, number=number, repeat=3)) / number
+    print(f"{label:<40s} {t*1e3:10.3f} ms")
+    return t
+
+
+def main():
+    rng = np.random.default_rng(0)
+    size = 2000
+    selection = np.zeros((size, size), dtype='float32')
+
+    vertices = rng.integers(0, size, (20, 2))
+    assert (np.array(polyline_tuples(vertices)) == polyline(vertices)).all()
+    print(f"profile: {len(vertices)} vertices, "
+          f"{len(polyline(vertices))} pixels")
+    t0 = bench("  bresenham.line, list of tuples",
+               lambda: polyline_tuples(vertices), 20)
+    t1 = bench("  bresenham.polyline, array",
+               lambda: polyline(vertices), 20)
+    print(f"  speedup x{t0/t1:.1f}")
+
+    corners = (100, 200), (1099, 1199)
+    print("reference zone: 1000x1000 px")
+    t0 = bench("  get_rectangle + loop, list of tuples",
+               lambda: select_tuples(selection,
+                                     rectangle_tuples(*corners)), 1)
+    t1 = bench("  get_rectangle + indexing, array",
+               lambda: select_array(selection, get_rectangle(*corners)), 1)
+    print(f"  speedup x{t0/t1:.1f}")
+
+    print("neighbors: radius 2")
+    t0 = bench("  list comprehension",
+               lambda: neighbors_tuples(selection, (500, 500), 2), 1000)
+    t1 = bench("  index arrays",
+               lambda: get_neighbors_idxs(selection, (500, 500), 2), 1000)
+    print(f"  speedup x{t0/t1:.1f}")
+
+
+if __name__ == '__main__':
+    main()
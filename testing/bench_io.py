@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of data access on synthetic datasets (testing.synthetic):
+stacking a folder of bands (and appending a date to a kept stack), reading
+bands and time series (GTiff, ENVI and chunked HDF5 if h5py is installed),
+reference zone averaging, band statistics (as MapModel.show_band) and GPS
+files parsing.
+
+Results (best of repeats, seconds) can be appended to a history file, one
+JSON line per run with the git commit, and compared with the previous run
+of another commit: slower benchmarks (beyond tolerance) are reported as
+regressions and the exit status is 1.
+
+Usage: python -m testing.bench_io [--width W] [--height H] [--bands N]
+                                  [--history FILE] [--tolerance T]
+"""
+
+# imports ###################################################################
+
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import warnings
+
+import numpy as np
+from rasterio.errors import NotGeoreferencedWarning
+
+from insarviz.core import Cube, GpsNetwork, Stats
+from insarviz.reference import region_mask, reference_series
+
+from testing.synthetic import make_cube, make_gps
+
+# benchmark #################################################################
+
+
+def bench(results, label, stmt, number, repeat=3, setup='pass'):
+    t = min(timeit.repeat(stmt, setup=setup, number=number,
+                          repeat=repeat)) / number
+    print(f"{label:<40s} {t*1e3:10.3f} ms")
+    results[label] = t
+    return t
+
+
+def stack(folder, stack_file):
+    cube = Cube(stack_file)
+    cube.open(folder)
+    cube.dataset.close()
+
+
+def remove_stack(stack_file):
+    """remove stack_file (and its ENVI header...), so that it is not reused
+    by the next stacking"""
+    for name in glob.glob(os.path.splitext(stack_file)[0] + '.*'):
+        os.remove(name)
+
+
+def stack_but_last(folder, stack_file):
+    """stack all bands of folder but the last one, to be appended"""
+    remove_stack(stack_file)
+    last = sorted(glob.glob(os.path.join(folder, '*.bin')))[-1]
+    os.rename(last, last + '.new')
+    try:
+        stack(folder, stack_file)
+    finally:
+        os.rename(last + '.new', last)
+
+
+def ref_zone(cube, vertices):
+    """reference series of a region, as PlotModel.set_ref_region"""
+    i0, j0, mask = region_mask(vertices, cube.dataset.shape)
+    height, width = mask.shape
+    data = cube.load_window(i0, j0, width, height)[:, mask]
+    return {s: reference_series(data, s) for s in ('mean', 'median')}
+
+
+def band_stats(cube, i):
+    """band statistics and texture data, as MapModel.prepare_band"""
+    stats = Stats(*cube.load_band(i)[:2])
+    return stats.texture(), stats.histogram()
+
+
+def run(folder, width, height, bands, stations):
+    """generate datasets in folder and time each operation"""
+    print(f"cube: {width}x{height} pixels, {bands} bands; "
+          f"{stations} GPS stations")
+    make_cube(os.path.join(folder, 'bands'), width, height, bands, 'bin')
+    formats = [('GTiff', 'cube.tif'), ('ENVI', 'cube.envi')]
+    try:
+        import h5py  # noqa: F401
+        formats.append(('HDF5', 'cube.h5'))
+    except ImportError:
+        print("h5py not installed, no HDF5 benchmarks")
+    cubes = {fmt: Cube(os.path.join(folder, 'stack.tif'),
+                       make_cube(os.path.join(folder, name), width, height,
+                                 bands, fmt))
+             for fmt, name in formats}
+    gps = make_gps(os.path.join(folder, 'gps'), width, height, stations)
+
+    results = {}
+    rng = np.random.default_rng(0)
+    points = np.stack((rng.integers(0, width, 100),
+                       rng.integers(0, height, 100)), axis=1)
+    zone = [(width // 4, height // 4), (width // 4 + 99, height // 4 + 99)]
+    polygon = [(width // 4, height // 4), (3 * width // 4, height // 3),
+               (width // 2, 3 * height // 4)]
+    stacked = os.path.join(folder, 'stacked.tif')
+    bench(results, "stack .bin folder",
+          lambda: stack(os.path.join(folder, 'bands'), stacked), 1,
+          setup=lambda: remove_stack(stacked))
+    bench(results, "append a date to kept stack",
+          lambda: stack(os.path.join(folder, 'bands'), stacked), 1,
+          setup=lambda: stack_but_last(os.path.join(folder, 'bands'),
+                                       stacked))
+    for fmt, cube in cubes.items():
+        bench(results, f"load_band {fmt}",
+              lambda: cube.load_band(bands // 2), 5)
+        bench(results, f"load_profile {fmt} (100 points)",
+              lambda: [cube.load_profile(*p) for p in points], 1)
+        bench(results, f"load_profiles {fmt} (100 points)",
+              lambda: cube.load_profiles(points), 5)
+    cube = cubes['GTiff']
+    bench(results, "ref zone 100x100 (mean, median)",
+          lambda: ref_zone(cube, zone), 5)
+    bench(results, "ref zone polygon (mean, median)",
+          lambda: ref_zone(cube, polygon), 5)
+    bench(results, "band stats (show_band)",
+          lambda: band_stats(cube, bands // 2), 5)
+    bench(results, "GPS files parsing",
+          lambda: GpsNetwork(gps, cube.dataset.profile), 1)
+    return results
+
+
+# history ###################################################################
+
+
+def commit():
+    """current git commit (short hash, + if the tree is modified)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        sha = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                             cwd=here, capture_output=True, text=True,
+                             check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD'],
+                               cwd=here).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return sha + ('+' if dirty else '')
+
+
+def compare(history, results, size, tolerance):
+    """
+    Compare results with the last run of history with the same size and
+    another commit, print and return regressions.
+
+    Returns
+    -------
+    list
+        labels of benchmarks slower than (1 + tolerance) times previous.
+
+    """
+    current = commit()
+    try:
+        with open(history) as f:
+            runs = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        runs = []
+    runs = [r for r in runs if r['size'] == size and r['commit'] != current]
+    if not runs:
+        print(f"no previous run in {history}")
+        return []
+    previous = runs[-1]
+    print(f"compared with {previous['commit']} ({previous['date']}):")
+    regressions = []
+    for label, t in results.items():
+        t0 = previous['results'].get(label)
+        if t0 is None:
+            continue
+        ratio = t / t0
+        flag = ''
+        if ratio > 1. + tolerance:
+            flag = '  REGRESSION'
+            regressions.append(label)
+        print(f"{label:<40s} x{ratio:6.2f}{flag}")
+    return regressions
+
+
+def save(history, results, size):
+    record = dict(commit=commit(), date=time.strftime('%Y-%m-%d %H:%M:%S'),
+                  size=size, results=results)
+    with open(history, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="data access benchmarks")
+    parser.add_argument("--width", type=int, default=1000)
+    parser.add_argument("--height", type=int, default=800)
+    parser.add_argument("--bands", type=int, default=60)
+    parser.add_argument("--stations", type=int, default=30)
+    parser.add_argument("--history", default=None,
+                        help=("JSON lines file of results: compare with the "
+                              "previous commit's run, then append this run"))
+    parser.add_argument("--tolerance", type=float, default=.2,
+                        help=("relative slowdown reported as a regression, "
+                              "default: .2"))
+    args = parser.parse_args()
+    warnings.simplefilter('ignore', NotGeoreferencedWarning)
+
+    size = [args.width, args.height, args.bands, args.stations]
+    with tempfile.TemporaryDirectory() as folder:
+        results = run(folder, *size)
+    if args.history is None:
+        return
+    regressions = compare(args.history, results, size, args.tolerance)
+    save(args.history, results, size)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
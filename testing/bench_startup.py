@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of ts_viz startup: import time of insarviz.ts_viz in a fresh
+interpreter (best of several runs) against a time budget, and check that
+heavy modules used only once a file is opened (rasterio) or by some tools
+(scipy, pyproj, pandas) are not imported at startup.
+
+Usage: python -m testing.bench_startup [--budget SECONDS] [--runs N]
+Exit status is 1 if the budget is exceeded or a deferred module is
+imported.
+"""
+
+# imports ###################################################################
+
+import json
+import os
+import subprocess
+import sys
+
+# modules that must not be imported by insarviz.ts_viz:
+DEFERRED = ('rasterio', 'scipy', 'pyproj', 'pandas', 'PyQt5.Qt')
+
+SCRIPT = f"""
+import json, sys, time
+t0 = time.perf_counter()
+import insarviz.ts_viz
+t = time.perf_counter() - t0
+from insarviz import startup
+print(json.dumps(dict(
+    time=t, report=startup.report(),
+    imported=[m for m in {DEFERRED!r} if m in sys.modules])))
+"""
+
+# benchmark #################################################################
+
+
+def import_time():
+    """import time of insarviz.ts_viz in a new interpreter"""
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, '-c', SCRIPT], cwd=root, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="ts_viz startup benchmark")
+    parser.add_argument("--budget", type=float, default=1.,
+                        help="max import time of insarviz.ts_viz (s)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [import_time() for _ in range(args.runs)]
+    best = min(runs, key=lambda r: r['time'])
+    print(best['report'])
+    print(f"{'import insarviz.ts_viz (best of ' + str(args.runs) + ')':<40}"
+          f" {1000. * best['time']:8.1f} ms (budget "
+          f"{1000. * args.budget:.0f} ms)")
+    failed = False
+    if best['time'] > args.budget:
+        print("startup budget exceeded")
+        failed = True
+    if best['imported']:
+        print("imported at startup:", ', '.join(best['imported']))
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
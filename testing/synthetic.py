@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Synthetic datasets for benchmarks: cubes of bands/dates (GTiff, ENVI,
+chunked HDF5 as MintPy's timeseries.h5 or folder of dated .bin files, as
+opened by insarviz.core.Cube) and GPS
+stations files (WebObs format, as in gps_PF_all) located in the cube.
+
+Usage: python -m testing.synthetic OUTPUT_FOLDER [--width W] [--height H]
+                                   [--bands N] [--stations N]
+"""
+
+# imports ###################################################################
+
+import datetime
+import os
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+# default georeferencing: UTM 40S (Réunion, as gps_PF_all), 100 m pixels
+CRS = 'EPSG:32740'
+ORIGIN = (340000., 7680000.)  # east, north of upper left corner (m)
+PIXEL_SIZE = 100.
+FIRST_DATE = datetime.date(2017, 1, 1)
+DAYS_PER_BAND = 12  # revisit time of Sentinel-1
+
+FORMATS = ('GTiff', 'ENVI', 'HDF5', 'bin')
+CHUNKS = (10, 128, 128)  # HDF5 chunks (bands, rows, columns)
+
+# cubes #####################################################################
+
+
+def dates(bands):
+    """dates of bands (datetime.date), DAYS_PER_BAND apart"""
+    return [FIRST_DATE + datetime.timedelta(days=DAYS_PER_BAND * k)
+            for k in range(bands)]
+
+
+def displacement(width, height, bands, seed=0, holes=.05):
+    """
+    Synthetic displacement cube: a few Gaussian bumps with linear and
+    seasonal motion, plus noise, with nodata (0) holes.
+
+    Parameters
+    ----------
+    width, height, bands : int
+        size of the cube.
+    seed : int, optional
+        random seed. The default is 0.
+    holes : float, optional
+        fraction of nodata pixels (same at all dates). The default is .05.
+
+    Returns
+    -------
+    array
+        bands-by-height-by-width float32 array.
+
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(bands) * DAYS_PER_BAND / 365.25  # years
+    y, x = np.mgrid[0:height, 0:width]
+    data = rng.normal(0., .005, (bands, height, width)).astype('float32')
+    for _ in range(4):
+        cx, cy = rng.uniform(0, width), rng.uniform(0, height)
+        sigma = rng.uniform(.05, .2) * max(width, height)
+        bump = np.exp(-((x - cx)**2 + (y - cy)**2) / (2 * sigma**2))
+        velocity, amplitude = rng.uniform(-.05, .05), rng.uniform(0., .01)
+        motion = velocity * t + amplitude * np.sin(2 * np.pi * t)
+        data += (motion[:, None, None] * bump).astype('float32')
+    data[:, rng.random((height, width)) < holes] = 0.
+    return data
+
+
+def profile(width, height, bands, driver='GTiff'):
+    """rasterio profile of synthetic cubes"""
+    return dict(driver=driver, width=width, height=height, count=bands,
+                dtype='float32', nodata=0.0, crs=CRS,
+                transform=from_origin(*ORIGIN, PIXEL_SIZE, PIXEL_SIZE))
+
+
+def make_cube(path, width=500, height=400, bands=40, fmt='GTiff', seed=0):
+    """
+    Write a synthetic cube, band descriptions being dates (YYYYMMDD).
+
+    Parameters
+    ----------
+    path : str
+        file name (GTiff, ENVI, HDF5) or folder (bin) to write.
+    width, height, bands : int, optional
+        size of the cube. The default is 500x400 pixels, 40 bands.
+    fmt : str, optional
+        'GTiff', 'ENVI', 'HDF5' (needs h5py, gzip compressed CHUNKS) or
+        'bin' (folder of single band ENVI files named after their date,
+        stacked by Cube.open). The default is 'GTiff'.
+    seed : int, optional
+        random seed. The default is 0.
+
+    Returns
+    -------
+    str
+        path.
+
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt}, must be one of {FORMATS}")
+    data = displacement(width, height, bands, seed)
+    names = [d.strftime('%Y%m%d') for d in dates(bands)]
+    if fmt == 'bin':
+        os.makedirs(path, exist_ok=True)
+        for name, band in zip(names, data):
+            filename = os.path.join(path, f"{name}T000000_disp.bin")
+            with rasterio.open(filename, 'w',
+                               **profile(width, height, 1, 'ENVI')) as dst:
+                dst.write(band, 1)
+        return path
+    if fmt == 'HDF5':
+        import h5py
+        with h5py.File(path, 'w') as f:
+            f.create_dataset('timeseries', data=data, compression='gzip',
+                             chunks=tuple(min(c, s) for c, s in
+                                          zip(CHUNKS, data.shape)))
+            f.create_dataset('date', data=np.array(names, dtype='S8'))
+            f.attrs.update(X_FIRST=ORIGIN[0], Y_FIRST=ORIGIN[1],
+                           X_STEP=PIXEL_SIZE, Y_STEP=-PIXEL_SIZE,
+                           EPSG=CRS.split(':')[1], NO_DATA_VALUE=0.)
+        return path
+    with rasterio.open(path, 'w', **profile(width, height, bands, fmt)) as dst:
+        dst.write(data)
+        for k, name in enumerate(names, start=1):
+            dst.set_band_description(k, name)
+    return path
+
+
+# gps #######################################################################
+
+WEBOBS_HEADER = """\
+################################################################################
+# WEBOBS OVPF
+#
+# PROC: {{PROC.CGNSSOVPF}} GNSS GAMIT/GLOBK OVPF
+# TITLE: {{\\fontsize{{14}}{{\\bf{name}: "Synthetic" - Local}} (All data)}}
+# FILENAME: {name}_all.txt
+# COORD:{east:d}\t{north:d}
+#
+#
+# CREATED: 01-Jan-2023 00:00:00 by insarviz testing.synthetic
+################################################################################
+#
+#yyyy mm dd HH MM SS Eastern(m) Northern(m) Up(m) dE dN dU Orbit East_treat(m) North_treat(m) Up_treat(m)
+"""
+
+
+def make_gps(folder, width=500, height=400, stations=20, days=2000, seed=0):
+    """
+    Write synthetic GPS stations files (WebObs format, one daily position
+    per line), stations being located in a synthetic cube of size
+    width x height.
+
+    Parameters
+    ----------
+    folder : str
+        folder to write (created if needed).
+    width, height : int, optional
+        size of the cube. The default is 500x400 pixels.
+    stations : int, optional
+        number of stations. The default is 20.
+    days : int, optional
+        number of daily positions per station. The default is 2000.
+    seed : int, optional
+        random seed. The default is 0.
+
+    Returns
+    -------
+    str
+        folder.
+
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    t = np.arange(days) / 365.25
+    daily = [FIRST_DATE + datetime.timedelta(days=k) for k in range(days)]
+    for s in range(stations):
+        name = f"S{s:03d}"
+        east = int(ORIGIN[0] + rng.uniform(0, width) * PIXEL_SIZE)
+        north = int(ORIGIN[1] - rng.uniform(0, height) * PIXEL_SIZE)
+        velocity = rng.uniform(-.02, .02, 3)
+        enu = (np.array([5780266., -2364394., 2550.])
+               + velocity * t[:, None]
+               + rng.normal(0., .005, (len(t), 3)))
+        with open(os.path.join(folder, name + '.txt'), 'w') as f:
+            f.write(WEBOBS_HEADER.format(name=name, east=east, north=north))
+            for day, (e, n, u) in zip(daily, enu):
+                f.write(f"{day:%Y %m %d} 11 59 00 {e:.6f} {n:.6f} {u:.6f} "
+                        f"0.010000 0.010000 0.010000 0.000000 "
+                        f"{e:.6f} {n:.6f} {u:.6f}\n")
+    return folder
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="write synthetic cubes and GPS stations")
+    parser.add_argument("output", help="output folder")
+    parser.add_argument("--width", type=int, default=500)
+    parser.add_argument("--height", type=int, default=400)
+    parser.add_argument("--bands", type=int, default=40)
+    parser.add_argument("--stations", type=int, default=20)
+    args = parser.parse_args()
+    os.makedirs(args.output, exist_ok=True)
+    size = dict(width=args.width, height=args.height, bands=args.bands)
+    for fmt, name in (('GTiff', 'cube.tif'), ('ENVI', 'cube.envi'),
+                      ('bin', 'bands')):
+        print(make_cube(os.path.join(args.output, name), fmt=fmt, **size))
+    print(make_gps(os.path.join(args.output, 'gps'), args.width, args.height,
+                   args.stations))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of derived cubes (insarviz.derived) on synthetic cubes: bands derived
+from the bands a transform needs (span) match bands of full chunks.
+
+Usage: python -m pytest testing
+"""
+
+# imports ###################################################################
+
+import numpy as np
+import pytest
+
+from insarviz import derived
+from insarviz.core import Cube
+from testing.synthetic import make_cube
+
+BANDS = 12
+
+# fixtures ##################################################################
+
+
+@pytest.fixture(scope='module')
+def cube(tmp_path_factory):
+    filename = str(tmp_path_factory.mktemp('derived') / 'cube.tif')
+    make_cube(filename, width=45, height=30, bands=BANDS)
+    cube = Cube()
+    cube.open(filename)
+    yield cube
+    cube.dataset.close()
+
+
+def _full_chunks(transform):
+    """transform without span: bands are read from whole chunks"""
+    def full(data):
+        return transform(data)
+    return full
+
+
+# tests #####################################################################
+
+
+@pytest.mark.parametrize('transform', [
+    derived.moving_average(3),
+    derived.moving_average(4),
+    derived.moving_median(5),
+    derived.increments,
+    derived.reference(np.linspace(-.01, .02, BANDS)),
+    ], ids=['mean3', 'mean4', 'median5', 'increments', 'reference'])
+def test_span_bands_match_chunks(cube, transform):
+    by_band = derived.DerivedCube(cube, transform)
+    by_chunk = derived.DerivedCube(cube, _full_chunks(transform))
+    by_chunk.chunk_size = 16  # several chunks, partial last row/col
+    for i in range(BANDS):
+        band, nodata, dtype = by_band.load_band(i)
+        expected = by_chunk.load_band(i)[0]
+        assert nodata is None and dtype == 'float32'
+        assert np.allclose(band, expected, equal_nan=True)
+    assert ('band', 0) in by_band.chunks
+
+
+def test_band_memoized_once(cube):
+    by_band = derived.DerivedCube(cube, derived.increments)
+    band = by_band.load_band(3)[0]
+    assert by_band.load_band(3)[0] is band
+    assert by_band.cached_bytes == band.nbytes
+
+
+def test_cache_size(cube):
+    by_chunk = derived.DerivedCube(cube, _full_chunks(derived.increments))
+    by_chunk.chunk_size = 16
+    by_chunk.cache_size = 2 * BANDS * 16 * 16 * 4  # two full chunks
+    by_chunk.load_band(0)
+    assert by_chunk.cached_bytes <= by_chunk.cache_size
+    assert len(by_chunk.chunks) == 2
+
+
+def test_window_and_profiles_match_chunks(cube):
+    source = cube.load_window(5, 3, 20, 11).astype(float)
+    nodata = cube.dataset.nodata
+    if nodata is not None:
+        source[source == nodata] = np.nan
+    expected = derived.increments(source.reshape((BANDS, -1))).reshape(
+        source.shape)
+    by_chunk = derived.DerivedCube(cube, _full_chunks(derived.increments))
+    by_chunk.chunk_size = 16
+    assert np.allclose(by_chunk.load_window(5, 3, 20, 11), expected,
+                       equal_nan=True)
+    points = np.array([(5, 3), (24, 13), (10, 7)])
+    profiles = by_chunk.load_profiles(points)
+    assert np.allclose(profiles, expected[:, points[:, 1] - 3,
+                                          points[:, 0] - 5].T,
+                       equal_nan=True)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of headless extraction of time series (insarviz.extract) on a
+synthetic cube, against means of the features' pixels.
+
+Usage: python -m pytest testing
+"""
+
+# imports ###################################################################
+
+import json
+import warnings
+
+import numpy as np
+import pytest
+
+from insarviz.core import Cube
+from insarviz.extract import Feature, extract, read_features
+from testing.synthetic import make_cube
+
+# fixtures ##################################################################
+
+
+@pytest.fixture(scope='module')
+def cube(tmp_path_factory):
+    filename = str(tmp_path_factory.mktemp('extract') / 'cube.tif')
+    make_cube(filename, width=40, height=30, bands=7)
+    cube = Cube()
+    cube.open(filename)
+    yield cube
+    cube.dataset.close()
+
+
+def _mean(cube, pixels):
+    data = cube.load_window(0, 0, 40, 30).astype(float)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-nan
+        return np.nanmean(data[:, pixels[:, 1], pixels[:, 0]], axis=1)
+
+
+# tests #####################################################################
+
+
+@pytest.mark.parametrize('block_size', [4, 16, None])
+def test_extract_matches_means(cube, block_size):
+    rng = np.random.default_rng(0)
+    features = [Feature('a', 'point', [(3, 4)]),
+                Feature('b', 'polygon', rng.integers(0, 30, (60, 2))),
+                Feature('c', 'polygon', [(x, y) for x in range(10, 25)
+                                         for y in range(5, 12)]),
+                Feature('outside', 'point', np.empty((0, 2)))]
+    result = dict((f.name, series) for f, series in
+                  extract(cube, features, workers=1, block_size=block_size))
+    assert sorted(result) == ['a', 'b', 'c', 'outside']
+    for feature in features[:3]:
+        assert np.allclose(result[feature.name],
+                           _mean(cube, feature.pixels), equal_nan=True)
+    assert np.isnan(result['outside']).all()
+
+
+def test_extract_reference(cube):
+    reference = Feature('ref', 'polygon', [(0, 0), (1, 0), (0, 1), (1, 1)])
+    features = [Feature('a', 'point', [(20, 15)])]
+    (_, series), = extract(cube, features, reference=reference, workers=1)
+    assert np.allclose(series, _mean(cube, features[0].pixels)
+                       - _mean(cube, reference.pixels), equal_nan=True)
+
+
+def test_read_csv(cube, tmp_path):
+    filename = tmp_path / 'points.csv'
+    filename.write_text("name,i,j\np,3.7,4.2\nq,-2,5\n")
+    p, q = read_features(str(filename), cube)
+    assert (p.name, p.kind) == ('p', 'point')
+    assert p.pixels.tolist() == [[3, 4]]
+    assert len(q.pixels) == 0  # outside of cube
+
+
+def test_read_geojson_polygon(cube, tmp_path):
+    i, j = np.array([2., 12., 12., 2., 2.]), np.array([3., 3., 9., 9., 3.])
+    x, y = cube.dataset.transform * (i, cube.dataset.height - j)
+    collection = {'type': 'FeatureCollection', 'features': [{
+        'type': 'Feature', 'properties': {'name': 'box'},
+        'geometry': {'type': 'Polygon',
+                     'coordinates': [np.stack((x, y), 1).tolist()]}}]}
+    filename = tmp_path / 'box.geojson'
+    filename.write_text(json.dumps(collection))
+    box, = read_features(str(filename), cube, crs=cube.dataset.crs)
+    assert box.kind == 'polygon'
+    assert len(box.pixels) == 11 * 7
+    assert box.pixels.min(0).tolist() == [2, 3]
+    assert box.pixels.max(0).tolist() == [12, 9]
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the cache of hovered pixels' time series (insarviz.profilecache)
+on a synthetic cube.
+
+Usage: python -m pytest testing
+"""
+
+# imports ###################################################################
+
+import numpy as np
+import pytest
+
+from insarviz.core import Cube
+from insarviz.profilecache import ProfileCache
+from testing.synthetic import make_cube
+
+# fixtures ##################################################################
+
+
+@pytest.fixture(scope='module')
+def cube(tmp_path_factory):
+    filename = str(tmp_path_factory.mktemp('profilecache') / 'cube.tif')
+    make_cube(filename, width=40, height=25, bands=6)
+    cube = Cube()
+    cube.open(filename)
+    yield cube
+    cube.dataset.close()
+
+
+# tests #####################################################################
+
+
+def test_profiles_match_loader(cube):
+    cache = ProfileCache(cube)
+    for i, j in [(0, 0), (39, 24), (20, 12), (21, 12), (5, 20), (39, 0)]:
+        profile = cache.get(i, j)
+        assert np.allclose(profile, cube.load_profile(i, j), equal_nan=True)
+        assert not profile.flags.writeable
+
+
+def test_block_read_on_miss(cube):
+    cache = ProfileCache(cube)
+    cache.get(20, 12)
+    assert cache.misses == 1 and len(cache) == cache.block_size**2
+    for i in range(13, 27):
+        cache.get(i, 12)
+    assert cache.misses == 1 and cache.hits == 14
+    # block clipped to dataset's bounds
+    cache.clear()
+    cache.get(0, 24)
+    assert len(cache) == cache.block_size * min(cache.block_size, 25)
+
+
+def test_max_bytes(cube):
+    size = ProfileCache(cube).get(0, 0).nbytes  # bytes of a time series
+    cache = ProfileCache(cube, max_bytes=20 * size)
+    cache.get(3, 3)
+    assert len(cache) == 20 and cache.nbytes == 20 * size
+    assert (3, 3) in cache.profiles  # most recently used kept
+    cache.get(30, 20)
+    assert len(cache) == 20 and (30, 20) in cache.profiles
+    assert (3, 3) not in cache.profiles
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of reference regions (insarviz.reference): rasterized masks and
+reference series.
+
+Usage: python -m pytest testing
+"""
+
+# imports ###################################################################
+
+import numpy as np
+import pytest
+
+from insarviz.reference import region_mask, reference_series
+
+# tests #####################################################################
+
+
+def test_pixel_and_rectangle():
+    assert region_mask([(3, 4)])[0:2] == (3, 4)
+    assert region_mask([(3, 4)])[2].shape == (1, 1)
+    i0, j0, mask = region_mask([(7, 2), (3, 5)])
+    assert (i0, j0) == (3, 2) and mask.shape == (4, 5) and mask.all()
+
+
+def test_polygon():
+    i0, j0, mask = region_mask([(0, 0), (4, 0), (0, 4)])
+    assert (i0, j0) == (0, 0)
+    assert np.array_equal(mask, np.tri(5, dtype=bool)[::-1])
+
+
+def test_polygon_contains_centers():
+    # square with a notch: centers inside (even-odd rule) and edges
+    vertices = np.array([(2, 2), (12, 2), (12, 12), (7, 6), (2, 12)])
+    i0, j0, mask = region_mask(vertices)
+    assert (i0, j0) == (2, 2) and mask.shape == (11, 11)
+    assert mask[0].all() and mask[:, 0].all() and mask[:, -1].all()
+    assert mask[2, 5] and not mask[10, 5]  # below the notch
+
+
+@pytest.mark.parametrize('vertices', [
+    [(-3, -2), (4, 5)],
+    [(8, 6), (14, 12)],
+    [(-4, 1), (12, 3), (3, 14)],
+    ])
+def test_clipped_to_shape(vertices):
+    shape = (10, 9)  # height, width
+    i0, j0, mask = region_mask(vertices)
+    full = np.zeros((40, 40), dtype=bool)
+    full[j0+20:j0+20+mask.shape[0], i0+20:i0+20+mask.shape[1]] = mask
+    i0, j0, mask = region_mask(vertices, shape)
+    clipped = np.zeros((40, 40), dtype=bool)
+    clipped[j0+20:j0+20+mask.shape[0], i0+20:i0+20+mask.shape[1]] = mask
+    assert 0 <= i0 and 0 <= j0
+    assert j0 + mask.shape[0] <= shape[0] and i0 + mask.shape[1] <= shape[1]
+    assert np.array_equal(clipped, full & np.pad(np.ones(shape, dtype=bool),
+                                                 ((20, 10), (20, 11))))
+
+
+def test_outside_of_shape():
+    _, _, mask = region_mask([(12, 12), (14, 15)], (10, 10))
+    assert mask.size == 0
+
+
+def test_reference_series():
+    data = np.array([[1., 2., 3., np.nan],
+                     [np.nan, np.nan, np.nan, np.nan],
+                     [4., 1., 2., 8.]])
+    weights = np.array([1., 0., 3., 2.])
+    assert np.allclose(reference_series(data), [2., np.nan, 3.75],
+                       equal_nan=True)
+    assert np.allclose(reference_series(data, 'median'), [2., np.nan, 3.],
+                       equal_nan=True)
+    assert np.allclose(reference_series(data, 'weighted', weights),
+                       [2.5, np.nan, 26. / 6.], equal_nan=True)
+    with pytest.raises(ValueError):
+        reference_series(data, 'weighted')
+    with pytest.raises(ValueError):
+        reference_series(data, 'mode')
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the ring buffer of POINTS mode history (insarviz.ringbuffer)
+against a list.
+
+Usage: python -m pytest testing
+"""
+
+# imports ###################################################################
+
+import numpy as np
+import pytest
+
+from insarviz.ringbuffer import RingBuffer
+
+# tests #####################################################################
+
+
+@pytest.mark.parametrize('capacity', [1, 3, 8])
+def test_view_in_insertion_order(capacity):
+    ring = RingBuffer(capacity, shape=(2,), fill=np.nan)
+    rows = []
+    for x in range(3 * capacity + 1):
+        row = (x, -x)
+        dropped = ring.append(row)
+        rows.append(row)
+        if len(rows) > capacity:
+            assert tuple(dropped) == rows.pop(0)
+        else:
+            assert dropped is None
+        assert len(ring) == len(rows) and ring.count == x + 1
+        assert ring.is_full() == (x + 1 >= capacity)
+        assert tuple(ring.last()) == row
+        view = ring.view()
+        assert view.shape == (capacity, 2)
+        assert np.array_equal(view[:len(rows)], rows)
+        assert np.isnan(view[len(rows):]).all()
+
+
+def test_view_is_not_a_copy():
+    ring = RingBuffer(4, dtype=int)
+    for x in range(6):
+        ring.append(x)
+    view = ring.view()
+    assert view.base is ring.buffer
+    assert view.tolist() == [2, 3, 4, 5]
+
+
+def test_dropped_row_is_a_copy():
+    ring = RingBuffer(2, shape=(3,))
+    ring.append([1, 2, 3])
+    ring.append([4, 5, 6])
+    dropped = ring.append([7, 8, 9])
+    ring.append([10, 11, 12])
+    assert dropped.tolist() == [1, 2, 3]
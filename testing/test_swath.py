@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of swath profiles (insarviz.swath) against brute force binning.
+
+Usage: python -m pytest testing
+"""
+
+# imports ###################################################################
+
+import warnings
+
+import numpy as np
+import pytest
+
+from insarviz.swath import swath_index, swath_stats
+
+# helpers ###################################################################
+
+
+def _segment_distances(vertices, shape):
+    """(along, distance) of all pixels to each segment of the polyline, nan
+    where a pixel does not project on the segment"""
+    w, h = shape
+    jj, ii = np.mgrid[0:h, 0:w]
+    p = np.stack((ii.ravel(), jj.ravel()), axis=1).astype(float)
+    offset = 0.
+    along, dist = [], []
+    for a, b in zip(vertices[:-1], vertices[1:]):
+        step = b - a
+        length = np.hypot(*step)
+        t = (p - a) @ step / length
+        d = np.abs((p - a) @ (step[1], -step[0])) / length
+        on = (t >= 0.) & (t <= length)
+        along.append(np.where(on, offset + t, np.nan))
+        dist.append(np.where(on, d, np.nan))
+        offset += length
+    return np.array(along), np.array(dist), offset
+
+
+def _nanmedian(values):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # empty bins
+        return np.nanmedian(values, axis=0)
+
+
+# tests #####################################################################
+
+
+@pytest.mark.parametrize('vertices, half_width', [
+    ([(3, 4), (40, 20)], 0.),
+    ([(3, 4), (40, 20)], 2.5),
+    ([(-5, 10), (70, 35)], 3.),  # outside of the data
+    ([(5, 5), (30, 8), (20, 30), (21, 30)], 4.),  # joints
+    ([(10.4, 3.7), (11.2, 30.9)], 1.),
+    ])
+def test_swath_index_brute_force(vertices, half_width):
+    shape = (50, 40)
+    vertices = np.asarray(vertices, dtype=float)
+    pixels, bins, centers = swath_index(vertices, half_width, shape,
+                                        bin_size=2.)
+
+    along, dist, length = _segment_distances(vertices, shape)
+    dist = np.where(dist <= half_width, dist, np.inf)
+    nearest = np.argmin(dist, axis=0)
+    n = np.arange(dist.shape[1])
+    inside = np.isfinite(dist[nearest, n])
+    expected = np.flatnonzero(inside)
+
+    assert np.array_equal(pixels[:, 1] * shape[0] + pixels[:, 0], expected)
+    nbins = max(int(np.ceil(length / 2.)), 1)
+    assert len(centers) == nbins
+    expected_bins = np.minimum(
+        (along[nearest, n][inside] / 2.).astype(int), nbins - 1)
+    assert np.array_equal(bins, expected_bins)
+
+
+def test_swath_index_outside():
+    pixels, bins, centers = swath_index([(-20, -20), (-10, -5)], 2.,
+                                        (30, 30))
+    assert pixels.shape == (0, 2) and bins.shape == (0,)
+
+
+@pytest.mark.parametrize('m', [0, 1, 2, 9, 500])
+def test_swath_stats_brute_force(m):
+    rng = np.random.default_rng(m)
+    nbins, nb = 6, 4
+    values = rng.normal(size=(m, nb))
+    values[rng.random(values.shape) < .3] = np.nan
+    bins = rng.integers(0, nbins - 1, m)  # last bin empty
+
+    mean, std, med = swath_stats(values, bins, nbins, median=True)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # empty bins
+        expected = [(np.nanmean(values[bins == b], axis=0),
+                     np.nanstd(values[bins == b], axis=0),
+                     _nanmedian(values[bins == b]))
+                    for b in range(nbins)]
+    for k, result in enumerate((mean, std, med)):
+        assert result.shape == (nbins, nb)
+        assert np.allclose(result, [e[k] for e in expected], equal_nan=True)
+    assert np.isnan(med[-1]).all()
+
+
+def test_swath_stats_without_median():
+    values = np.arange(12.).reshape((6, 2))
+    _, _, med = swath_stats(values, np.array([0, 0, 1, 1, 1, 2]), 3)
+    assert med is None
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of temporal statistics maps (insarviz.temporal_stats): accumulators
+resumed from cached maps, and sidecar files extended with bands appended to
+a stack, match statistics computed from scratch.
+
+Usage: python -m pytest testing
+"""
+
+# imports ###################################################################
+
+import os
+import warnings
+
+import numpy as np
+
+from insarviz import temporal_stats
+from insarviz.core import Cube
+from insarviz.temporal_stats import (
+    RESUME, STATISTICS, TemporalStats, read_sidecar, temporal_stats_maps,
+    )
+from testing.bench_io import stack_but_last
+from testing.synthetic import make_cube
+
+# helpers ###################################################################
+
+
+def _series(bands, n, seed=0):
+    """bands-by-n values with nan holes and pixels without valid values"""
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(bands, n))
+    data[rng.random(data.shape) < .2] = np.nan
+    data[:, 0] = np.nan
+    return data
+
+
+def _assert_maps_equal(maps, expected):
+    for name in STATISTICS:
+        assert np.allclose(maps[name], expected[name], equal_nan=True,
+                           atol=1e-5), name
+
+
+# tests #####################################################################
+
+
+def test_accumulators_match_numpy():
+    data = _series(15, 50)
+    stats = TemporalStats(50)
+    for band in data:
+        stats.update(band)
+    std, value_range, coverage, max_step, _ = stats.maps()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-nan pixel
+        assert np.allclose(std, np.nanstd(data, axis=0), equal_nan=True)
+        assert np.allclose(value_range, np.nanmax(data, axis=0)
+                           - np.nanmin(data, axis=0), equal_nan=True)
+    assert np.array_equal(coverage, np.isfinite(data).sum(0))
+    for p in range(1, 50):
+        valid = data[np.isfinite(data[:, p]), p]
+        steps = np.abs(np.diff(valid))
+        expected = steps.max() if len(steps) and steps.max() > 0 else np.nan
+        assert np.allclose(max_step[p], expected, equal_nan=True)
+
+
+def test_resume_matches_single_pass():
+    data = _series(20, 40, seed=1)
+    once = TemporalStats(40)
+    for band in data:
+        once.update(band)
+    first = TemporalStats(40)
+    for band in data[:13]:
+        first.update(band)
+    cached = dict(zip(STATISTICS + RESUME,
+                      np.concatenate((first.maps(), first.state()))))
+    resumed = TemporalStats.resume(cached, first.k)
+    for band in data[13:]:
+        resumed.update(band)
+    assert resumed.k == once.k
+    assert np.allclose(resumed.maps(), once.maps(), equal_nan=True)
+    assert np.allclose(resumed.state(), once.state(), equal_nan=True)
+
+
+def test_sidecar_extended_with_appended_bands(tmp_path):
+    folder = make_cube(str(tmp_path / 'bands'), width=30, height=20,
+                       bands=8, fmt='bin')
+    stack_file = str(tmp_path / 'stack.tif')
+    stack_but_last(folder, stack_file)
+    cube = Cube(stack_file)
+    cube.open(stack_file)
+    temporal_stats_maps(cube, workers=1)
+    cube.dataset.close()
+    assert int(read_sidecar(stack_file)['bands']) == 7
+
+    # last band appended to the stack, its sidecar extended (see Cube.open)
+    cube = Cube(stack_file)
+    cube.open(folder)
+    try:
+        cached = read_sidecar(cube.dataset.name)
+        assert cached is not None and int(cached['bands']) == len(cube) == 8
+        expected = temporal_stats_maps(cube, workers=1, cache=False)
+        _assert_maps_equal(cached, expected)
+        _assert_maps_equal(temporal_stats_maps(cube, workers=1), expected)
+    finally:
+        cube.dataset.close()
+
+
+def test_sidecar_out_of_date(tmp_path):
+    filename = make_cube(str(tmp_path / 'cube.tif'), width=20, height=10,
+                         bands=5)
+    cube = Cube()
+    cube.open(filename)
+    try:
+        temporal_stats_maps(cube, workers=1)
+        assert read_sidecar(filename) is not None
+        os.utime(filename, ns=(0, 0))  # dataset modified after caching
+        assert read_sidecar(filename) is None
+        assert temporal_stats.extend_sidecar(cube, None) is None
+    finally:
+        cube.dataset.close()
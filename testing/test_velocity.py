@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of per-pixel trend fits (insarviz.velocity) against per-pixel least
+squares.
+
+Usage: python -m pytest testing
+"""
+
+# imports ###################################################################
+
+import numpy as np
+import pytest
+
+from insarviz.core import Cube
+from insarviz.velocity import design_matrix, fit_block, velocity_maps, years
+from testing.synthetic import make_cube
+
+# helpers ###################################################################
+
+
+def _lstsq(data, X, min_valid):
+    """params and rms of each pixel, fitted one by one"""
+    params = np.full((X.shape[1], data.shape[1]), np.nan)
+    rms = np.full(data.shape[1], np.nan)
+    for p in range(data.shape[1]):
+        valid = np.isfinite(data[:, p])
+        if valid.sum() < min_valid:
+            continue
+        params[:, p] = np.linalg.lstsq(X[valid], data[valid, p],
+                                       rcond=None)[0]
+        res = data[valid, p] - X[valid] @ params[:, p]
+        rms[p] = np.sqrt((res * res).mean())
+    return params, rms
+
+
+# tests #####################################################################
+
+
+def test_design_matrix():
+    t = years([0., 86400. * 365.25, 86400. * 365.25 * 3])
+    assert np.allclose(t, [0., 1., 3.])
+    X, names = design_matrix(t, acceleration=True, seasonal=True)
+    assert names == ['intercept', 'velocity', 'acceleration', 'annual_sin',
+                     'annual_cos', 'semiannual_sin', 'semiannual_cos']
+    assert X.shape == (3, 7)
+    assert np.allclose(X[:, 2], [0., .5, 4.5])
+    assert np.allclose(years(range(4)), [0., 1., 2., 3.])
+
+
+@pytest.mark.parametrize('acceleration, seasonal', [
+    (False, False), (True, False), (False, True),
+    ])
+def test_fit_block_matches_lstsq(acceleration, seasonal):
+    rng = np.random.default_rng(0)
+    t = np.sort(rng.uniform(0., 4., 30))
+    X, _ = design_matrix(t, acceleration, seasonal)
+    data = X @ rng.normal(size=(X.shape[1], 200)) \
+        + rng.normal(0., .1, (30, 200))
+    data[rng.random(data.shape) < .1] = np.nan
+    data[:, :50] = X @ rng.normal(size=(X.shape[1], 50))  # all valid
+    data[:-2, -1] = np.nan  # not enough valid dates
+    params, rms = fit_block(data, X)
+    expected_params, expected_rms = _lstsq(data, X, X.shape[1] + 1)
+    assert np.isnan(params[:, -1]).all() and np.isnan(rms[-1])
+    assert np.allclose(params, expected_params, equal_nan=True)
+    assert np.allclose(rms, expected_rms, equal_nan=True)
+
+
+def test_velocity_maps(tmp_path):
+    filename = make_cube(str(tmp_path / 'cube.tif'), width=30, height=20,
+                         bands=10)
+    cube = Cube()
+    cube.open(filename)
+    try:
+        timestamps = range(len(cube))
+        maps = velocity_maps(cube, timestamps, workers=1)
+        data = cube.load_window(0, 0, 30, 20).astype(float)
+    finally:
+        cube.dataset.close()
+    X, names = design_matrix(years(timestamps))
+    params, rms = _lstsq(data.reshape((10, -1)), X, X.shape[1] + 1)
+    assert sorted(maps) == sorted(names + ['rms'])
+    for name, expected in zip(names + ['rms'], list(params) + [rms]):
+        assert maps[name].shape == (20, 30)
+        assert np.allclose(maps[name], expected.reshape((20, 30)),
+                           equal_nan=True, atol=1e-6)